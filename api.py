@@ -1,3 +1,4 @@
+import functools
 import json
 import time
 import ccxt
@@ -16,7 +17,27 @@ import os
 import logging
 from dotenv import load_dotenv
 
+from coalescing import CoalescingExchange
+from file_sink import write_line
+from metrics import InstrumentedExchange, instrument_app, start_metrics_server
+import rate_limit
+
 app = Flask(__name__)
+# Latens per endpoint (tradingbot_api_request_seconds)
+instrument_app(app)
+
+
+# Börsanrop från API:t delar rate limit-budget med boten men har lägst
+# prioritet; ordrar via /order körs ändå med orderprioritet (rate_limit.install)
+@app.before_request
+def _dashboard_priority():
+    rate_limit.set_thread_priority(rate_limit.DASHBOARD)
+
+
+@app.teardown_request
+def _reset_priority(exc):
+    rate_limit.set_thread_priority(None)
+
 
 CORS_HEADERS = {
     "Access-Control-Allow-Origin": "*",
@@ -40,6 +61,7 @@ def handle_options(path):
 
 # Path to your tradingbot.py
 BOT_PATH = os.path.join(os.path.dirname(__file__), "tradingbot.py")
+ORDER_LOG_PATH = os.path.join(os.path.dirname(__file__), "order_status_log.txt")
 
 # Global variable to keep track of the bot process
 bot_process = None
@@ -92,8 +114,10 @@ def stop_bot():
 def get_balance():
     from tradingbot import fetch_balance
 
+    # ?refresh=true tvingar ett REST-anrop förbi plånbokscachen
+    force_refresh = request.args.get("refresh", "").lower() in ("1", "true", "yes")
     try:
-        balance = fetch_balance()
+        balance = fetch_balance(force_refresh=force_refresh)
         return jsonify(balance)
     except ccxt.AuthenticationError as e:
         logger.error(f"Authentication error fetching balance: {e}")
@@ -105,7 +129,7 @@ def get_balance():
 
 @app.route("/logs", methods=["GET"])
 def get_logs():
-    log_path = os.path.join(os.path.dirname(__file__), "order_status_log.txt")
+    log_path = ORDER_LOG_PATH
     if not os.path.exists(log_path):
         return jsonify({"logs": []})
     logs = []
@@ -119,7 +143,7 @@ def get_logs():
 
 @app.route("/orders", methods=["GET"])
 def get_orders():
-    log_path = os.path.join(os.path.dirname(__file__), "order_status_log.txt")
+    log_path = ORDER_LOG_PATH
     if not os.path.exists(log_path):
         return jsonify({"orders": []})
     orders = []
@@ -132,7 +156,7 @@ def get_orders():
 
 @app.route("/orderhistory", methods=["GET"])
 def order_history():
-    log_path = os.path.join(os.path.dirname(__file__), "order_status_log.txt")
+    log_path = ORDER_LOG_PATH
     if not os.path.exists(log_path):
         return jsonify({"orders": [], "status": "no_file"})
 
@@ -346,7 +370,7 @@ def get_open_orders():
 def strategy_performance():
     import json
 
-    log_path = os.path.join(os.path.dirname(__file__), "order_status_log.txt")
+    log_path = ORDER_LOG_PATH
     if not os.path.exists(log_path):
         return jsonify({"performance": {}, "trades": [], "status": "no_file"})
 
@@ -861,8 +885,8 @@ def strategy_performance():
 
     # Logic for pairing buy and sell trades
     for symbol, symbol_trades in paired_trades.items():
-        buy_trades = [trade for trade in symbol_trades if trade["type"] == "buy"]
-        sell_trades = [trade for trade in symbol_trades if trade["type"] == "sell"]
+        buy_trades = [trade for trade in symbol_trades if trade["side"] == "buy"]
+        sell_trades = [trade for trade in symbol_trades if trade["side"] == "sell"]
         remaining_buys = buy_trades.copy()
 
         for sell in sell_trades:
@@ -899,7 +923,7 @@ def debug_log():
 
     # Loggfiler
     log_files = {}
-    log_path = os.path.join(os.path.dirname(__file__), "order_status_log.txt")
+    log_path = ORDER_LOG_PATH
 
     if os.path.exists(log_path):
         with open(log_path, "r") as f:
@@ -964,7 +988,13 @@ def debug_log():
 
 @app.route("/historical", methods=["GET"])
 def get_historical_data():
-    from tradingbot import fetch_market_data, EXCHANGE, ensure_paper_trading_symbol
+    from tradingbot import (
+        SYMBOL,
+        fetch_market_data,
+        get_candles,
+        EXCHANGE,
+        ensure_paper_trading_symbol,
+    )
 
     symbol = request.args.get("symbol", "BTC/USD")
     timeframe = request.args.get("timeframe", "1h")
@@ -976,7 +1006,11 @@ def get_historical_data():
         logger.info(f"Historical data using paper trading symbol: {symbol}")
 
     try:
-        df = fetch_market_data(EXCHANGE, symbol, timeframe, limit)
+        if symbol == SYMBOL:
+            # Botens symbol: alla tidsramar härleds lokalt från 1m-flödet
+            df = get_candles(timeframe, limit)
+        else:
+            df = fetch_market_data(EXCHANGE, symbol, timeframe, limit)
         return jsonify(
             {
                 "symbol": symbol,
@@ -1001,18 +1035,27 @@ def ticker_endpoint():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/ratelimit", methods=["GET"])
+def ratelimit_status():
+    """Kvarvarande rate limit-budget (delad mellan bot och API)."""
+    return jsonify(rate_limit.get_limiter().status())
+
+
+@functools.lru_cache(maxsize=1)
+def _public_exchange():
+    exchange = rate_limit.install(ccxt.bitfinex(), rate_limit.get_limiter())
+    return CoalescingExchange(InstrumentedExchange(exchange))
+
+
 @app.route("/pricehistory", methods=["GET"])
 def pricehistory():
     """Fetch historical price data for a given symbol."""
     import ccxt
     from flask import jsonify, request
 
-    # Initialize exchange (example: Bitfinex)
-    exchange = ccxt.bitfinex()
-
-    # Ensure nonce is initialized
-    if not hasattr(exchange, "nonce"):
-        exchange.nonce = int(time.time() * 1000)
+    # Delad publik exchange: strypt av den gemensamma limitern och med
+    # identiska samtidiga förfrågningar sammanslagna till ett anrop
+    exchange = _public_exchange()
 
     # Get query parameters
     symbol = request.args.get("symbol")
@@ -1065,10 +1108,9 @@ def frontend_error_log():
     try:
         error_data = request.get_json(force=True)
         log_path = os.path.join(os.path.dirname(__file__), "frontend_errors.log")
-        with open(log_path, "a") as f:
-            log_entry = f"{time.strftime('%Y-%m-%d %H:%M:%S')} | {json.dumps(error_data, ensure_ascii=False)}\n"
-            f.write(log_entry)
-        return jsonify({"logged": True})
+        log_entry = f"{time.strftime('%Y-%m-%d %H:%M:%S')} | {json.dumps(error_data, ensure_ascii=False)}"
+        # Skrivs av bakgrundstråden; False om skrivkön är full
+        return jsonify({"logged": write_line(log_path, log_entry)})
     except Exception as e:
         logger.error(f"Failed to log frontend error: {e}")
         return jsonify({"logged": False, "error": str(e)}), 500
@@ -1084,4 +1126,7 @@ if __name__ == "__main__":
     load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
     # Use API_PORT env var or default to 5000
     api_port = int(os.getenv("API_PORT", "5000"))
+    # Egen port så att API:t och boten kan exponera mätvärden samtidigt (boten
+    # använder METRICS_PORT, 8001 i config.json)
+    start_metrics_server(int(os.getenv("API_METRICS_PORT", "8002")))
     app.run(host="0.0.0.0", port=api_port)
@@ -0,0 +1,520 @@
+"""
+Händelsedriven backtestmotor med intrabar stop-loss/take-profit.
+
+Motorn spelar upp staplar (eller tick-priser) i tidsordning och fyller SL/TP inom
+varje stapel utifrån high/low och en konfigurerbar ordningsregel. Positionsstatus och
+avslutade trades lagras i numpy-arrayer, inte i en dict per trade, och sökningen efter
+nästa exit görs vektoriserat. Data kan matas in i block (``run`` flera gånger) och
+öppna positioner följer med över blockgränserna, så ett block och många block ger
+identiska resultat.
+"""
+
+import heapq
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+MS_PER_DAY = 86_400_000
+
+# Exit-orsaker (lagras som int8 i trade-arrayerna)
+EXIT_OPEN = 0
+EXIT_STOP_LOSS = 1
+EXIT_TAKE_PROFIT = 2
+EXIT_REASONS = {
+    EXIT_OPEN: "open",
+    EXIT_STOP_LOSS: "stop_loss",
+    EXIT_TAKE_PROFIT: "take_profit",
+}
+
+# Ordningsregler när både SL och TP ligger inom samma stapel
+INTRABAR_RULES = ("stop_first", "take_profit_first", "open_proximity")
+
+_TRADE_COLUMNS = {
+    "side": np.int8,
+    "amount": np.float64,
+    "entry_index": np.int64,
+    "entry_timestamp": np.int64,
+    "entry_price": np.float64,
+    "exit_index": np.int64,
+    "exit_timestamp": np.int64,
+    "exit_price": np.float64,
+    "exit_reason": np.int8,
+    "gross_pnl": np.float64,
+    "fees": np.float64,
+    "pnl": np.float64,
+}
+
+_POSITION_COLUMNS = {
+    "side": np.int8,
+    "amount": np.float64,
+    "entry_index": np.int64,
+    "entry_timestamp": np.int64,
+    "entry_price": np.float64,
+    "entry_fee": np.float64,
+    "stop": np.float64,
+    "target": np.float64,
+}
+
+
+class _ColumnStore:
+    """Växande kolumnlagring (en numpy-array per fält) med amorterad append."""
+
+    def __init__(self, columns, capacity=64):
+        self.size = 0
+        self.columns = {
+            name: np.zeros(capacity, dtype=dtype) for name, dtype in columns.items()
+        }
+
+    def append(self, **values):
+        capacity = len(next(iter(self.columns.values())))
+        if self.size >= capacity:
+            for name, arr in self.columns.items():
+                grown = np.zeros(capacity * 2, dtype=arr.dtype)
+                grown[: self.size] = arr[: self.size]
+                self.columns[name] = grown
+        idx = self.size
+        for name, value in values.items():
+            self.columns[name][idx] = value
+        self.size += 1
+        return idx
+
+    def view(self):
+        return {name: arr[: self.size].copy() for name, arr in self.columns.items()}
+
+
+@dataclass
+class BacktestResult:
+    """
+    Resultat från en simulering.
+
+    Attributes:
+        trades: Kolumnvisa trade-arrayer (se _TRADE_COLUMNS)
+        timestamps: Tidsstämplar för equity-kurvan (tom om kurvor inte sparades)
+        equity: Mark-to-market equity per stapel
+        position: Nettoposition (signerad mängd) per stapel
+        stats: Sammanfattande nyckeltal
+    """
+
+    trades: Dict[str, np.ndarray]
+    timestamps: np.ndarray
+    equity: np.ndarray
+    position: np.ndarray
+    stats: Dict[str, float]
+
+    def trade_records(self) -> List[dict]:
+        """Trades som en lista med dicts, t.ex. för JSON/CSV-export."""
+        records = []
+        for i in range(len(self.trades["side"])):
+            records.append(
+                {
+                    "type": "buy" if self.trades["side"][i] > 0 else "sell",
+                    "amount": float(self.trades["amount"][i]),
+                    "entry_index": int(self.trades["entry_index"][i]),
+                    "entry_timestamp": int(self.trades["entry_timestamp"][i]),
+                    "entry_price": float(self.trades["entry_price"][i]),
+                    "exit_index": int(self.trades["exit_index"][i]),
+                    "exit_timestamp": int(self.trades["exit_timestamp"][i]),
+                    "exit_price": float(self.trades["exit_price"][i]),
+                    "exit_reason": EXIT_REASONS[int(self.trades["exit_reason"][i])],
+                    "gross_pnl": float(self.trades["gross_pnl"][i]),
+                    "fees": float(self.trades["fees"][i]),
+                    "pnl": float(self.trades["pnl"][i]),
+                }
+            )
+        return records
+
+
+class BacktestEngine:
+    """
+    Simulerar FVG-strategins ordrar med SL/TP, avgifter och equity-kurva.
+
+    Args:
+        stop_loss_pct: Stop-loss i procent från ingångspriset (None = ingen SL)
+        take_profit_pct: Take-profit i procent från ingångspriset (None = ingen TP)
+        amount: Ordermängd per signal
+        maker_fee: Avgift för limitordrar (ingång och take-profit), t.ex. 0.001 = 0.1 %
+        taker_fee: Avgift för stop-loss som fylls som marknadsorder
+        initial_equity: Startkapital för equity-kurvan
+        max_trades_per_day: Max antal nya positioner per UTC-dygn (None = obegränsat)
+        max_daily_loss: Inga nya positioner när dygnets realiserade P&L < -max_daily_loss
+        max_open_positions: Max samtidigt öppna positioner (None = obegränsat)
+        intrabar: Regel när SL och TP nås i samma stapel ('stop_first',
+            'take_profit_first' eller 'open_proximity')
+        keep_curves: Spara equity/position per stapel (stäng av för minimalt minne)
+    """
+
+    def __init__(
+        self,
+        stop_loss_pct: Optional[float] = 2.0,
+        take_profit_pct: Optional[float] = 4.0,
+        amount: float = 0.001,
+        maker_fee: float = 0.001,
+        taker_fee: float = 0.002,
+        initial_equity: float = 10_000.0,
+        max_trades_per_day: Optional[int] = None,
+        max_daily_loss: Optional[float] = None,
+        max_open_positions: Optional[int] = None,
+        intrabar: str = "stop_first",
+        keep_curves: bool = True,
+    ):
+        if intrabar not in INTRABAR_RULES:
+            raise ValueError(
+                f"Okänd intrabar-regel: {intrabar}. Välj en av {INTRABAR_RULES}"
+            )
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.amount = amount
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.initial_equity = initial_equity
+        self.max_trades_per_day = max_trades_per_day
+        self.max_daily_loss = max_daily_loss
+        self.max_open_positions = max_open_positions
+        self.intrabar = intrabar
+        self.keep_curves = keep_curves
+
+        self._trades = _ColumnStore(_TRADE_COLUMNS)
+        self._positions = _ColumnStore(_POSITION_COLUMNS)
+        self._free_slots: List[int] = []
+        self._open_slots = set()
+
+        self._offset = 0  # globalt index för första stapeln i nästa block
+        self._realized = 0.0
+        self._peak = initial_equity
+        self._max_drawdown = 0.0
+        self._last_equity = initial_equity
+        self._last_close = np.nan
+        self._last_timestamp = 0
+        self._current_day = None
+        self._day_trades = 0
+        self._day_pnl = 0.0
+
+        self._ts_chunks: List[np.ndarray] = []
+        self._equity_chunks: List[np.ndarray] = []
+        self._position_chunks: List[np.ndarray] = []
+
+    # -- Positionshantering -------------------------------------------------
+
+    def _open_position(self, side, index, timestamp, price):
+        if self.stop_loss_pct is None:
+            stop = np.nan
+        else:
+            stop = price * (1 - side * self.stop_loss_pct / 100)
+        if self.take_profit_pct is None:
+            target = np.nan
+        else:
+            target = price * (1 + side * self.take_profit_pct / 100)
+        values = dict(
+            side=side,
+            amount=self.amount,
+            entry_index=index,
+            entry_timestamp=timestamp,
+            entry_price=price,
+            entry_fee=self.amount * price * self.maker_fee,
+            stop=stop,
+            target=target,
+        )
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            for name, value in values.items():
+                self._positions.columns[name][slot] = value
+        else:
+            slot = self._positions.append(**values)
+        self._open_slots.add(slot)
+        return slot
+
+    def _find_exit(self, slot, high, low, start):
+        """Första lokala index >= start där SL eller TP nås, annars -1."""
+        cols = self._positions.columns
+        side = cols["side"][slot]
+        stop = cols["stop"][slot]
+        target = cols["target"][slot]
+        n = len(high)
+        pos = start
+        step = 64
+        while pos < n:
+            end = min(n, pos + step)
+            if side > 0:
+                hit = (low[pos:end] <= stop) | (high[pos:end] >= target)
+            else:
+                hit = (high[pos:end] >= stop) | (low[pos:end] <= target)
+            k = int(hit.argmax())
+            if hit[k]:
+                return pos + k
+            pos = end
+            step *= 4
+        return -1
+
+    def _exit_fill(self, slot, op, hi, lo):
+        """Fyllnadspris och orsak för en exit inom stapeln (op, hi, lo)."""
+        cols = self._positions.columns
+        side = cols["side"][slot]
+        stop = cols["stop"][slot]
+        target = cols["target"][slot]
+        if side > 0:
+            gap_stop, gap_target = op <= stop, op >= target
+            stop_hit, target_hit = lo <= stop, hi >= target
+        else:
+            gap_stop, gap_target = op >= stop, op <= target
+            stop_hit, target_hit = hi >= stop, lo <= target
+        # Gap förbi nivån vid öppning: fyll på öppningskursen
+        if gap_stop:
+            return op, EXIT_STOP_LOSS
+        if gap_target:
+            return op, EXIT_TAKE_PROFIT
+        if stop_hit and target_hit:
+            if self.intrabar == "take_profit_first":
+                return target, EXIT_TAKE_PROFIT
+            if self.intrabar == "open_proximity" and abs(target - op) < abs(op - stop):
+                return target, EXIT_TAKE_PROFIT
+            return stop, EXIT_STOP_LOSS
+        if stop_hit:
+            return stop, EXIT_STOP_LOSS
+        return target, EXIT_TAKE_PROFIT
+
+    def _record_trade(self, slot, exit_index, exit_timestamp, price, reason):
+        cols = self._positions.columns
+        side = int(cols["side"][slot])
+        amount = cols["amount"][slot]
+        entry_price = cols["entry_price"][slot]
+        if reason == EXIT_STOP_LOSS:
+            exit_fee = amount * price * self.taker_fee
+        elif reason == EXIT_TAKE_PROFIT:
+            exit_fee = amount * price * self.maker_fee
+        else:
+            exit_fee = 0.0
+        gross = side * amount * (price - entry_price)
+        fees = cols["entry_fee"][slot] + exit_fee
+        self._trades.append(
+            side=side,
+            amount=amount,
+            entry_index=cols["entry_index"][slot],
+            entry_timestamp=cols["entry_timestamp"][slot],
+            entry_price=entry_price,
+            exit_index=exit_index,
+            exit_timestamp=exit_timestamp,
+            exit_price=price,
+            exit_reason=reason,
+            gross_pnl=gross,
+            fees=fees,
+            pnl=gross - fees,
+        )
+        return gross - exit_fee, gross - fees
+
+    def _roll_day(self, timestamp):
+        day = int(timestamp) // MS_PER_DAY
+        if day != self._current_day:
+            self._current_day = day
+            self._day_trades = 0
+            self._day_pnl = 0.0
+
+    def _entries_blocked(self):
+        if (
+            self.max_trades_per_day is not None
+            and self._day_trades >= self.max_trades_per_day
+        ):
+            return True
+        if self.max_daily_loss is not None and self._day_pnl < -self.max_daily_loss:
+            return True
+        if (
+            self.max_open_positions is not None
+            and len(self._open_slots) >= self.max_open_positions
+        ):
+            return True
+        return False
+
+    # -- Uppspelning --------------------------------------------------------
+
+    def run(
+        self,
+        timestamps,
+        open_,
+        high,
+        low,
+        close,
+        long_signal=None,
+        short_signal=None,
+    ):
+        """
+        Spelar upp ett block staplar. Signaler utvärderas på stapelns stängning och
+        ingången sker som limitorder till stängningskursen; SL/TP prövas från nästa stapel.
+
+        Returns:
+            np.ndarray: Equity per stapel i blocket
+        """
+        ts = np.asarray(timestamps, dtype=np.int64)
+        o = np.asarray(open_, dtype=np.float64)
+        h = np.asarray(high, dtype=np.float64)
+        lo = np.asarray(low, dtype=np.float64)
+        c = np.asarray(close, dtype=np.float64)
+        m = len(c)
+        if m == 0:
+            return np.empty(0)
+        longs = (
+            np.zeros(m, dtype=bool)
+            if long_signal is None
+            else np.asarray(long_signal, dtype=bool)
+        )
+        shorts = (
+            np.zeros(m, dtype=bool)
+            if short_signal is None
+            else np.asarray(short_signal, dtype=bool)
+        )
+        cols = self._positions.columns
+        offset = self._offset
+
+        # Intervall [start, slut) per position i blocket för equity-beräkningen
+        iv_start, iv_end, iv_signed, iv_entry = [], [], [], []
+        realized_delta = np.zeros(m + 1)
+        interval_of = {}
+        heap = []
+
+        def track(slot, start):
+            signed = cols["side"][slot] * cols["amount"][slot]
+            interval_of[slot] = len(iv_start)
+            iv_start.append(start)
+            iv_end.append(m)
+            iv_signed.append(signed)
+            iv_entry.append(cols["entry_price"][slot])
+
+        def schedule(slot, start):
+            j = self._find_exit(slot, h, lo, start)
+            if j >= 0:
+                heapq.heappush(heap, (j, slot))
+
+        def close_until(limit):
+            while heap and heap[0][0] <= limit:
+                j, slot = heapq.heappop(heap)
+                price, reason = self._exit_fill(slot, o[j], h[j], lo[j])
+                self._roll_day(ts[j])
+                realized, net = self._record_trade(
+                    slot, offset + j, ts[j], price, reason
+                )
+                self._day_pnl += net
+                realized_delta[j] += realized
+                iv_end[interval_of.pop(slot)] = j
+                self._open_slots.discard(slot)
+                self._free_slots.append(slot)
+
+        # Positioner som följer med från föregående block
+        for slot in sorted(self._open_slots):
+            track(slot, 0)
+            schedule(slot, 0)
+
+        for i in np.flatnonzero(longs | shorts):
+            close_until(i)
+            self._roll_day(ts[i])
+            for side, fired in ((1, longs[i]), (-1, shorts[i])):
+                if not fired or self._entries_blocked():
+                    continue
+                slot = self._open_position(side, offset + i, ts[i], c[i])
+                self._day_trades += 1
+                realized_delta[i] -= cols["entry_fee"][slot]
+                track(slot, i)
+                schedule(slot, i + 1)
+        close_until(m)
+
+        # Vektoriserad mark-to-market: nettoposition och kostnadsbas via differenser
+        dq = np.zeros(m + 1)
+        dc = np.zeros(m + 1)
+        if iv_start:
+            starts = np.asarray(iv_start, dtype=np.int64)
+            ends = np.asarray(iv_end, dtype=np.int64)
+            signed = np.asarray(iv_signed)
+            cost = signed * np.asarray(iv_entry)
+            np.add.at(dq, starts, signed)
+            np.add.at(dq, ends, -signed)
+            np.add.at(dc, starts, cost)
+            np.add.at(dc, ends, -cost)
+        position = np.cumsum(dq)[:m]
+        cost_basis = np.cumsum(dc)[:m]
+        realized = self._realized + np.cumsum(realized_delta)[:m]
+        equity = self.initial_equity + realized + position * c - cost_basis
+
+        peak = np.maximum(np.maximum.accumulate(equity), self._peak)
+        drawdown = (equity - peak) / peak
+        self._max_drawdown = min(self._max_drawdown, float(drawdown.min()))
+        self._peak = float(peak[-1])
+        self._realized = float(realized[-1])
+        self._last_equity = float(equity[-1])
+        self._last_close = float(c[-1])
+        self._last_timestamp = int(ts[-1])
+        self._offset += m
+
+        if self.keep_curves:
+            self._ts_chunks.append(ts.copy())
+            self._equity_chunks.append(equity)
+            self._position_chunks.append(position)
+        return equity
+
+    def finish(self) -> BacktestResult:
+        """Avslutar simuleringen; öppna positioner värderas till sista stängningskurs."""
+        for slot in sorted(self._open_slots):
+            self._record_trade(
+                slot,
+                self._offset - 1,
+                self._last_timestamp,
+                self._last_close,
+                EXIT_OPEN,
+            )
+        self._free_slots.extend(self._open_slots)
+        self._open_slots.clear()
+
+        trades = self._trades.view()
+        closed = trades["exit_reason"] != EXIT_OPEN
+        pnl = trades["pnl"][closed]
+        wins = pnl[pnl > 0]
+        losses = pnl[pnl < 0]
+        stats = {
+            "bars": self._offset,
+            "initial_equity": self.initial_equity,
+            "final_equity": self._last_equity,
+            "net_pnl": self._last_equity - self.initial_equity,
+            "realized_pnl": float(pnl.sum()),
+            "fees": float(trades["fees"].sum()),
+            "trades": int(closed.sum()),
+            "open_trades": int((~closed).sum()),
+            "wins": int(len(wins)),
+            "losses": int(len(losses)),
+            "win_rate": float(len(wins) / len(pnl)) if len(pnl) else 0.0,
+            "profit_factor": _profit_factor(wins, losses),
+            "avg_trade": float(pnl.mean()) if len(pnl) else 0.0,
+            "max_drawdown": self._max_drawdown,
+        }
+
+        def concat(chunks, dtype):
+            return np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+
+        return BacktestResult(
+            trades=trades,
+            timestamps=concat(self._ts_chunks, np.int64),
+            equity=concat(self._equity_chunks, np.float64),
+            position=concat(self._position_chunks, np.float64),
+            stats=stats,
+        )
+
+
+def _profit_factor(wins, losses):
+    if len(losses):
+        return float(wins.sum() / -losses.sum())
+    return float("inf") if len(wins) else 0.0
+
+
+def simulate(
+    timestamps, open_, high, low, close, long_signal, short_signal, **params
+) -> BacktestResult:
+    """Kör en hel serie staplar genom BacktestEngine i ett block."""
+    engine = BacktestEngine(**params)
+    engine.run(timestamps, open_, high, low, close, long_signal, short_signal)
+    return engine.finish()
+
+
+def simulate_ticks(
+    timestamps, prices, long_signal, short_signal, **params
+) -> BacktestResult:
+    """Kör motorn på enskilda trades/ticks: varje tick är en stapel med o=h=l=c."""
+    prices = np.asarray(prices, dtype=np.float64)
+    return simulate(
+        timestamps, prices, prices, prices, prices, long_signal, short_signal, **params
+    )
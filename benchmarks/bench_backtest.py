@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from backtest_engine import simulate  # noqa: E402
+from benchmarks.datagen import market_frame, ohlcv_rows  # noqa: E402
+
+
+def test_run_backtest(benchmark, tradingbot, rows, monkeypatch):
+    data = market_frame(rows)
+    monkeypatch.setattr(
+        tradingbot, "fetch_market_data", lambda *args, **kwargs: data.copy()
+    )
+    trades = benchmark.pedantic(
+        tradingbot.run_backtest,
+        args=("tTESTBTC:TESTUSD", "1m", rows, 20, 1.5, 0, 23, 50, 10**9, 0.5),
+        rounds=3,
+    )
+    assert isinstance(trades, list)
+
+
+def test_simulate(benchmark, rows):
+    raw = ohlcv_rows(rows)
+    rng = np.random.default_rng(1)
+    longs = rng.random(rows) < 0.01
+    shorts = rng.random(rows) < 0.01
+    result = benchmark.pedantic(
+        simulate,
+        args=(raw[:, 0].astype(np.int64), *raw[:, 1:5].T, longs, shorts),
+        kwargs={"stop_loss_pct": 0.5, "take_profit_pct": 0.5},
+        rounds=3,
+    )
+    assert result.stats["bars"] == rows
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from benchmarks.datagen import market_frame, ohlcv_rows  # noqa: E402
+from candles import CandleArray, compute_indicators  # noqa: E402
+from fvg import FVG_INDICATORS, detect_fvg, fvg_gaps, fvg_signals  # noqa: E402
+from indicators import calculate_indicators  # noqa: E402
+
+
+def test_calculate_indicators(benchmark, rows):
+    data = market_frame(rows)
+    # calculate_indicators skriver i sin indata; ny kopia per runda
+    result = benchmark.pedantic(
+        calculate_indicators,
+        setup=lambda: ((data.copy(), 20, 1.5, 0, 23), {}),
+        rounds=5,
+    )
+    assert result is not None and "ema" in result
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32], ids=["f64", "f32"])
+def test_compute_indicators(benchmark, rows, dtype):
+    raw = ohlcv_rows(rows)
+    result = benchmark.pedantic(
+        compute_indicators,
+        setup=lambda: ((CandleArray.from_ohlcv(raw, dtype=dtype), 20, 1.5, 0, 23), {}),
+        rounds=5,
+    )
+    assert "ema" in result.indicators
+
+
+def test_compute_strategy_indicators(benchmark, rows):
+    # Bara FVG-strategins delgraf (ingen RSI/ADX)
+    raw = ohlcv_rows(rows)
+    result = benchmark.pedantic(
+        compute_indicators,
+        setup=lambda: (
+            (CandleArray.from_ohlcv(raw), 20, 1.5, 0, 23),
+            {"indicators": FVG_INDICATORS},
+        ),
+        rounds=5,
+    )
+    assert "rsi" not in result.indicators
+
+
+def test_detect_fvg(benchmark, rows):
+    # Senaste stapeln: kostnaden beror på lookback, inte på rows
+    data = market_frame(rows)
+    assert len(benchmark(detect_fvg, data, 100, True)) == 2
+
+
+def test_fvg_gaps(benchmark, rows):
+    data = market_frame(rows)
+    gaps = benchmark(fvg_gaps, data, 100)
+    assert len(gaps["bull_high"]) == rows
+
+
+def test_fvg_signals(benchmark, rows):
+    data = calculate_indicators(market_frame(rows), 20, 1.5, 0, 23)
+    long_signal, _ = benchmark(fvg_signals, data, 0.5, 100)
+    assert len(long_signal) == rows
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from benchmarks.datagen import (  # noqa: E402
+    order_json_lines,
+    order_status_lines,
+    realtime_payload,
+    write_lines,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.max_rows(1_000_000)
+def test_process_realtime_data(benchmark, tradingbot, rows):
+    payload = realtime_payload(rows)
+    data = benchmark(tradingbot.process_realtime_data, payload)
+    assert len(data) == rows
+
+
+@pytest.mark.max_rows(1_000_000)
+def test_analyze_strategy_performance(benchmark, tradingbot, rows, tmp_path):
+    bot = tradingbot.TradingBot(os.path.join(ROOT, "config.json"))
+    bot.log_file = str(write_lines(tmp_path / "orders.jsonl", order_json_lines(rows)))
+    stats = benchmark.pedantic(bot.analyze_strategy_performance, rounds=3)
+    assert stats["total_trades"] == rows
+
+
+@pytest.mark.max_rows(1_000_000)
+def test_strategy_performance_endpoint(
+    benchmark, tradingbot, rows, tmp_path, monkeypatch
+):
+    import api
+
+    log_path = write_lines(tmp_path / "order_status_log.txt", order_status_lines(rows))
+    monkeypatch.setattr(api, "ORDER_LOG_PATH", str(log_path))
+    client = api.app.test_client()
+    response = benchmark.pedantic(client.get, args=("/strategy_performance",), rounds=3)
+    assert response.status_code == 200
+
+
+def test_structured_debug_disabled(benchmark, tradingbot):
+    # Avstängd nivå: isEnabledFor före formatering, argumenten rörs inte
+    row = {"close": 30_000.0, "ema": 29_950.0, "high_volume": True}
+    benchmark(tradingbot.log.debug, "Rad %s: %s", 1, row)
+
+
+def test_file_sink_fill_burst(benchmark, tmp_path):
+    # 1 000 orderrader köas och skrivs i ett fåtal write-anrop
+    from file_sink import FileSink
+
+    sink = FileSink().start()
+    path = str(tmp_path / "order_status_log.txt")
+    lines = list(order_status_lines(1_000))
+
+    def burst():
+        for line in lines:
+            sink.write(path, line + "\n")
+        sink.flush()
+
+    benchmark(burst)
+    sink.close()
@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from benchmarks.datagen import ohlcv_rows  # noqa: E402
+from candles import CandleArray  # noqa: E402
+from resample import MultiTimeframeCandles, resample  # noqa: E402
+
+
+@pytest.mark.parametrize("timeframe", ["5m", "1h", "1d"])
+def test_resample(benchmark, rows, timeframe):
+    candles = CandleArray.from_ohlcv(ohlcv_rows(rows))
+    benchmark(resample, candles, timeframe)
+
+
+def test_update_one_minute(benchmark):
+    # Steady state: en ny 1m-stapel räknar bara om de pågående hinkarna
+    rows = ohlcv_rows(3000)
+    store = MultiTimeframeCandles(base_capacity=1500)
+    store.update(CandleArray.from_ohlcv(rows[:-1]))
+    last = CandleArray.from_ohlcv(rows[-1:])
+    benchmark(store.update, last)
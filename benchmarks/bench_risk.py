@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from risk import RiskEngine  # noqa: E402
+
+
+@pytest.mark.parametrize("symbols", [1, 1_000])
+def test_pre_trade_check(benchmark, symbols):
+    # Kontrollen ska inte bero på antal positioner i portföljen
+    risk = RiskEngine(
+        max_trades_per_day=10_000,
+        max_daily_loss=1e9,
+        max_position=10.0,
+        max_exposure=1e12,
+    )
+    for i in range(symbols):
+        risk.apply_fill(f"tS{i:04d}USD", 1.0, 100.0 + i)
+        risk.mark(f"tS{i:04d}USD", 101.0 + i)
+    assert benchmark(risk.check, "tS0000USD", "buy", 0.5, 100.0)[0]
+
+
+def test_mark_to_market(benchmark):
+    risk = RiskEngine()
+    risk.apply_fill("tBTCUSD", 1.0, 100.0)
+    benchmark(risk.mark, "tBTCUSD", 101.0)
@@ -0,0 +1,30 @@
+import hashlib
+import hmac
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from signing import Signer  # noqa: E402
+
+SECRET = "0123456789abcdef0123456789abcdef0123456789a"
+PAYLOAD = "AUTH1700000000000"
+
+
+def test_sign_precomputed(benchmark):
+    # Signaturer/s = OPS-kolumnen i pytest-benchmarks tabell
+    signer = Signer(SECRET)
+    assert benchmark(signer.sign, PAYLOAD)
+
+
+def test_sign_from_scratch(benchmark):
+    # Referens: nyckla om HMAC för varje meddelande (tidigare beteende)
+    def sign():
+        return hmac.new(SECRET.encode(), PAYLOAD.encode(), hashlib.sha384).hexdigest()
+
+    assert benchmark(sign)
+
+
+def test_auth_message(benchmark):
+    signer = Signer(SECRET)
+    assert benchmark(signer.auth_message, "KEY", 1_700_000_000_000)["authSig"]
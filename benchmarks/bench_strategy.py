@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from benchmarks.datagen import market_frame  # noqa: E402
+from indicators import calculate_indicators  # noqa: E402
+
+
+@pytest.fixture
+def strategy_data(rows):
+    return calculate_indicators(market_frame(rows), 20, 1.5, 0, 23).reset_index(
+        drop=True
+    )
+
+
+@pytest.mark.max_rows(100_000)
+def test_execute_trading_strategy(benchmark, tradingbot, strategy_data):
+    benchmark.pedantic(
+        tradingbot.execute_trading_strategy,
+        args=(strategy_data, 10**9, 10**9, 0.5, "tTESTBTC:TESTUSD"),
+        rounds=3,
+    )
+
+
+@pytest.mark.max_rows(100_000)
+def test_trading_strategy_execute(benchmark, tradingbot, strategy_data):
+    strategy = tradingbot.TradingStrategy(
+        "tTESTBTC:TESTUSD", 20, 0.5, 1.5, 0, 23, 10**9, 10**9, 2, 2
+    )
+    benchmark.pedantic(strategy.execute, args=(strategy_data,), rounds=3)
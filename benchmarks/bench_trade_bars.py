@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from trade_bars import TradeBars, make_builder  # noqa: E402
+
+START_MS = 1_704_067_200_000
+
+
+def trades(n, seed=20240101):
+    rng = np.random.default_rng(seed)
+    timestamps = START_MS + np.cumsum(rng.integers(0, 200, n))
+    prices = 30_000 * np.exp(np.cumsum(rng.normal(0, 1e-4, n)))
+    amounts = rng.lognormal(-3, 1, n) * rng.choice([-1, 1], n)
+    return timestamps, prices, amounts
+
+
+@pytest.mark.parametrize("spec", ["1s", "vol:1", "tick:100"])
+def test_add_many(benchmark, rows, spec):
+    timestamps, prices, amounts = trades(rows)
+
+    def build():
+        builder = make_builder(spec)
+        builder.add_many(timestamps, prices, amounts)
+        return builder
+
+    benchmark(build)
+
+
+def test_add_per_trade(benchmark):
+    # Livevägen: en trade åt gången genom alla standardbyggare
+    timestamps, prices, amounts = trades(10_000)
+    rows = list(zip(range(1, 10_001), timestamps.tolist(), prices.tolist()))
+    signed = amounts.tolist()
+
+    def feed():
+        bars = TradeBars()
+        for (trade_id, mts, price), amount in zip(rows, signed):
+            bars.add(trade_id, mts, price, amount)
+        return bars
+
+    benchmark(feed)
@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from triggers import TriggerEngine  # noqa: E402
+
+
+@pytest.mark.parametrize("levels", [10, 10_000])
+def test_tick_without_trigger(benchmark, levels):
+    # En tick utan utlösning ska inte bero på antal aktiva nivåer
+    engine = TriggerEngine()
+    for i in range(levels):
+        engine.add_bracket("BTC/USD", "buy", 1.0, 50.0 - i * 1e-3, 150.0 + i * 1e-3)
+    assert benchmark(engine.on_tick, "BTC/USD", 100.0) == []
+
+
+def test_add_and_cancel(benchmark):
+    engine = TriggerEngine()
+    for i in range(10_000):
+        engine.add_bracket("BTC/USD", "buy", 1.0, 50.0 - i * 1e-3, 150.0 + i * 1e-3)
+
+    def add_cancel():
+        engine.cancel(engine.add_bracket("BTC/USD", "buy", 1.0, 60.0, 140.0))
+
+    benchmark(add_cancel)
@@ -0,0 +1,48 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Standard: snabb körning. Fullständig svit: BENCH_ROWS=1e3,1e4,1e5,1e6,1e7
+DEFAULT_ROWS = "1e3,1e5"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--bench-rows",
+        default=os.getenv("BENCH_ROWS", DEFAULT_ROWS),
+        help="Kommaseparerade datamängder (rader) för benchmarks, t.ex. 1e3,1e5,1e7",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "max_rows(n): största datamängd som benchmarken körs med"
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "rows" not in metafunc.fixturenames:
+        return
+    option = metafunc.config.getoption("--bench-rows", default=DEFAULT_ROWS)
+    sizes = [int(float(size)) for size in option.split(",") if size.strip()]
+    # Radvisa loopar (iterrows) skulle ta timmar på de största mängderna
+    marker = metafunc.definition.get_closest_marker("max_rows")
+    if marker:
+        sizes = [size for size in sizes if size <= marker.args[0]]
+    metafunc.parametrize("rows", sizes, ids=[f"{size:.0e}" for size in sizes])
+
+
+@pytest.fixture(scope="session")
+def tradingbot():
+    """tradingbot mot den lokala börssimulatorn; inga ordrar läggs."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("EXCHANGE_SIMULATOR", "true")
+        module = importlib.import_module("tradingbot")
+        mp.setattr(module, "place_order", lambda *args, **kwargs: None)
+        yield module
@@ -0,0 +1,117 @@
+"""
+Seedade syntetiska data för benchmarks: OHLCV, Bitfinex-candles och orderloggar.
+
+Samma seed och storlek ger alltid samma data, så körningar kan jämföras över tid.
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+SEED = 20240101
+START_MS = 1_704_067_200_000  # 2024-01-01 00:00 UTC
+MINUTE_MS = 60_000
+
+
+def ohlcv_rows(n, seed=SEED):
+    """ccxt fetch_ohlcv-format: [[timestamp, open, high, low, close, volume], ...] som array."""
+    rng = np.random.default_rng(seed)
+    close = 30_000 * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 5e-4, n)) + 1e-4
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    # Några staplar stänger utanför high/low så att FVG-villkoren faktiskt slår till
+    outside = rng.random(n) < 0.05
+    low[outside] = close[outside] * 1.0005
+    volume = rng.lognormal(0, 0.5, n)
+    volume[outside] *= 4
+    timestamps = START_MS + np.arange(n, dtype=np.int64) * MINUTE_MS
+    return np.column_stack([timestamps, open_, high, low, close, volume])
+
+
+def market_frame(n, seed=SEED):
+    """DataFrame i samma form som fetch_market_data returnerar."""
+    rows = ohlcv_rows(n, seed)
+    df = pd.DataFrame(
+        rows, columns=["timestamp", "open", "high", "low", "close", "volume"]
+    )
+    df["timestamp"] = df["timestamp"].astype(np.int64)
+    df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
+    df.set_index("timestamp", inplace=True)
+    return df
+
+
+def realtime_payload(n, seed=SEED):
+    """Bitfinex candle-snapshot: [CHAN_ID, [[MTS, OPEN, CLOSE, HIGH, LOW, VOLUME], ...]]."""
+    rows = ohlcv_rows(n, seed)
+    candles = rows[:, [0, 1, 4, 2, 3, 5]].tolist()
+    return [1, candles]
+
+
+def order_json_lines(n, seed=SEED):
+    """JSON-rader för TradingBot.get_orders (en order per rad)."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1)
+    sides = np.where(rng.random(n) < 0.5, "buy", "sell")
+    statuses = np.where(rng.random(n) < 0.8, "executed", "cancelled")
+    prices = 30_000 * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    minutes = np.cumsum(rng.integers(1, 30, n))
+    for i in range(n):
+        yield json.dumps(
+            {
+                "id": f"bench-{i}",
+                "symbol": "tTESTBTC:TESTUSD",
+                "type": str(sides[i]),
+                "status": str(statuses[i]),
+                "price": round(float(prices[i]), 2),
+                "amount": 0.001,
+                "timestamp": (start + timedelta(minutes=int(minutes[i]))).isoformat(),
+            }
+        )
+
+
+def order_status_lines(n, seed=SEED):
+    """Rader i formatet som listen_order_updates skriver till order_status_log.txt."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1)
+    amounts = np.where(rng.random(n) < 0.5, 0.001, -0.001)
+    executed = rng.random(n) < 0.8
+    prices = 30_000 * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    minutes = np.cumsum(rng.integers(1, 30, n))
+    for i in range(n):
+        stamp = start + timedelta(minutes=int(minutes[i]))
+        status = "EXECUTED @ {:.2f}".format(prices[i]) if executed[i] else "CANCELED"
+        info = [
+            1000 + i,
+            None,
+            i,
+            "tTESTBTC:TESTUSD",
+            0,
+            0,
+            float(amounts[i]),
+            float(amounts[i]),
+            "EXCHANGE LIMIT",
+            None,
+            None,
+            None,
+            0,
+            status,
+            None,
+            None,
+            round(float(prices[i]), 2),
+            round(float(prices[i]), 2),
+        ]
+        yield (
+            f"{stamp.strftime('%Y-%m-%d %H:%M:%S.%f')}: Order-ID: {1000 + i}, "
+            f"Status: {status}, Info: {info}"
+        )
+
+
+def write_lines(path, lines):
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+    return path
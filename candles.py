@@ -0,0 +1,289 @@
+"""
+Kompakt, kolumnvis representation av OHLCV-staplar och indikatorer.
+
+Staplarna lagras som sammanhängande numpy-arrayer: tidsstämplar som int64
+epoch-millisekunder, priser/volym/indikatorer som float32 eller float64 och
+booleska filter (högvolym, handelstimmar) bitpackade i en uint8 per stapel.
+Indikatorerna beräknas direkt på arrayerna via ``indicator_graph`` (uppkonverterat
+till float64, som talib kräver) och konvertering till pandas sker bara vid API-gränsen via ``to_frame``.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from indicator_graph import DEFAULT_INDICATORS, IndicatorGraph, IndicatorParams
+
+MS_PER_HOUR = 3_600_000
+
+OHLCV_FIELDS = ("open", "high", "low", "close", "volume")
+
+# Bitflaggor per stapel
+FLAG_HIGH_VOLUME = 1 << 0
+FLAG_TRADING_HOURS = 1 << 1
+FLAGS = {
+    "high_volume": FLAG_HIGH_VOLUME,
+    "within_trading_hours": FLAG_TRADING_HOURS,
+}
+
+# Kolumnordning i calculate_indicators utdata
+FRAME_COLUMNS = (
+    "ema",
+    "atr",
+    "avg_volume",
+    "high_volume",
+    "rsi",
+    "adx",
+    "hour",
+    "within_trading_hours",
+)
+
+
+class CandleArray:
+    """
+    OHLCV-staplar och beräknade indikatorer som kolumnvisa numpy-arrayer.
+
+    Kolumner hämtas med ``candles["close"]``; flaggnamn (se FLAGS) ger en boolsk
+    array och ``candles["hour"]`` UTC-timmen. Skivning (``candles[10:20]``) ger
+    vyer utan kopiering.
+
+    Args:
+        timestamps: Epoch-millisekunder per stapel
+        open/high/low/close/volume: Pris- och volymkolumner
+        dtype: np.float32 för halverat minne eller np.float64 för full precision
+    """
+
+    __slots__ = (
+        "timestamps",
+        "open",
+        "high",
+        "low",
+        "close",
+        "volume",
+        "indicators",
+        "flags",
+        "dtype",
+    )
+
+    def __init__(
+        self,
+        timestamps,
+        open,
+        high,
+        low,
+        close,
+        volume,
+        dtype=np.float64,
+        indicators: Optional[Dict[str, np.ndarray]] = None,
+        flags: Optional[np.ndarray] = None,
+    ):
+        self.dtype = np.dtype(dtype)
+        self.timestamps = np.ascontiguousarray(timestamps, dtype=np.int64)
+        self.open = np.ascontiguousarray(open, dtype=self.dtype)
+        self.high = np.ascontiguousarray(high, dtype=self.dtype)
+        self.low = np.ascontiguousarray(low, dtype=self.dtype)
+        self.close = np.ascontiguousarray(close, dtype=self.dtype)
+        self.volume = np.ascontiguousarray(volume, dtype=self.dtype)
+        self.indicators = indicators if indicators is not None else {}
+        self.flags = (
+            flags if flags is not None else np.zeros(len(self.timestamps), np.uint8)
+        )
+
+    @classmethod
+    def from_ohlcv(cls, ohlcv, dtype=np.float64) -> "CandleArray":
+        """Från ccxt ``fetch_ohlcv``: [[timestamp, open, high, low, close, volume], ...]."""
+        if len(ohlcv) == 0:
+            return cls(*([np.empty(0)] * 6), dtype=dtype)
+        raw = np.asarray(ohlcv, dtype=np.float64)
+        return cls(raw[:, 0].astype(np.int64), *raw[:, 1:6].T, dtype=dtype)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, dtype=np.float64) -> "CandleArray":
+        """Från en OHLCV-DataFrame med 'datetime'-kolumn (som fetch_market_data)."""
+        timestamps = frame["datetime"].to_numpy(dtype="datetime64[ms]").astype(np.int64)
+        return cls(
+            timestamps,
+            *(frame[field].to_numpy(dtype=np.float64) for field in OHLCV_FIELDS),
+            dtype=dtype,
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def columns(self) -> List[str]:
+        return ["timestamp", *OHLCV_FIELDS, *self.indicators, *FLAGS, "hour"]
+
+    def __contains__(self, name) -> bool:
+        return name in self.columns
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return CandleArray(
+                self.timestamps[key],
+                *(getattr(self, field)[key] for field in OHLCV_FIELDS),
+                dtype=self.dtype,
+                indicators={k: v[key] for k, v in self.indicators.items()},
+                flags=self.flags[key],
+            )
+        if key == "timestamp":
+            return self.timestamps
+        if key in OHLCV_FIELDS:
+            return getattr(self, key)
+        if key in FLAGS:
+            return (self.flags & FLAGS[key]) != 0
+        if key == "hour":
+            return (self.timestamps // MS_PER_HOUR) % 24
+        return self.indicators[key]
+
+    def set_flag(self, name: str, values):
+        # Ny array: skivor delar annars flaggbuffert med ursprunget
+        bit = FLAGS[name]
+        kept = self.flags & np.uint8(~bit & 0xFF)
+        self.flags = kept | np.where(values, bit, 0).astype(np.uint8)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.timestamps, self.flags, *self.indicators.values()]
+        arrays += [getattr(self, field) for field in OHLCV_FIELDS]
+        return sum(array.nbytes for array in arrays)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Som calculate_indicators-utdata: timestamp-index och UTC-'datetime'."""
+        frame = pd.DataFrame(
+            {field: getattr(self, field) for field in OHLCV_FIELDS},
+            index=pd.Index(self.timestamps, name="timestamp"),
+        )
+        frame["datetime"] = pd.to_datetime(self.timestamps, unit="ms", utc=True)
+        if self.indicators:
+            # Samma kolumnordning som calculate_indicators
+            for name in FRAME_COLUMNS:
+                if name in self.indicators or name in FLAGS or name == "hour":
+                    frame[name] = self[name]
+        for name, values in self.indicators.items():
+            if name not in frame:
+                frame[name] = values
+        return frame
+
+
+def compute_indicators(
+    candles: CandleArray,
+    ema_length,
+    volume_multiplier,
+    trading_start_hour,
+    trading_end_hour,
+    indicators: Optional[Iterable[str]] = None,
+    **params,
+) -> CandleArray:
+    """
+    Samma indikatorer som calculate_indicators, beräknade direkt på arrayerna.
+
+    Args:
+        indicators: Indikatorer att beräkna (se indicator_graph); standard är
+            samma kolumner som calculate_indicators. Bara deras beroenden
+            beräknas.
+        params: Övriga IndicatorParams, t.ex. macd_fast eller bb_length
+
+    Resultaten lagras i candles (indikatorer i candles.dtype, filter som bitflaggor)
+    och candles returneras.
+    """
+    graph = IndicatorGraph.from_candles(
+        candles,
+        IndicatorParams(
+            ema_length,
+            volume_multiplier,
+            trading_start_hour,
+            trading_end_hour,
+            **params,
+        ),
+    )
+    names = DEFAULT_INDICATORS if indicators is None else indicators
+    for name, values in graph.evaluate(names).items():
+        if name in FLAGS:
+            candles.set_flag(name, values)
+        elif name != "hour":
+            # hour härleds alltid ur tidsstämplarna
+            candles.indicators[name] = values.astype(candles.dtype, copy=False)
+    return candles
+
+
+def concat(parts: List[CandleArray], dtype=np.float64) -> CandleArray:
+    """Slår ihop staplar (bara OHLCV; indikatorer räknas om efteråt)."""
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return CandleArray(*([np.empty(0)] * 6), dtype=dtype)
+    return CandleArray(
+        np.concatenate([part.timestamps for part in parts]),
+        *(
+            np.concatenate([getattr(part, field) for part in parts])
+            for field in OHLCV_FIELDS
+        ),
+        dtype=dtype,
+    )
+
+
+class CandleBuffer:
+    """
+    Rullande buffert med de senaste ``capacity`` staplarna för en symbol.
+
+    Nya staplar slås in med ``merge``: staplar med samma tidsstämpel ersätts
+    (den sista stapeln är ofta ofullständig) och äldre än fönstret kastas.
+    Bufferten kan sparas och återställas (se checkpoint.py), så att bara gapet
+    sedan senaste stapeln behöver hämtas efter en omstart.
+
+    Args:
+        capacity: Antal staplar som behålls
+        dtype: Flyttalstyp för kolumnerna
+    """
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.candles = concat([], dtype)
+
+    def __len__(self) -> int:
+        return len(self.candles)
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        if not len(self.candles):
+            return None
+        return int(self.candles.timestamps[-1])
+
+    def merge(self, new: CandleArray) -> int:
+        """
+        Lägger till new (sorterad på tid) och returnerar antal nya staplar.
+        """
+        if not len(new):
+            return 0
+        old = self.candles
+        keep = int(np.searchsorted(old.timestamps, new.timestamps[0], side="left"))
+        added = len(new) - (len(old) - keep)
+        merged = concat([old[:keep], new], self.dtype)
+        if len(merged) > self.capacity:
+            first = len(merged) - self.capacity
+            merged = merged[first:]
+        self.candles = merged
+        return max(added, 0)
+
+    def clear(self):
+        self.candles = concat([], self.dtype)
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """OHLCV-kolumnerna som arrayer (för checkpoint)."""
+        candles = self.candles
+        arrays = {"timestamp": candles.timestamps}
+        arrays.update({field: getattr(candles, field) for field in OHLCV_FIELDS})
+        return arrays
+
+    def restore(self, arrays: Dict[str, np.ndarray]):
+        """Ersätter bufferten med staplar från snapshot()."""
+        self.clear()
+        self.merge(
+            CandleArray(
+                arrays["timestamp"],
+                *(arrays[field] for field in OHLCV_FIELDS),
+                dtype=self.dtype,
+            )
+        )
@@ -0,0 +1,187 @@
+"""
+Checkpoints för varm omstart av boten.
+
+Delar av botens tillstånd (candle-buffert, riskräknare, ordercache) registreras
+hos en ``Checkpointer`` med en dump- och en load-funktion. ``save`` skriver
+alla delar till en binärfil och ``restore`` läser tillbaka dem vid start, så
+att boten bara behöver hämta gapet sedan senaste stapeln.
+
+Filformat (little endian)::
+
+    magic "TBCP" | version u16 | metadata-längd u32 | metadata (JSON) | arrayer
+
+Metadata innehåller varje dels JSON-tillstånd och, för numpy-arrayer, dtype,
+form och position i arraydelen. Filen skrivs till en temporär fil, fsync:as och
+byter namn atomiskt, så en krasch under skrivning lämnar den gamla kvar.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TBCP"
+VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+
+# dump() -> (JSON-kompatibelt tillstånd, {namn: np.ndarray})
+DumpFn = Callable[[], Tuple[dict, Dict[str, np.ndarray]]]
+LoadFn = Callable[[dict, Dict[str, np.ndarray]], None]
+
+
+class CheckpointError(Exception):
+    """Checkpointfilen saknas inte men kan inte läsas."""
+
+
+def write_checkpoint(path: str, sections: Dict[str, Tuple[dict, dict]]):
+    """Skriver sektioner {namn: (tillstånd, arrayer)} atomiskt till path."""
+    meta = {"created": time.time(), "sections": {}}
+    blobs = []
+    offset = 0
+    for name, (state, arrays) in sections.items():
+        described = {}
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            described[key] = [array.dtype.str, list(array.shape), offset, array.nbytes]
+            blobs.append(array.tobytes())
+            offset += array.nbytes
+        meta["sections"][name] = {"state": state, "arrays": described}
+    encoded = json.dumps(meta, separators=(",", ":")).encode()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        for blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_checkpoint(path: str) -> Tuple[float, Dict[str, Tuple[dict, dict]]]:
+    """
+    Läser en checkpoint.
+
+    Returns:
+        (skapad, {namn: (tillstånd, arrayer)})
+
+    Raises:
+        FileNotFoundError: Om filen saknas
+        CheckpointError: Om filen är trasig eller har fel version
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        magic, version, meta_len = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise CheckpointError(f"Okänt checkpointformat i {path}")
+        start = _HEADER.size
+        base = start + meta_len
+        meta = json.loads(data[start:base])
+        sections = {}
+        for name, section in meta["sections"].items():
+            arrays = {}
+            for key, (dtype, shape, offset, nbytes) in section["arrays"].items():
+                if base + offset + nbytes > len(data):
+                    raise CheckpointError(f"Avkortad checkpoint: {path}")
+                arrays[key] = (
+                    np.frombuffer(
+                        data, dtype, nbytes // np.dtype(dtype).itemsize, base + offset
+                    )
+                    .reshape(shape)
+                    .copy()
+                )
+            sections[name] = (section["state"], arrays)
+        return meta["created"], sections
+    except (struct.error, ValueError, KeyError, TypeError) as e:
+        raise CheckpointError(f"Trasig checkpoint {path}: {e}") from e
+
+
+class Checkpointer:
+    """
+    Sparar och återställer registrerade delar av botens tillstånd.
+
+    Args:
+        path: Checkpointfil
+        interval: Sekunder mellan periodiska checkpoints i run()
+        max_age: Äldre checkpoints ignoreras vid restore (sekunder)
+    """
+
+    def __init__(self, path: str, interval: float = 60.0, max_age: float = 86_400):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.saved_at: Optional[float] = None
+        self._sections: Dict[str, Tuple[DumpFn, LoadFn]] = {}
+
+    def register(self, name: str, dump: DumpFn, load: LoadFn):
+        self._sections[name] = (dump, load)
+
+    def save(self) -> bool:
+        sections = {}
+        for name, (dump, _) in self._sections.items():
+            try:
+                sections[name] = dump()
+            except Exception as e:
+                logger.error(f"Checkpoint: kunde inte spara {name}: {e}")
+        try:
+            write_checkpoint(self.path, sections)
+        except OSError as e:
+            logger.error(f"Checkpoint: kunde inte skriva {self.path}: {e}")
+            return False
+        self.saved_at = time.time()
+        return True
+
+    def restore(self) -> Dict[str, bool]:
+        """
+        Läser checkpointen och laddar de delar som finns i den.
+
+        Returns:
+            {namn: True} för varje del som återställdes
+        """
+        try:
+            created, sections = read_checkpoint(self.path)
+        except FileNotFoundError:
+            return {}
+        except (OSError, CheckpointError) as e:
+            logger.warning(f"Checkpoint ignoreras: {e}")
+            return {}
+        age = time.time() - created
+        if age > self.max_age:
+            logger.info(f"Checkpoint ignoreras: {age:.0f} s gammal")
+            return {}
+        restored = {}
+        for name, (state, arrays) in sections.items():
+            entry = self._sections.get(name)
+            if entry is None:
+                continue
+            try:
+                entry[1](state, arrays)
+                restored[name] = True
+            except Exception as e:
+                logger.warning(f"Checkpoint: kunde inte återställa {name}: {e}")
+        logger.info(
+            f"Checkpoint återställd ({age:.0f} s gammal): {', '.join(restored) or '-'}"
+        )
+        return restored
+
+    def age(self) -> Optional[float]:
+        return None if self.saved_at is None else time.time() - self.saved_at
+
+    async def run(self):
+        """Sparar periodiskt och en sista gång när uppgiften avbryts (SIGTERM)."""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                await loop.run_in_executor(None, self.save)
+        finally:
+            # Delarna som skriver tillståndet är redan stoppade; spara synkront
+            self.save()
@@ -0,0 +1,212 @@
+"""
+Sammanslagning av samtidiga, identiska läsanrop mot börsen.
+
+``SingleFlight`` låter den första tråden som frågar efter en nyckel göra
+anropet; trådar som frågar efter samma nyckel medan anropet pågår väntar och
+får samma resultat (eller samma undantag). Inget cachas efter att anropet är
+klart, så data blir aldrig äldre än ett vanligt anrop.
+
+``CoalescingExchange`` är en proxy runt ccxt-exchangen som kör läsmetoderna
+(``COALESCED_METHODS``) genom en SingleFlight med metodnamn och argument som
+nyckel. ``fetch_ticker`` för olika symboler som kommer inom ``batch_window``
+sekunder slås dessutom ihop till ett ``fetch_tickers``-anrop om börsen stöder
+det. Resultatet delas mellan väntande anropare och ska inte ändras.
+"""
+
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from metrics import record_cache
+
+# Läsmetoder där identiska samtidiga anrop slås ihop
+COALESCED_METHODS = frozenset(
+    (
+        "fetch_ticker",
+        "fetch_tickers",
+        "fetch_ohlcv",
+        "fetch_order_book",
+        "fetch_open_orders",
+        "fetch_closed_orders",
+        "fetch_order",
+        "fetch_my_trades",
+        "fetch_balance",
+    )
+)
+
+
+def _freeze(value):
+    """Gör argument (dicts/listor i params) hashbara för nyckeln."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Ett pågående anrop per nyckel; samtidiga anropare delar resultatet."""
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[object, _Call] = {}
+
+    def do(self, key, func: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        record_cache(self.name, not leader)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class TickerBatcher:
+    """
+    Samlar fetch_ticker-anrop under batch_window och gör ett fetch_tickers.
+
+    Den första tråden i ett fönster (ledaren) väntar fönstret ut och hämtar
+    alla symboler som kommit in under tiden. Ledaren väntar bara när det finns
+    samtidiga anrop: ett annat fönster pågår, eller det förra fönstret hade fler
+    än en anropare. Ensamma anrop går därför direkt till fetch_ticker utan
+    fördröjning. Symboler som saknas i svaret hämtas var för sig.
+    """
+
+    def __init__(self, exchange, batch_window: float = 0.005):
+        self.exchange = exchange
+        self.batch_window = batch_window
+        self._lock = threading.Lock()
+        self._pending: Optional[Dict[str, _Call]] = None
+        # Anropare i det öppna fönstret respektive i fönster som hämtas
+        self._joined = 0
+        self._in_flight = 0
+        # Förra fönstret hade flera anropare (antas tills ett ensamt setts)
+        self._busy = True
+
+    def fetch_ticker(self, symbol: str):
+        with self._lock:
+            batch = self._pending
+            leader = batch is None
+            if leader:
+                batch = self._pending = {}
+                self._joined = 0
+                wait = self._busy or self._in_flight > 0
+            self._joined += 1
+            call = batch.get(symbol)
+            if call is None:
+                call = batch[symbol] = _Call()
+        try:
+            if leader:
+                if wait:
+                    time.sleep(self.batch_window)
+                with self._lock:
+                    self._pending = None
+                    self._busy = self._joined > 1
+                    self._in_flight += self._joined
+                self._run(batch)
+            call.done.wait()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _run(self, batch: Dict[str, _Call]):
+        symbols: List[str] = list(batch)
+        tickers = {}
+        if len(symbols) > 1:
+            try:
+                tickers = self.exchange.fetch_tickers(symbols) or {}
+            except Exception:
+                # Faller tillbaka på enskilda anrop nedan
+                tickers = {}
+        for symbol in symbols:
+            call = batch[symbol]
+            try:
+                ticker = tickers.get(symbol)
+                call.result = (
+                    ticker if ticker is not None else self.exchange.fetch_ticker(symbol)
+                )
+            except Exception as e:
+                call.error = e
+            call.done.set()
+
+
+class CoalescingExchange:
+    """
+    Proxy runt en ccxt-exchange som slår ihop identiska samtidiga läsningar.
+
+    Args:
+        exchange: Exchange-objektet (t.ex. InstrumentedExchange)
+        batch_window: Sekunder att samla fetch_ticker för fetch_tickers;
+            0 stänger av batchningen
+    """
+
+    def __init__(self, exchange, batch_window: float = 0.005):
+        object.__setattr__(self, "_exchange", exchange)
+        object.__setattr__(self, "_flight", SingleFlight())
+        object.__setattr__(self, "_wrapped", {})
+        has = getattr(exchange, "has", None) or {}
+        batcher = None
+        if batch_window > 0 and has.get("fetchTickers"):
+            batcher = TickerBatcher(exchange, batch_window)
+        object.__setattr__(self, "_batcher", batcher)
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if name not in COALESCED_METHODS or not callable(attr):
+            return attr
+        cached = self._wrapped.get(name)
+        if cached is not None and cached[0] == attr:
+            return cached[1]
+        flight = self._flight
+        batcher = self._batcher if name == "fetch_ticker" else None
+
+        @functools.wraps(attr)
+        def coalesced(*args, **kwargs):
+            key = (name, _freeze(args), _freeze(kwargs))
+            try:
+                hash(key)
+            except TypeError:
+                return attr(*args, **kwargs)
+            if batcher is not None and len(args) == 1 and not kwargs:
+                return flight.do(key, batcher.fetch_ticker, args[0])
+            return flight.do(key, attr, *args, **kwargs)
+
+        self._wrapped[name] = (attr, coalesced)
+        return coalesced
+
+    def __setattr__(self, name, value):
+        cached = self._wrapped.get(name)
+        if cached is not None and value is cached[1]:
+            value = cached[0]
+        setattr(self._exchange, name, value)
+
+    def __repr__(self):
+        return f"CoalescingExchange({self._exchange!r})"
@@ -0,0 +1,264 @@
+"""
+Indikator- och signalberäkning i en processpool via delat minne.
+
+``ComputePool`` flyttar talib/numpy-arbetet (``compute_indicators`` och
+``fvg_signals``) från event-loopen till arbetsprocesser. Staplarna skickas inte
+som picklade DataFrames: varje symbol har ett block i
+``multiprocessing.shared_memory`` där föräldern skriver OHLCV-kolumnerna och
+arbetsprocessen skriver tillbaka indikatorer, flaggor och signaler. Över
+processgränsen går bara blockets namn, antal staplar och parametrarna.
+
+Blocket återanvänds mellan anropen och växer vid behov; en beräkning per symbol
+pågår åt gången, så flera symboler kan räknas parallellt med ``asyncio.gather``.
+
+Med ``processes=0`` körs samma beräkning i loopens trådpool i stället (för
+utveckling och plattformar utan fork).
+"""
+
+import asyncio
+import atexit
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from candles import OHLCV_FIELDS, CandleArray, compute_indicators
+from fvg import fvg_signals
+from indicator_graph import DEFAULT_INDICATORS
+from metrics import INDICATOR_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Indikatorer som compute_indicators skriver (float64 i blocket)
+INDICATOR_FIELDS = ("ema", "atr", "avg_volume", "rsi", "adx")
+_FLOAT_FIELDS = OHLCV_FIELDS + INDICATOR_FIELDS
+_BYTE_FIELDS = ("flags", "long", "short")
+# Byte per stapel: int64 tidsstämpel, float64-kolumner, uint8-kolumner
+_ROW_BYTES = 8 + 8 * len(_FLOAT_FIELDS) + len(_BYTE_FIELDS)
+
+
+class SignalParams(NamedTuple):
+    ema_length: int
+    volume_multiplier: float
+    trading_start_hour: int
+    trading_end_hour: int
+    atr_multiplier: float
+    lookback: int = 100
+    # Indikatorer som beräknas (se indicator_graph); signalerna behöver FVG_INDICATORS
+    indicators: Tuple[str, ...] = DEFAULT_INDICATORS
+
+
+class ComputeResult(NamedTuple):
+    candles: CandleArray
+    long_signal: np.ndarray
+    short_signal: np.ndarray
+
+
+def _views(buf, capacity: int, n: int) -> Dict[str, np.ndarray]:
+    """Kolumnvyer över ett block med plats för capacity staplar (de n första)."""
+    views = {"timestamp": np.ndarray(n, np.int64, buf, 0)}
+    offset = 8 * capacity
+    for name in _FLOAT_FIELDS:
+        views[name] = np.ndarray(n, np.float64, buf, offset)
+        offset += 8 * capacity
+    for name in _BYTE_FIELDS:
+        views[name] = np.ndarray(n, np.uint8, buf, offset)
+        offset += capacity
+    return views
+
+
+def compute_signals(candles: CandleArray, params: SignalParams) -> ComputeResult:
+    """Indikatorer och FVG-signaler för candles (körs i processen som anropar)."""
+    compute_indicators(
+        candles,
+        params.ema_length,
+        params.volume_multiplier,
+        params.trading_start_hour,
+        params.trading_end_hour,
+        indicators=params.indicators,
+    )
+    long_signal, short_signal = fvg_signals(
+        candles, params.atr_multiplier, params.lookback
+    )
+    return ComputeResult(candles, long_signal, short_signal)
+
+
+# --- Arbetsprocessen ---
+
+# Öppnade block per symbol i arbetsprocessen (namn byts när blocket växer)
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach(symbol: str, name: str) -> shared_memory.SharedMemory:
+    shm = _attached.get(symbol)
+    if shm is not None and shm.name == name:
+        return shm
+    if shm is not None:
+        shm.close()
+    shm = _attached[symbol] = shared_memory.SharedMemory(name=name)
+    return shm
+
+
+def _compute_shared(
+    symbol: str, name: str, capacity: int, n: int, params: SignalParams
+) -> float:
+    """Beräknar i blocket name och returnerar åtgången tid i sekunder."""
+    started = time.perf_counter()
+    views = _views(_attach(symbol, name).buf, capacity, n)
+    candles = CandleArray(views["timestamp"], *(views[field] for field in OHLCV_FIELDS))
+    result = compute_signals(candles, params)
+    for field in INDICATOR_FIELDS:
+        if field in candles.indicators:
+            views[field][:] = candles.indicators[field]
+    views["flags"][:] = candles.flags
+    views["long"][:] = result.long_signal
+    views["short"][:] = result.short_signal
+    return time.perf_counter() - started
+
+
+def _warm_up():
+    return None
+
+
+# --- Föräldern ---
+
+
+class _Block:
+    __slots__ = ("shm", "capacity", "lock")
+
+    def __init__(self):
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.capacity = 0
+        self.lock = asyncio.Lock()
+
+    def ensure(self, n: int):
+        if n <= self.capacity:
+            return
+        self.release()
+        # Växer med marginal så att några nya staplar inte kräver nytt block
+        capacity = max(n + n // 4, 256)
+        self.shm = shared_memory.SharedMemory(create=True, size=capacity * _ROW_BYTES)
+        self.capacity = capacity
+
+    def release(self):
+        if self.shm is not None:
+            self.shm.close()
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = None
+            self.capacity = 0
+
+
+class ComputePool:
+    """
+    Processpool för indikator- och signalberäkning per symbol.
+
+    Args:
+        processes: Antal arbetsprocesser; 0 = beräkna i loopens trådpool
+        mp_context: multiprocessing-kontext (standard fork där det finns, så
+            att arbetsprocesserna inte importerar om huvudskriptet)
+    """
+
+    def __init__(self, processes: int = 2, mp_context=None):
+        self.processes = processes
+        if mp_context is None and "fork" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("fork")
+        self._mp_context = mp_context
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._blocks: Dict[str, _Block] = {}
+
+    def start(self):
+        """
+        Startar arbetsprocesserna direkt.
+
+        Bör anropas innan processen startat många trådar: med fork kopieras
+        processen, och det är säkrast att göra det tidigt.
+        """
+        if self.processes > 0 and self._executor is None:
+            # Arbetsprocesserna ska dela förälderns resource tracker; startar de
+            # egna städar de bort (eller varnar för) blocken när de avslutas
+            resource_tracker.ensure_running()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=self._mp_context
+            )
+            self._executor.submit(_warm_up).result()
+        return self
+
+    async def compute(
+        self, symbol: str, candles: CandleArray, params: SignalParams
+    ) -> ComputeResult:
+        """
+        Beräknar indikatorer och signaler för symbolens staplar.
+
+        Returns:
+            ComputeResult med nya arrayer (kopierade ur blocket)
+        """
+        loop = asyncio.get_running_loop()
+        if self.processes <= 0:
+            with INDICATOR_SECONDS.labels("compute_signals").time():
+                return await loop.run_in_executor(
+                    None, compute_signals, candles[:], params
+                )
+        self.start()
+        block = self._blocks.get(symbol)
+        if block is None:
+            block = self._blocks[symbol] = _Block()
+        n = len(candles)
+        async with block.lock:
+            block.ensure(n)
+            views = _views(block.shm.buf, block.capacity, n)
+            views["timestamp"][:] = candles.timestamps
+            for field in OHLCV_FIELDS:
+                views[field][:] = getattr(candles, field)
+            elapsed = await loop.run_in_executor(
+                self._executor,
+                _compute_shared,
+                symbol,
+                block.shm.name,
+                block.capacity,
+                n,
+                params,
+            )
+            INDICATOR_SECONDS.labels("compute_pool").observe(elapsed)
+            result = CandleArray(
+                views["timestamp"].copy(),
+                *(views[field].copy() for field in OHLCV_FIELDS),
+                indicators={
+                    field: views[field].copy()
+                    for field in INDICATOR_FIELDS
+                    if field in params.indicators
+                },
+                flags=views["flags"].copy(),
+            )
+            long_signal = views["long"].astype(bool)
+            short_signal = views["short"].astype(bool)
+            # Vyerna måste släppas innan blocket kan stängas
+            del views
+        return ComputeResult(result, long_signal, short_signal)
+
+    def close(self):
+        """Stoppar arbetsprocesserna och tar bort de delade blocken."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        for block in self._blocks.values():
+            block.release()
+        self._blocks.clear()
+
+
+_pool: Optional[ComputePool] = None
+
+
+def get_pool(processes: int = 2) -> ComputePool:
+    """Processens gemensamma ComputePool (stängs vid exit)."""
+    global _pool
+    if _pool is None:
+        _pool = ComputePool(processes)
+        atexit.register(_pool.close)
+    return _pool
@@ -0,0 +1,1166 @@
+"""
+Lokal börssimulator för tester, benchmarks och lasttester utan Bitfinex-konto.
+
+``SimulatedExchange`` implementerar den del av ccxt-gränssnittet som boten och
+API:t använder (OHLCV, ticker, orderbok, ordrar, saldo) med en seedad prisbana,
+konfigurerbar latens och matchning av limitordrar mot prisbanan.
+``SimulatedBitfinexServer`` är en Bitfinex v2-kompatibel websocket-server
+(auth, candles/ticker/trades-kanaler, heartbeats, on/ou/oc/te/ws/wu-händelser) som
+matas av samma simulerade börs.
+
+Starta fristående: ``python exchange_simulator.py --port 8765``
+"""
+
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import ccxt
+import numpy as np
+import websockets
+
+logger = logging.getLogger(__name__)
+
+MS_PER_MINUTE = 60_000
+
+# Tidsramar i minuter (ccxt-notation; Bitfinex använder även 1D/7D)
+TIMEFRAMES = {
+    "1m": 1,
+    "5m": 5,
+    "15m": 15,
+    "30m": 30,
+    "1h": 60,
+    "3h": 180,
+    "6h": 360,
+    "12h": 720,
+    "1d": 1440,
+    "1D": 1440,
+    "1w": 10080,
+    "7D": 10080,
+}
+
+FILL_MODES = ("touch", "through")
+
+DEFAULT_BALANCES = {
+    "TESTUSD": 100_000.0,
+    "TESTBTC": 10.0,
+    "USD": 100_000.0,
+    "BTC": 10.0,
+}
+
+# Index i Bitfinex orderarray (on/ou/oc och info-fältet i ccxt-ordern)
+ORDER_ID = 0
+ORDER_SYMBOL = 3
+ORDER_AMOUNT = 6
+ORDER_AMOUNT_ORIG = 7
+ORDER_TYPE = 8
+ORDER_STATUS = 13
+ORDER_PRICE = 16
+ORDER_PRICE_AVG = 17
+ORDER_FIELDS = 32
+
+
+def _iso(timestamp_ms):
+    return (
+        datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+        .isoformat(timespec="milliseconds")
+        .replace("+00:00", "Z")
+    )
+
+
+def parse_symbol(symbol: str):
+    """'BTC/USD', 'tBTCUSD' eller 'tTESTBTC:TESTUSD' -> (bas, kvot)."""
+    if "/" in symbol:
+        base, quote = symbol.split("/", 1)
+        return base.upper(), quote.split(":")[0].upper()
+    raw = symbol[1:] if symbol.startswith(("t", "f")) else symbol
+    if ":" in raw:
+        base, quote = raw.split(":", 1)
+        return base.upper(), quote.upper()
+    return raw[:3].upper(), raw[3:].upper()
+
+
+def market_id(base, quote):
+    """Bitfinex-id för ett par, t.ex. tBTCUSD eller tTESTBTC:TESTUSD."""
+    separator = ":" if len(base) > 3 or len(quote) > 3 else ""
+    return f"t{base}{separator}{quote}"
+
+
+class _PricePath:
+    """
+    Seedad slumpvandring med en stängningskurs per minut, genererad vid behov.
+
+    Priset inom en minut interpoleras linjärt mellan föregående och aktuell
+    stängning, så banan är deterministisk för en given tidpunkt.
+    """
+
+    BLOCK = 1024
+
+    def __init__(self, rng, start_price, volatility, origin_minute):
+        self._rng = rng
+        self.start_price = start_price
+        self.volatility = volatility
+        self.origin = origin_minute
+        self._closes = np.empty(0)
+        self._wicks = np.empty((0, 2))
+        self._volumes = np.empty(0)
+
+    def ensure(self, minute):
+        needed = minute - self.origin + 1
+        while len(self._closes) < needed:
+            steps = self._rng.normal(0, self.volatility, self.BLOCK)
+            last = self._closes[-1] if len(self._closes) else self.start_price
+            closes = last * np.exp(np.cumsum(steps))
+            wicks = np.abs(self._rng.normal(0, self.volatility / 2, (self.BLOCK, 2)))
+            volumes = self._rng.lognormal(0, 0.5, self.BLOCK)
+            self._closes = np.concatenate([self._closes, closes])
+            self._wicks = np.concatenate([self._wicks, wicks])
+            self._volumes = np.concatenate([self._volumes, volumes])
+
+    def _close(self, minute):
+        if minute < self.origin:
+            return self.start_price
+        self.ensure(minute)
+        return float(self._closes[minute - self.origin])
+
+    def price_at(self, timestamp_ms):
+        minute, offset = divmod(int(timestamp_ms), MS_PER_MINUTE)
+        start = self._close(minute - 1)
+        return start + (self._close(minute) - start) * offset / MS_PER_MINUTE
+
+    def range_between(self, start_ms, end_ms):
+        """Lägsta och högsta pris på banan mellan två tidpunkter."""
+        prices = [self.price_at(start_ms), self.price_at(end_ms)]
+        first = int(start_ms) // MS_PER_MINUTE
+        last = int(end_ms) // MS_PER_MINUTE
+        if last > first:
+            self.ensure(last)
+            lo = max(first, self.origin) - self.origin
+            hi = last - self.origin
+            if hi > lo:
+                prices.extend(self._closes[lo:hi].tolist())
+        return min(prices), max(prices)
+
+    def minute_candles(self, first, last, now_ms):
+        """OHLCV-arrayer per minut för [first, last]; sista minuten kan vara pågående."""
+        first = max(first, self.origin)
+        if last < first:
+            return [np.empty(0)] * 6
+        self.ensure(last)
+        idx = np.arange(first, last + 1) - self.origin
+        closes = self._closes[idx]
+        opens = np.where(
+            idx > 0, self._closes[np.maximum(idx - 1, 0)], self.start_price
+        )
+        highs = np.maximum(opens, closes) * (1 + self._wicks[idx, 0])
+        lows = np.minimum(opens, closes) * (1 - self._wicks[idx, 1])
+        volumes = self._volumes[idx].copy()
+        current = int(now_ms) // MS_PER_MINUTE
+        if last == current:
+            # Pågående minut: stängning = aktuellt pris, andel av volymen
+            price = self.price_at(now_ms)
+            part = (int(now_ms) % MS_PER_MINUTE) / MS_PER_MINUTE
+            closes = closes.copy()
+            closes[-1] = price
+            highs[-1] = max(opens[-1], price)
+            lows[-1] = min(opens[-1], price)
+            volumes[-1] *= part
+        timestamps = np.arange(first, last + 1, dtype=np.int64) * MS_PER_MINUTE
+        return timestamps, opens, highs, lows, closes, volumes
+
+
+class SimulatedExchange:
+    """
+    ccxt-kompatibel simulerad börs (Bitfinex-flavour).
+
+    Args:
+        start_price: Startpris för varje symbol
+        volatility: Standardavvikelse för log-avkastning per minut
+        spread_bps: Spread mellan bid och ask i baspunkter
+        depth: Antal nivåer per sida i orderboken
+        latency: Fördröjning i sekunder per anrop
+        latency_jitter: Maximal slumpmässig extra fördröjning i sekunder
+        fill_mode: 'touch' (limit fylls när priset når nivån) eller 'through'
+            (priset måste passera nivån)
+        fill_probability: Sannolikhet att en nådd limitorder fylls vid en kontroll
+        slippage_bps: Extra prisförsämring för marknadsordrar i baspunkter
+        maker_fee/taker_fee: Avgifter för limit- resp. marknadsfyllnader
+        balances: Startsaldon per valuta
+        history_minutes: Hur långt bakåt OHLCV-historik finns
+        seed: Seed för prisbanor och fyllnadsslump
+        clock: Funktion som returnerar aktuell tid i millisekunder
+    """
+
+    id = "bitfinex"
+    name = "Bitfinex (simulator)"
+    has = {"fetchTickers": True, "fetchOHLCV": True, "fetchOrderBook": True}
+
+    def __init__(
+        self,
+        start_price: float = 30_000.0,
+        volatility: float = 1e-3,
+        spread_bps: float = 2.0,
+        depth: int = 25,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        fill_mode: str = "touch",
+        fill_probability: float = 1.0,
+        slippage_bps: float = 0.0,
+        maker_fee: float = 0.001,
+        taker_fee: float = 0.002,
+        balances: Optional[Dict[str, float]] = None,
+        history_minutes: int = 60 * 24 * 30,
+        seed: int = 0,
+        clock: Optional[Callable[[], int]] = None,
+    ):
+        if fill_mode not in FILL_MODES:
+            raise ValueError(f"Okänt fill_mode {fill_mode!r}, välj bland {FILL_MODES}")
+        self.start_price = start_price
+        self.volatility = volatility
+        self.spread_bps = spread_bps
+        self.depth = depth
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.fill_mode = fill_mode
+        self.fill_probability = fill_probability
+        self.slippage_bps = slippage_bps
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.history_minutes = history_minutes
+        self.seed = seed
+        self.clock = clock or (lambda: int(time.time() * 1000))
+        self.options = {}
+        self.markets = {}
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+        self._paths: Dict[str, _PricePath] = {}
+        self._balances = dict(DEFAULT_BALANCES if balances is None else balances)
+        self._reserved: Dict[str, float] = {}
+        self._orders: Dict[str, dict] = {}
+        self._open: Dict[str, dict] = {}
+        self._trades: List[dict] = []
+        self._last_check: Dict[str, int] = {}
+        self._ids = itertools.count(int(self.clock()))
+        self._trade_ids = itertools.count(1)
+        self._listeners: List[Callable[[str, list], None]] = []
+
+    # --- Hjälpfunktioner ---
+
+    def _delay(self):
+        if self.latency or self.latency_jitter:
+            time.sleep(self.latency + self.latency_jitter * float(self._rng.random()))
+
+    def _market(self, symbol):
+        base, quote = parse_symbol(symbol)
+        unified = f"{base}/{quote}"
+        if unified not in self.markets:
+            self.markets[unified] = {
+                "id": market_id(base, quote),
+                "symbol": unified,
+                "base": base,
+                "quote": quote,
+                "type": "spot",
+                "spot": True,
+                "active": True,
+                "precision": {"amount": 8, "price": 5},
+                "limits": {"amount": {"min": 1e-5, "max": None}},
+            }
+        return self.markets[unified]
+
+    def _path(self, symbol):
+        market = self._market(symbol)
+        unified = market["symbol"]
+        if unified not in self._paths:
+            rng = np.random.default_rng([self.seed, zlib.crc32(unified.encode())])
+            origin = int(self.clock()) // MS_PER_MINUTE - self.history_minutes
+            self._paths[unified] = _PricePath(
+                rng, self.start_price, self.volatility, origin
+            )
+        return self._paths[unified]
+
+    def _quote(self, symbol, now):
+        mid = self._path(symbol).price_at(now)
+        half = mid * self.spread_bps / 20_000
+        return mid - half, mid + half
+
+    def add_listener(self, callback: Callable[[str, list], None]):
+        """Registrerar mottagare av privata händelser (t.ex. websocket-servern)."""
+        self._listeners.append(callback)
+
+    def _emit(self, event, payload):
+        for callback in list(self._listeners):
+            try:
+                callback(event, payload)
+            except Exception as e:
+                logger.error(f"Simulator-lyssnare misslyckades: {e}")
+
+    def safe_currency_code(self, code, currency=None):
+        return {"UST": "USDT"}.get(code, code)
+
+    def market_id(self, symbol):
+        return self._market(symbol)["id"]
+
+    def load_markets(self, reload=False, params=None):
+        for symbol in self._paths or ["TESTBTC/TESTUSD"]:
+            self._market(symbol)
+        return self.markets
+
+    # --- Marknadsdata ---
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        self._delay()
+        if timeframe not in TIMEFRAMES:
+            raise ccxt.BadRequest(f"Tidsram stöds inte: {timeframe}")
+        minutes = TIMEFRAMES[timeframe]
+        limit = limit or 100
+        with self._lock:
+            now = int(self.clock())
+            path = self._path(symbol)
+            current_bucket = now // MS_PER_MINUTE // minutes
+            if since is None:
+                first_bucket = current_bucket - limit + 1
+            else:
+                first_bucket = -(-int(since) // (MS_PER_MINUTE * minutes))
+            first_bucket = max(first_bucket, -(-path.origin // minutes))
+            last_bucket = min(first_bucket + limit - 1, current_bucket)
+            if last_bucket < first_bucket:
+                return []
+            last_minute = min((last_bucket + 1) * minutes - 1, now // MS_PER_MINUTE)
+            ts, o, h, lo, c, v = path.minute_candles(
+                first_bucket * minutes, last_minute, now
+            )
+        if len(ts) == 0:
+            return []
+        buckets = ts // (MS_PER_MINUTE * minutes)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(ts)] - 1
+        values = np.column_stack(
+            [
+                o[starts],
+                np.maximum.reduceat(h, starts),
+                np.minimum.reduceat(lo, starts),
+                c[ends],
+                np.add.reduceat(v, starts),
+            ]
+        ).tolist()
+        # Tidsstämplar som int, som ccxt
+        opened = (buckets[starts] * MS_PER_MINUTE * minutes).tolist()
+        return [[stamp, *row] for stamp, row in zip(opened, values)]
+
+    def fetch_ticker(self, symbol, params=None):
+        self._delay()
+        with self._lock:
+            self._match_all()
+            now = int(self.clock())
+            market = self._market(symbol)
+            bid, ask = self._quote(symbol, now)
+            last = self._path(symbol).price_at(now)
+            first = now // MS_PER_MINUTE - 24 * 60 + 1
+            _, o, h, lo, _, v = self._path(symbol).minute_candles(
+                first, now // MS_PER_MINUTE, now
+            )
+        open_ = float(o[0]) if len(o) else last
+        return {
+            "symbol": market["symbol"],
+            "timestamp": now,
+            "datetime": _iso(now),
+            "high": float(h.max()) if len(h) else last,
+            "low": float(lo.min()) if len(lo) else last,
+            "bid": bid,
+            "bidVolume": None,
+            "ask": ask,
+            "askVolume": None,
+            "open": open_,
+            "close": last,
+            "last": last,
+            "change": last - open_,
+            "percentage": (last / open_ - 1) * 100 if open_ else None,
+            "baseVolume": float(v.sum()) if len(v) else 0.0,
+            "info": [market["id"], bid, 0.0, ask, 0.0, last - open_, last],
+        }
+
+    def fetch_tickers(self, symbols=None, params=None):
+        symbols = symbols or list(self.markets) or ["TESTBTC/TESTUSD"]
+        return {
+            ticker["symbol"]: ticker
+            for ticker in (self.fetch_ticker(symbol) for symbol in symbols)
+        }
+
+    def fetch_order_book(self, symbol, limit=None, params=None):
+        self._delay()
+        depth = min(limit or self.depth, self.depth)
+        with self._lock:
+            self._match_all()
+            now = int(self.clock())
+            bid, ask = self._quote(symbol, now)
+        step = max(bid * self.spread_bps / 20_000, 1e-8)
+        levels = np.arange(depth)
+        sizes = np.round(0.05 * (1 + levels) ** 1.2, 8).tolist()
+        return {
+            "symbol": self._market(symbol)["symbol"],
+            "bids": [[bid - i * step, s] for i, s in zip(levels.tolist(), sizes)],
+            "asks": [[ask + i * step, s] for i, s in zip(levels.tolist(), sizes)],
+            "timestamp": now,
+            "datetime": _iso(now),
+            "nonce": None,
+        }
+
+    # --- Ordrar ---
+
+    def _order_array(self, order, status):
+        info = [None] * ORDER_FIELDS
+        signed = order["amount"] if order["side"] == "buy" else -order["amount"]
+        remaining = (
+            order["remaining"] if order["side"] == "buy" else -order["remaining"]
+        )
+        info[ORDER_ID] = int(order["id"])
+        info[2] = order["clientOrderId"]
+        info[ORDER_SYMBOL] = self._market(order["symbol"])["id"]
+        info[4] = order["timestamp"]
+        info[5] = order["lastUpdateTimestamp"]
+        info[ORDER_AMOUNT] = remaining
+        info[ORDER_AMOUNT_ORIG] = signed
+        info[ORDER_TYPE] = order["bitfinexType"]
+        info[ORDER_STATUS] = status
+        info[ORDER_PRICE] = order["price"] or 0.0
+        info[ORDER_PRICE_AVG] = order["average"] or 0.0
+        return info
+
+    def _public(self, order):
+        out = {k: v for k, v in order.items() if k not in ("bitfinexType", "reserved")}
+        out["fee"] = dict(order["fee"])
+        out["trades"] = list(order["trades"])
+        return out
+
+    def _balance(self, currency):
+        return self._balances.get(currency, 0.0)
+
+    def _available(self, currency):
+        return self._balance(currency) - self._reserved.get(currency, 0.0)
+
+    def _wallet_array(self, currency):
+        return [
+            "exchange",
+            currency,
+            self._balance(currency),
+            0,
+            self._available(currency),
+            None,
+            None,
+        ]
+
+    def _fill(self, order, price, taker):
+        market = self._market(order["symbol"])
+        base, quote = market["base"], market["quote"]
+        amount = order["remaining"]
+        cost = amount * price
+        fee = cost * (self.taker_fee if taker else self.maker_fee)
+        if order["reserved"]:
+            currency, reserved = order["reserved"]
+            self._reserved[currency] = self._reserved.get(currency, 0.0) - reserved
+            order["reserved"] = None
+        if order["side"] == "buy":
+            self._balances[quote] = self._balance(quote) - cost - fee
+            self._balances[base] = self._balance(base) + amount
+        else:
+            self._balances[base] = self._balance(base) - amount
+            self._balances[quote] = self._balance(quote) + cost - fee
+        now = int(self.clock())
+        trade = {
+            "id": str(next(self._ids)),
+            "order": order["id"],
+            "symbol": order["symbol"],
+            "timestamp": now,
+            "datetime": _iso(now),
+            "side": order["side"],
+            "type": order["type"],
+            "takerOrMaker": "taker" if taker else "maker",
+            "price": price,
+            "amount": amount,
+            "cost": cost,
+            "fee": {"cost": fee, "currency": quote},
+        }
+        self._trades.append(trade)
+        order.update(
+            filled=order["amount"],
+            remaining=0.0,
+            cost=cost,
+            average=price,
+            status="closed",
+            lastTradeTimestamp=now,
+            lastUpdateTimestamp=now,
+        )
+        order["fee"] = {"cost": fee, "currency": quote}
+        order["trades"].append(trade)
+        self._open.pop(order["id"], None)
+        status = f"EXECUTED @ {price:.5f}({order['amount'] if order['side'] == 'buy' else -order['amount']})"
+        info = self._order_array(order, status)
+        order["info"] = info
+        signed = amount if order["side"] == "buy" else -amount
+        self._emit(
+            "te",
+            [
+                int(trade["id"]),
+                market["id"],
+                now,
+                int(order["id"]),
+                signed,
+                price,
+                order["bitfinexType"],
+                order["price"] or price,
+                1 if not taker else -1,
+                -fee,
+                quote,
+                order["clientOrderId"],
+            ],
+        )
+        self._emit("oc", info)
+        self._emit("wu", self._wallet_array(base))
+        self._emit("wu", self._wallet_array(quote))
+
+    def _match(self, symbol):
+        """Fyller vilande limitordrar som prisbanan nått sedan förra kontrollen."""
+        unified = self._market(symbol)["symbol"]
+        now = int(self.clock())
+        since = self._last_check.get(unified, now)
+        self._last_check[unified] = now
+        resting = [o for o in self._open.values() if o["symbol"] == unified]
+        if not resting:
+            return
+        low, high = self._path(symbol).range_between(since, now)
+        half = self.spread_bps / 20_000
+        best_ask, best_bid = low * (1 + half), high * (1 - half)
+        for order in resting:
+            limit = order["price"]
+            if order["side"] == "buy":
+                hit = (
+                    best_ask <= limit if self.fill_mode == "touch" else best_ask < limit
+                )
+            else:
+                hit = (
+                    best_bid >= limit if self.fill_mode == "touch" else best_bid > limit
+                )
+            if hit and self._rng.random() < self.fill_probability:
+                self._fill(order, limit, taker=False)
+
+    def _match_all(self):
+        for symbol in {o["symbol"] for o in self._open.values()}:
+            self._match(symbol)
+
+    def step(self):
+        """Kör matchning för alla öppna ordrar (anropas periodiskt av servern)."""
+        with self._lock:
+            self._match_all()
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self._delay()
+        params = params or {}
+        type = type.lower()
+        if side not in ("buy", "sell"):
+            raise ccxt.InvalidOrder(f"Ogiltig sida: {side}")
+        if type not in ("limit", "market"):
+            raise ccxt.InvalidOrder(f"Ordertyp stöds inte: {type}")
+        if amount is None or amount <= 0:
+            raise ccxt.InvalidOrder(f"Ogiltig mängd: {amount}")
+        if type == "limit" and (price is None or price <= 0):
+            raise ccxt.InvalidOrder("Limitorder kräver ett positivt pris")
+        with self._lock:
+            market = self._market(symbol)
+            now = int(self.clock())
+            self._match(symbol)
+            bid, ask = self._quote(symbol, now)
+            marketable = type == "market" or (
+                price >= ask if side == "buy" else price <= bid
+            )
+            if type == "market":
+                slip = self.slippage_bps / 10_000
+                fill_price = ask * (1 + slip) if side == "buy" else bid * (1 - slip)
+            else:
+                fill_price = ask if side == "buy" else bid
+            # Reservera medel för vilande ordrar; kontrollera täckning för alla
+            if side == "buy":
+                currency = market["quote"]
+                needed = amount * (fill_price if marketable else price)
+                needed *= 1 + max(self.maker_fee, self.taker_fee)
+            else:
+                currency, needed = market["base"], amount
+            if self._available(currency) < needed:
+                raise ccxt.InsufficientFunds(
+                    f"Otillräckligt saldo {currency}: {self._available(currency)} < {needed}"
+                )
+            bitfinex_type = params.get("type") or (
+                "EXCHANGE LIMIT" if type == "limit" else "EXCHANGE MARKET"
+            )
+            order = {
+                "id": str(next(self._ids)),
+                "clientOrderId": params.get("cid"),
+                "timestamp": now,
+                "datetime": _iso(now),
+                "lastTradeTimestamp": None,
+                "lastUpdateTimestamp": now,
+                "symbol": market["symbol"],
+                "type": type,
+                "timeInForce": "GTC",
+                "side": side,
+                "price": price if type == "limit" else None,
+                "average": None,
+                "amount": float(amount),
+                "filled": 0.0,
+                "remaining": float(amount),
+                "cost": 0.0,
+                "status": "open",
+                "fee": {"cost": 0.0, "currency": market["quote"]},
+                "trades": [],
+                "bitfinexType": bitfinex_type,
+                "reserved": None,
+            }
+            self._orders[order["id"]] = order
+            order["info"] = self._order_array(order, "ACTIVE")
+            self._emit("on", order["info"])
+            if marketable:
+                self._fill(order, fill_price, taker=True)
+            else:
+                self._reserved[currency] = self._reserved.get(currency, 0.0) + needed
+                order["reserved"] = (currency, needed)
+                self._open[order["id"]] = order
+                self._emit("wu", self._wallet_array(currency))
+            return self._public(order)
+
+    def create_limit_order(self, symbol, side, amount, price, params=None):
+        return self.create_order(symbol, "limit", side, amount, price, params)
+
+    def create_market_order(self, symbol, side, amount, price=None, params=None):
+        return self.create_order(symbol, "market", side, amount, None, params)
+
+    def create_limit_buy_order(self, symbol, amount, price, params=None):
+        return self.create_order(symbol, "limit", "buy", amount, price, params)
+
+    def create_limit_sell_order(self, symbol, amount, price, params=None):
+        return self.create_order(symbol, "limit", "sell", amount, price, params)
+
+    def create_market_buy_order(self, symbol, amount, params=None):
+        return self.create_order(symbol, "market", "buy", amount, None, params)
+
+    def create_market_sell_order(self, symbol, amount, params=None):
+        return self.create_order(symbol, "market", "sell", amount, None, params)
+
+    def cancel_order(self, id, symbol=None, params=None):
+        self._delay()
+        with self._lock:
+            order = self._open.pop(str(id), None)
+            if order is None:
+                raise ccxt.OrderNotFound(f"Order {id} finns inte eller är inte öppen")
+            if order["reserved"]:
+                currency, reserved = order["reserved"]
+                self._reserved[currency] = self._reserved.get(currency, 0.0) - reserved
+                order["reserved"] = None
+                self._emit("wu", self._wallet_array(currency))
+            now = int(self.clock())
+            order.update(status="canceled", lastUpdateTimestamp=now)
+            order["info"] = self._order_array(order, "CANCELED")
+            self._emit("oc", order["info"])
+            return self._public(order)
+
+    def fetch_order(self, id, symbol=None, params=None):
+        self._delay()
+        with self._lock:
+            self._match_all()
+            if str(id) not in self._orders:
+                raise ccxt.OrderNotFound(f"Order {id} finns inte")
+            return self._public(self._orders[str(id)])
+
+    def _filter(self, orders, symbol, since, limit):
+        if symbol:
+            unified = self._market(symbol)["symbol"]
+            orders = [o for o in orders if o["symbol"] == unified]
+        if since:
+            orders = [o for o in orders if o["timestamp"] >= since]
+        orders = [self._public(o) for o in orders]
+        return orders[-limit:] if limit else orders
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._delay()
+        with self._lock:
+            self._match_all()
+            return self._filter(list(self._open.values()), symbol, since, limit)
+
+    def fetch_closed_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._delay()
+        with self._lock:
+            self._match_all()
+            closed = [o for o in self._orders.values() if o["status"] != "open"]
+            return self._filter(closed, symbol, since, limit)
+
+    def fetch_my_trades(self, symbol=None, since=None, limit=None, params=None):
+        self._delay()
+        with self._lock:
+            trades = list(self._trades)
+        if symbol:
+            unified = self._market(symbol)["symbol"]
+            trades = [t for t in trades if t["symbol"] == unified]
+        if since:
+            trades = [t for t in trades if t["timestamp"] >= since]
+        return trades[-limit:] if limit else trades
+
+    def fetch_balance(self, params=None):
+        self._delay()
+        with self._lock:
+            self._match_all()
+            currencies = sorted(set(self._balances) | set(self._reserved))
+            wallets = {
+                code: {
+                    "free": self._available(code),
+                    "used": self._reserved.get(code, 0.0),
+                    "total": self._balance(code),
+                }
+                for code in currencies
+            }
+            info = [self._wallet_array(code) for code in currencies]
+        now = int(self.clock())
+        balance = {
+            "info": info,
+            "timestamp": now,
+            "datetime": _iso(now),
+            "free": {code: w["free"] for code, w in wallets.items()},
+            "used": {code: w["used"] for code, w in wallets.items()},
+            "total": {code: w["total"] for code, w in wallets.items()},
+        }
+        balance.update(wallets)
+        return balance
+
+    def wallet_snapshot(self):
+        with self._lock:
+            currencies = sorted(set(self._balances) | set(self._reserved))
+            return [self._wallet_array(code) for code in currencies]
+
+    def open_order_snapshot(self):
+        with self._lock:
+            return [o["info"] for o in self._open.values()]
+
+    def candle_snapshot(self, symbol, timeframe, limit=240):
+        """Bitfinex-format [MTS, OPEN, CLOSE, HIGH, LOW, VOLUME], nyaste först."""
+        rows = self.fetch_ohlcv(symbol, timeframe, limit=limit)
+        return [[int(t), o, c, h, lo, v] for t, o, h, lo, c, v in reversed(rows)]
+
+    def ticker_array(self, symbol):
+        """Bitfinex ticker: [BID, BID_SIZE, ASK, ASK_SIZE, CHANGE, CHANGE_REL, LAST, VOLUME, HIGH, LOW]."""
+        t = self.fetch_ticker(symbol)
+        change_rel = (t["percentage"] or 0.0) / 100
+        return [
+            t["bid"],
+            1.0,
+            t["ask"],
+            1.0,
+            t["change"],
+            change_rel,
+            t["last"],
+            t["baseVolume"],
+            t["high"],
+            t["low"],
+        ]
+
+    def trade_array(self, symbol, timestamp=None):
+        """Publik trade [ID, MTS, AMOUNT, PRICE] på prisbanan; AMOUNT < 0 är sälj."""
+        with self._lock:
+            now = int(self.clock()) if timestamp is None else int(timestamp)
+            price = self._path(symbol).price_at(now)
+            amount = float(self._rng.lognormal(-4, 1))
+            if self._rng.random() < 0.5:
+                amount = -amount
+            return [next(self._trade_ids), now, amount, price]
+
+    def trade_snapshot(self, symbol, limit=30):
+        """Senaste limit trades (en per sekund), nyaste först."""
+        now = int(self.clock())
+        trades = [
+            self.trade_array(symbol, now - 1000 * age) for age in range(limit, 0, -1)
+        ]
+        return trades[::-1]
+
+
+class _Client:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.authenticated = False
+        self.channels: Dict[int, dict] = {}
+        self.queue: "asyncio.Queue" = asyncio.Queue()
+
+
+class SimulatedBitfinexServer:
+    """
+    Bitfinex v2-kompatibel websocket-server ovanpå en SimulatedExchange.
+
+    Args:
+        exchange: Börsen som levererar data och privata händelser
+        host/port: Adress att lyssna på (port 0 = valfri ledig port)
+        candle_interval: Sekunder mellan candle-uppdateringar per kanal
+        ticker_interval: Sekunder mellan ticker-uppdateringar per kanal
+        trade_interval: Sekunder mellan trades per trades-kanal
+        heartbeat_interval: Sekunder mellan heartbeats
+        latency: Fördröjning i sekunder innan varje meddelande levereras
+        api_key/api_secret: Om satta verifieras auth-signaturen mot dessa
+    """
+
+    def __init__(
+        self,
+        exchange: SimulatedExchange,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        candle_interval: float = 1.0,
+        ticker_interval: float = 1.0,
+        trade_interval: float = 0.25,
+        heartbeat_interval: float = 15.0,
+        latency: float = 0.0,
+        api_key: Optional[str] = None,
+        api_secret: Optional[str] = None,
+    ):
+        self.exchange = exchange
+        self.host = host
+        self.port = port
+        self.candle_interval = candle_interval
+        self.ticker_interval = ticker_interval
+        self.trade_interval = trade_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.latency = latency
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self._clients: List[_Client] = []
+        self._channel_ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop: Optional[asyncio.Event] = None
+        exchange.add_listener(self._on_exchange_event)
+
+    @property
+    def uri(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    # --- Livscykel ---
+
+    def start(self) -> str:
+        """Startar servern i en bakgrundstråd och returnerar dess URI."""
+        ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(ready,), name="bitfinex-simulator", daemon=True
+        )
+        self._thread.start()
+        if not ready.wait(10):
+            raise RuntimeError("Simulatorns websocket-server startade inte")
+        logger.info(f"Bitfinex-simulator lyssnar på {self.uri}")
+        return self.uri
+
+    def stop(self):
+        if self._loop and self._stop:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread:
+            self._thread.join(10)
+
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self.serve(ready))
+        finally:
+            self._loop.close()
+
+    async def serve(self, ready: Optional[threading.Event] = None):
+        """Kör servern i aktuell event loop tills stop() anropas."""
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        async with websockets.serve(self._handle, self.host, self.port) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            if ready:
+                ready.set()
+            pump = asyncio.ensure_future(self._pump())
+            try:
+                await self._stop.wait()
+            finally:
+                pump.cancel()
+
+    # --- Utgående meddelanden ---
+
+    def _enqueue(self, client, message):
+        due = self._loop.time() + self.latency
+        client.queue.put_nowait((due, json.dumps(message)))
+
+    async def _writer(self, client):
+        while True:
+            due, message = await client.queue.get()
+            delay = due - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await client.websocket.send(message)
+
+    def _on_exchange_event(self, event, payload):
+        # Anropas från valfri tråd; leverera i serverns event loop
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._broadcast_private, event, payload)
+
+    def _broadcast_private(self, event, payload):
+        for client in self._clients:
+            if client.authenticated:
+                self._enqueue(client, [0, event, payload])
+
+    # --- Inkommande meddelanden ---
+
+    async def _handle(self, websocket, path=None):
+        client = _Client(websocket)
+        self._clients.append(client)
+        writer = asyncio.ensure_future(self._writer(client))
+        self._enqueue(
+            client,
+            {
+                "event": "info",
+                "version": 2,
+                "serverId": "simulator",
+                "platform": {"status": 1},
+            },
+        )
+        try:
+            async for raw in websocket:
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    self._enqueue(
+                        client, {"event": "error", "msg": "invalid json", "code": 10000}
+                    )
+                    continue
+                self._dispatch(client, message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._clients.remove(client)
+            writer.cancel()
+
+    def _verify_auth(self, message):
+        if self.api_secret is None:
+            return True
+        payload = message.get("authPayload", "")
+        expected = hmac.new(
+            self.api_secret.encode(), payload.encode(), hashlib.sha384
+        ).hexdigest()
+        return message.get("apiKey") == self.api_key and hmac.compare_digest(
+            expected, message.get("authSig", "")
+        )
+
+    def _dispatch(self, client, message):
+        if not isinstance(message, dict):
+            return
+        event = message.get("event")
+        if event == "auth":
+            if not self._verify_auth(message):
+                self._enqueue(
+                    client,
+                    {
+                        "event": "auth",
+                        "status": "FAILED",
+                        "chanId": 0,
+                        "code": 10100,
+                        "msg": "apikey: invalid",
+                    },
+                )
+                return
+            client.authenticated = True
+            self._enqueue(
+                client,
+                {
+                    "event": "auth",
+                    "status": "OK",
+                    "chanId": 0,
+                    "userId": 1,
+                    "caps": {"orders": {"read": 1, "write": 1}},
+                },
+            )
+            self._enqueue(client, [0, "ps", []])
+            self._enqueue(client, [0, "ws", self.exchange.wallet_snapshot()])
+            self._enqueue(client, [0, "os", self.exchange.open_order_snapshot()])
+        elif event == "subscribe":
+            self._subscribe(client, message)
+        elif event == "unsubscribe":
+            chan_id = message.get("chanId")
+            if client.channels.pop(chan_id, None) is None:
+                self._enqueue(
+                    client,
+                    {"event": "error", "msg": "unsubscribe: invalid", "code": 10400},
+                )
+            else:
+                self._enqueue(
+                    client, {"event": "unsubscribed", "status": "OK", "chanId": chan_id}
+                )
+        elif event == "ping":
+            now = int(self.exchange.clock())
+            self._enqueue(
+                client, {"event": "pong", "ts": now, "cid": message.get("cid")}
+            )
+        elif event == "conf":
+            self._enqueue(
+                client,
+                {"event": "conf", "status": "OK", "flags": message.get("flags", 0)},
+            )
+        else:
+            self._enqueue(
+                client,
+                {"event": "error", "msg": f"unknown event: {event}", "code": 10000},
+            )
+
+    def _subscribe(self, client, message):
+        channel = message.get("channel")
+        if channel == "candles":
+            key = message.get("key", "")
+            parts = key.split(":", 2)
+            if len(parts) != 3 or parts[1] not in TIMEFRAMES:
+                self._enqueue(
+                    client,
+                    {
+                        "event": "error",
+                        "msg": "subscribe: invalid",
+                        "code": 10300,
+                        "channel": channel,
+                    },
+                )
+                return
+            timeframe, symbol = parts[1], parts[2]
+            chan_id = next(self._channel_ids)
+            client.channels[chan_id] = {
+                "channel": channel,
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "interval": self.candle_interval,
+            }
+            self._enqueue(
+                client,
+                {
+                    "event": "subscribed",
+                    "channel": channel,
+                    "chanId": chan_id,
+                    "key": key,
+                },
+            )
+            self._enqueue(
+                client, [chan_id, self.exchange.candle_snapshot(symbol, timeframe)]
+            )
+        elif channel == "ticker":
+            symbol = message.get("symbol", "")
+            chan_id = next(self._channel_ids)
+            client.channels[chan_id] = {
+                "channel": channel,
+                "symbol": symbol,
+                "interval": self.ticker_interval,
+            }
+            self._enqueue(
+                client,
+                {
+                    "event": "subscribed",
+                    "channel": channel,
+                    "chanId": chan_id,
+                    "symbol": symbol,
+                    "pair": symbol[1:],
+                },
+            )
+            self._enqueue(client, [chan_id, self.exchange.ticker_array(symbol)])
+        elif channel == "trades":
+            symbol = message.get("symbol", "")
+            chan_id = next(self._channel_ids)
+            client.channels[chan_id] = {
+                "channel": channel,
+                "symbol": symbol,
+                "interval": self.trade_interval,
+            }
+            self._enqueue(
+                client,
+                {
+                    "event": "subscribed",
+                    "channel": channel,
+                    "chanId": chan_id,
+                    "symbol": symbol,
+                    "pair": symbol[1:],
+                },
+            )
+            self._enqueue(client, [chan_id, self.exchange.trade_snapshot(symbol)])
+        else:
+            self._enqueue(
+                client,
+                {
+                    "event": "error",
+                    "msg": "subscribe: invalid",
+                    "code": 10300,
+                    "channel": channel,
+                },
+            )
+
+    # --- Periodiska uppdateringar ---
+
+    async def _pump(self):
+        intervals = (self.candle_interval, self.ticker_interval, self.trade_interval)
+        tick = max(min(*intervals, 0.25), 0.001)
+        last_sent: Dict[tuple, float] = {}
+        last_heartbeat = self._loop.time()
+        while True:
+            await asyncio.sleep(tick)
+            now = self._loop.time()
+            # Matchning i en tråd så att långsamma/latensfördröjda anrop inte blockerar loopen
+            await self._loop.run_in_executor(None, self.exchange.step)
+            heartbeat = now - last_heartbeat >= self.heartbeat_interval
+            if heartbeat:
+                last_heartbeat = now
+            for client in list(self._clients):
+                for chan_id, sub in list(client.channels.items()):
+                    key = (id(client), chan_id)
+                    if now - last_sent.get(key, 0.0) >= sub["interval"]:
+                        last_sent[key] = now
+                        self._enqueue(client, [chan_id, *self._update(sub)])
+                    elif heartbeat:
+                        self._enqueue(client, [chan_id, "hb"])
+                if heartbeat and client.authenticated:
+                    self._enqueue(client, [0, "hb"])
+
+    def _update(self, sub):
+        # Meddelandet efter chanId
+        if sub["channel"] == "candles":
+            candles = self.exchange.candle_snapshot(
+                sub["symbol"], sub["timeframe"], limit=1
+            )
+            return [candles[0]]
+        if sub["channel"] == "trades":
+            return ["te", self.exchange.trade_array(sub["symbol"])]
+        return [self.exchange.ticker_array(sub["symbol"])]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bitfinex-kompatibel börssimulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--candle-interval", type=float, default=1.0)
+    parser.add_argument("--ticker-interval", type=float, default=1.0)
+    parser.add_argument("--trade-interval", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    exchange = SimulatedExchange(seed=args.seed, latency=args.latency)
+    server = SimulatedBitfinexServer(
+        exchange,
+        host=args.host,
+        port=args.port,
+        candle_interval=args.candle_interval,
+        ticker_interval=args.ticker_interval,
+        trade_interval=args.trade_interval,
+        latency=args.latency,
+    )
+    asyncio.run(server.serve())
+
+
+if __name__ == "__main__":
+    main()
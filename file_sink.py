@@ -0,0 +1,232 @@
+"""
+Buffrad, asynkron skrivning av loggrader till filer.
+
+Order-, trade- och frontendloggar skrivs via ``FileSink``: anroparen lägger
+bara raden på en begränsad kö och en bakgrundstråd skriver. Tråden tömmer hela
+kön per varv, grupperar raderna per fil och gör ett ``write`` per fil och varv,
+så en skur av fyllnader kostar ett systemanrop i stället för ett per rad.
+Filerna hålls öppna i append-läge och öppnas om ifall de tagits bort eller
+bytts ut (t.ex. av logrotate).
+
+fsync-policy: ``fsync_interval=None`` (standard) överlåter åt OS:et,
+``0`` gör fsync efter varje varv och ``N > 0`` högst var N:e sekund.
+
+Kön är begränsad; är den full släpps raden och räknas i ``dropped`` hellre än
+att skrivaren blockerar event-loopen eller orderflödet.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _Handle:
+    __slots__ = ("file", "inode", "synced_at", "dirty")
+
+    def __init__(self, path: str):
+        self.file = open(path, "ab", buffering=0)
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.synced_at = time.monotonic()
+        self.dirty = False
+
+    def sync(self, now: float):
+        os.fsync(self.file.fileno())
+        self.synced_at = now
+        self.dirty = False
+
+
+class FileSink:
+    """
+    Bakgrundsskrivare för en eller flera loggfiler.
+
+    Args:
+        maxsize: Max antal väntande rader totalt
+        fsync_interval: None = ingen fsync, 0 = varje varv, N = högst var N:e s
+        max_batch: Max antal rader per varv
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10_000,
+        fsync_interval: Optional[float] = None,
+        max_batch: int = 5_000,
+    ):
+        self.fsync_interval = fsync_interval
+        self.max_batch = max_batch
+        self.dropped = 0
+        # write() anropas från flera trådar; += är inte atomärt
+        self._dropped_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._handles: Dict[str, _Handle] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="file-sink", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def write(self, path: str, line: str) -> bool:
+        """
+        Köar line (inklusive radslut) för path utan att blockera.
+
+        Returns:
+            False om kön var full och raden släpptes
+        """
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait((path, line))
+            return True
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            return False
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Väntar tills allt som köats före anropet är skrivet."""
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
+        try:
+            self._queue.put((None, done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Skriver det som finns kvar, stoppar tråden och stänger filerna."""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put((None, _STOP), timeout=timeout)
+            except queue.Full:
+                logger.warning("FileSink: kön full vid stängning")
+            thread.join(timeout)
+        if self.fsync_interval is not None:
+            self._sync_dirty()
+        for handle in self._handles.values():
+            handle.file.close()
+        self._handles.clear()
+
+    def _run(self):
+        # Med fsync-intervall vaknar tråden även när kön är tom för att synka
+        # det som skrevs sist
+        idle_timeout = self.fsync_interval or None
+        while True:
+            try:
+                items = [self._queue.get(timeout=idle_timeout)]
+            except queue.Empty:
+                self._sync_dirty()
+                continue
+            try:
+                while len(items) < self.max_batch:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            stop = self._write_batch(items)
+            if stop:
+                return
+
+    def _write_batch(self, items) -> bool:
+        batches: Dict[str, List[str]] = {}
+        markers = []
+        stop = False
+        for path, line in items:
+            if path is None:
+                if line is _STOP:
+                    stop = True
+                else:
+                    markers.append(line)
+                continue
+            batches.setdefault(path, []).append(line)
+        for path, lines in batches.items():
+            try:
+                self._write(path, "".join(lines).encode())
+            except Exception as e:
+                logger.error(f"FileSink: kunde inte skriva till {path}: {e}")
+        for marker in markers:
+            marker.set()
+        return stop
+
+    def _write(self, path: str, data: bytes):
+        handle = self._handles.get(path)
+        if handle is not None:
+            try:
+                if os.stat(path).st_ino != handle.inode:
+                    raise FileNotFoundError(path)
+            except FileNotFoundError:
+                handle.file.close()
+                handle = None
+        if handle is None:
+            handle = self._handles[path] = _Handle(path)
+        # Obuffrad fil: write kan skriva färre byte än begärt
+        pending = memoryview(data)
+        while pending:
+            written = handle.file.write(pending)
+            pending = pending[slice(written, None)]
+        handle.dirty = True
+        if self.fsync_interval is not None:
+            now = time.monotonic()
+            if now - handle.synced_at >= self.fsync_interval:
+                handle.sync(now)
+
+    def _sync_dirty(self):
+        now = time.monotonic()
+        for path, handle in list(self._handles.items()):
+            if handle.dirty:
+                try:
+                    handle.sync(now)
+                except OSError as e:
+                    logger.error(f"FileSink: fsync misslyckades för {path}: {e}")
+
+
+def parse_fsync(value: Optional[str]) -> Optional[float]:
+    """LOG_FSYNC: "never" (standard), "always" eller sekunder mellan fsync."""
+    if value is None or value.strip().lower() in ("", "never", "none", "off"):
+        return None
+    if value.strip().lower() in ("always", "batch"):
+        return 0.0
+    return float(value)
+
+
+_sink: Optional[FileSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_sink() -> FileSink:
+    """Processens gemensamma FileSink (startas första gången, stängs vid exit)."""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                sink = FileSink(
+                    maxsize=int(os.getenv("LOG_SINK_QUEUE_SIZE", "10000")),
+                    fsync_interval=parse_fsync(os.getenv("LOG_FSYNC")),
+                )
+                sink.start()
+                atexit.register(sink.close)
+                _sink = sink
+    return _sink
+
+
+def write_line(path: str, line: str) -> bool:
+    """Köar en rad (radslut läggs till om det saknas) till path."""
+    if not line.endswith("\n"):
+        line += "\n"
+    return get_sink().write(path, line)
@@ -0,0 +1,266 @@
+"""
+Fair value gap (FVG)-detektering och signalgenerering för strategin.
+
+En bullish FVG bildas vid stapel i när ``high[i-2] < low[i]``: zonen
+``[high[i-2], low[i]]`` handlades aldrig. En bearish FVG bildas när
+``low[i-2] > high[i]`` med zonen ``[high[i], low[i-2]]``. Gapen hittas
+vektoriserat för hela serien.
+
+Öppna gap hålls i ett ``GapIndex`` per riktning. Ett gap är öppet i
+``lookback`` staplar efter att det bildats, eller tills priset fyller det
+(en bullish FVG fylls när low når zonens botten, en bearish när high når
+toppen). Frågan "ligger priset i ett ofyllt gap" och fyllnadskontrollen är
+O(log n) per stapel, så samma index används i backtest (``fvg_gaps``) och
+live (uppdateras stapel för stapel eller tick för tick).
+"""
+
+import heapq
+from collections import deque
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Indikatorer som fvg_signals och radloopen läser (utöver OHLCV); skickas som
+# indicators till calculate_indicators/compute_indicators
+FVG_INDICATORS = ("ema", "atr", "high_volume", "within_trading_hours")
+
+
+def find_gaps(high, low):
+    """
+    Vektoriserad FVG-detektering över hela serien.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Boolska arrayer (bullish, bearish) där
+        True betyder att ett gap bildades vid stapeln
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    bullish = np.zeros(len(high), dtype=bool)
+    bearish = np.zeros(len(high), dtype=bool)
+    if len(high) >= 3:
+        first_high, first_low = high[:-2], low[:-2]
+        bullish[2:] = first_high < low[2:]
+        bearish[2:] = first_low > high[2:]
+    return bullish, bearish
+
+
+class GapIndex:
+    """
+    Intervallindex över öppna gap i en riktning.
+
+    Bearish gap lagras speglade (negerade priser), så att båda riktningarna
+    fylls när "low" når zonens botten. Efter fyllnadskontrollen ligger alla
+    öppna gaps botten under senaste pris, och priset ligger i ett gap precis
+    när det högsta toppvärdet är minst priset: två heapar (botten för
+    fyllnad, topp för frågan) med lat borttagning och en kö för åldersgränsen.
+
+    Args:
+        lookback: Antal staplar ett gap är öppet efter att det bildats
+        bullish: Riktning
+    """
+
+    __slots__ = ("lookback", "sign", "_open", "_bottoms", "_tops", "_formed")
+
+    def __init__(self, lookback: int, bullish: bool = True):
+        self.lookback = lookback
+        self.sign = 1.0 if bullish else -1.0
+        # id (stapelindex där gapet bildades) -> (botten, topp), speglade
+        self._open = {}
+        self._bottoms: list = []
+        self._tops: list = []
+        self._formed: deque = deque()
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def add(self, index: int, bottom: float, top: float):
+        """Lägger till ett gap som bildades vid stapel index (zon bottom-top)."""
+        if self.sign < 0:
+            bottom, top = -top, -bottom
+        self._open[index] = (bottom, top)
+        if len(self._bottoms) + len(self._tops) > 4 * len(self._open) + 32:
+            self._compact()
+        heapq.heappush(self._bottoms, (-bottom, index))
+        heapq.heappush(self._tops, (-top, index))
+        self._formed.append(index)
+
+    def _compact(self):
+        # Stängda gap ligger kvar i heaparna tills de hamnar överst; bygg om
+        # när de dominerar, så att minnet hålls O(antal öppna)
+        open_gaps = self._open
+        self._bottoms = [entry for entry in self._bottoms if entry[1] in open_gaps]
+        self._tops = [entry for entry in self._tops if entry[1] in open_gaps]
+        heapq.heapify(self._bottoms)
+        heapq.heapify(self._tops)
+        self._formed = deque(index for index in self._formed if index in open_gaps)
+
+    def update(self, index: int, low: float, high: float):
+        """
+        Stänger gap som är äldre än lookback eller fylldes av stapeln index.
+
+        Returns:
+            int: Antal gap som stängdes
+        """
+        before = len(self._open)
+        formed, expired = self._formed, index - self.lookback
+        while formed and formed[0] < expired:
+            self._open.pop(formed.popleft(), None)
+        self._fill(low if self.sign > 0 else -high)
+        return before - len(self._open)
+
+    def _fill(self, low: float):
+        bottoms, open_gaps = self._bottoms, self._open
+        while bottoms and -bottoms[0][0] >= low:
+            open_gaps.pop(heapq.heappop(bottoms)[1], None)
+
+    def step(self, index: int, low: float, high: float, close: float):
+        """update följt av inside(close) i ett anrop (svepet i fvg_gaps)."""
+        formed, open_gaps = self._formed, self._open
+        expired = index - self.lookback
+        while formed and formed[0] < expired:
+            open_gaps.pop(formed.popleft(), None)
+        if self.sign > 0:
+            floor, price = low, close
+        else:
+            floor, price = -high, -close
+        bottoms = self._bottoms
+        while bottoms and -bottoms[0][0] >= floor:
+            open_gaps.pop(heapq.heappop(bottoms)[1], None)
+        tops = self._tops
+        while tops and tops[0][1] not in open_gaps:
+            heapq.heappop(tops)
+        if not tops or -tops[0][0] < price:
+            return None
+        bottom, top = open_gaps[tops[0][1]]
+        return (bottom, top) if self.sign > 0 else (-top, -bottom)
+
+    def inside(self, price: float) -> Optional[Tuple[float, float]]:
+        """
+        Det öppna gap som price ligger i (bullish: det med högst topp).
+
+        Ett pris som når ett gaps botten fyller det, så price räknas också som
+        en fyllnad; använd update för stapelns hela intervall.
+
+        Returns:
+            (botten, topp) i vanliga priser, eller None
+        """
+        price = price * self.sign
+        self._fill(price)
+        tops, open_gaps = self._tops, self._open
+        while tops and tops[0][1] not in open_gaps:
+            heapq.heappop(tops)
+        if not tops or -tops[0][0] < price:
+            return None
+        bottom, top = open_gaps[tops[0][1]]
+        return (bottom, top) if self.sign > 0 else (-top, -bottom)
+
+
+def fvg_gaps(data, lookback=100):
+    """
+    Öppna FVG som stängningskursen ligger i, för varje stapel.
+
+    Ett gap som bildas vid stapel i kan användas från stapel i+1 till i+lookback
+    och stängs när en stapel fyller det; stapelns egen fyllnad räknas före
+    frågan. Ingen stapel ser framåt.
+
+    Args:
+        data: DataFrame eller CandleArray med high, low och close
+        lookback: Antal staplar ett gap är öppet
+
+    Returns:
+        dict med arrayerna bull_low, bull_high, bear_low, bear_high (NaN där
+        stängningskursen inte ligger i något öppet gap)
+    """
+    high = np.asarray(data["high"], dtype=float)
+    low = np.asarray(data["low"], dtype=float)
+    close = np.asarray(data["close"], dtype=float)
+    n = len(close)
+    out = {key: np.full(n, np.nan) for key in ("bull_low", "bull_high")}
+    out.update({key: np.full(n, np.nan) for key in ("bear_low", "bear_high")})
+    bullish, bearish = find_gaps(high, low)
+    events = np.flatnonzero(bullish | bearish)
+    if not len(events):
+        return out
+    bull, bear = GapIndex(lookback, True), GapIndex(lookback, False)
+    # Staplar efter sista möjliga öppna gap behöver inte svepas
+    stop = min(n, int(events[-1]) + lookback + 1)
+    start = int(events[0])
+    highs, lows, closes = high.tolist(), low.tolist(), close.tolist()
+    bull_at, bear_at = bullish.tolist(), bearish.tolist()
+    bull_low, bull_high = out["bull_low"], out["bull_high"]
+    bear_low, bear_high = out["bear_low"], out["bear_high"]
+    for i in range(start, stop):
+        if bull._open:
+            gap = bull.step(i, lows[i], highs[i], closes[i])
+            if gap is not None:
+                bull_low[i], bull_high[i] = gap
+        if bear._open:
+            gap = bear.step(i, lows[i], highs[i], closes[i])
+            if gap is not None:
+                bear_low[i], bear_high[i] = gap
+        if bull_at[i]:
+            bull.add(i, highs[i - 2], lows[i])
+        if bear_at[i]:
+            bear.add(i, highs[i], lows[i - 2])
+    return out
+
+
+def detect_fvg(data, lookback, bullish=True):
+    """
+    Öppet FVG som senaste stängningskurs ligger i.
+
+    Bara de sista lookback + 3 staplarna kan påverka svaret, så anropet kostar
+    O(lookback log lookback) oavsett seriens längd.
+
+    Returns:
+        Tuple[float, float]: (high, low) för gapet, eller (nan, nan)
+    """
+    start = -(lookback + 3)
+    tail = data.iloc[start:] if hasattr(data, "iloc") else data
+    if len(tail) < 3:
+        return np.nan, np.nan
+    gaps = fvg_gaps(tail, lookback)
+    prefix = "bull" if bullish else "bear"
+    return gaps[f"{prefix}_high"][-1], gaps[f"{prefix}_low"][-1]
+
+
+def fvg_signals(data, atr_multiplier, lookback=100, mean_atr=None):
+    """
+    Vektoriserade köp-/säljsignaler för hela serien, samma villkor som radloopen.
+
+    Long när stängningskursen ligger i ett öppet bullish FVG och över EMA,
+    short när den ligger i ett öppet bearish FVG och under EMA.
+
+    Args:
+        data: DataFrame med indikatorkolumner från calculate_indicators, eller
+            CandleArray från candles.compute_indicators
+        atr_multiplier: Rader med ATR <= atr_multiplier * mean_atr hoppas över
+        lookback: Antal staplar ett FVG är öppet
+        mean_atr: Referens-ATR; standard är medelvärdet över data. Ange t.ex.
+            träningsfönstrets värde för att undvika look-ahead i testfönster.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Boolska arrayer (long, short) per rad
+    """
+    n = len(data)
+    if n == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+    close = np.asarray(data["close"], dtype=float)
+    ema = np.asarray(data["ema"], dtype=float)
+    high_volume = np.asarray(data["high_volume"], dtype=bool)
+    within_hours = np.asarray(data["within_trading_hours"], dtype=bool)
+
+    if "atr" in data.columns:
+        atr = np.asarray(data["atr"], dtype=float)
+        if mean_atr is None:
+            mean_atr = np.nanmean(atr) if np.isfinite(atr).any() else 0.0
+        # Samma semantik som `if row["atr"] <= ...: continue` (NaN hoppas inte över)
+        atr_ok = ~(atr <= atr_multiplier * mean_atr)
+    else:
+        atr_ok = np.ones(n, dtype=bool)
+
+    gaps = fvg_gaps(data, lookback)
+    common = atr_ok & high_volume & within_hours
+    long_signal = common & ~np.isnan(gaps["bull_high"]) & (close > ema)
+    short_signal = common & ~np.isnan(gaps["bear_high"]) & (close < ema)
+    return long_signal, short_signal
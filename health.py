@@ -0,0 +1,256 @@
+"""
+Health- och readiness-endpoints för boten.
+
+``HealthState`` samlar driftstatus som skrivs av websocket-trådarna: ålder på
+senaste candle, anslutningsstatus och senaste heartbeat per websocketström,
+köer (registreras som funktioner som returnerar ködjupet) och cacheålder.
+Skrivningar är enkla tilldelningar och läsningar kopierar referenser, så inga
+lås tas och en probe kostar mikrosekunder.
+
+``serve_health_async`` ger, direkt i botens asyncio-loop, ``/live`` (processen
+svarar), ``/ready`` (data och anslutningar är färska, annars 503) och
+``/health`` (båda, alltid 200 för bakåtkompatibilitet).
+"""
+
+import asyncio
+import functools
+import http
+import json
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class StreamStatus:
+    """Status för en websocketström; ersätts i sin helhet vid varje ändring."""
+
+    __slots__ = ("connected", "since", "last_heartbeat")
+
+    def __init__(self, connected: bool, since: float, last_heartbeat: Optional[float]):
+        self.connected = connected
+        self.since = since
+        self.last_heartbeat = last_heartbeat
+
+
+class HealthState:
+    """
+    Lockfri ögonblicksbild av botens driftstatus.
+
+    Args:
+        max_candle_age: Max sekunder sedan senaste candle för readiness
+        max_heartbeat_age: Max sekunder sedan senaste heartbeat per ström
+        max_queue_depth: Max antal väntande element per registrerad kö
+        required_streams: Strömmar som måste vara anslutna för readiness
+    """
+
+    def __init__(
+        self,
+        max_candle_age: float = 180.0,
+        max_heartbeat_age: float = 45.0,
+        max_queue_depth: int = 1000,
+        required_streams=(),
+    ):
+        self.max_candle_age = max_candle_age
+        self.max_heartbeat_age = max_heartbeat_age
+        self.max_queue_depth = max_queue_depth
+        self.required_streams = tuple(required_streams)
+        self.started = time.time()
+        self._last_candle: Optional[float] = None
+        self._last_candle_seen: Optional[float] = None
+        self._streams: Dict[str, StreamStatus] = {}
+        self._queues: Dict[str, Callable[[], int]] = {}
+        self._caches: Dict[str, Tuple[Callable[[], Optional[float]], float]] = {}
+
+    # --- Skrivare (websocket-trådar) ---
+
+    def mark_candle(self, timestamp_ms=None):
+        """Registrerar en mottagen candle (stapelns starttid i ms om känd)."""
+        self._last_candle_seen = time.time()
+        if timestamp_ms is not None:
+            self._last_candle = float(timestamp_ms) / 1000
+
+    def mark_connected(self, stream: str):
+        now = time.time()
+        self._streams[stream] = StreamStatus(True, now, now)
+
+    def mark_disconnected(self, stream: str):
+        previous = self._streams.get(stream)
+        last = previous.last_heartbeat if previous else None
+        self._streams[stream] = StreamStatus(False, time.time(), last)
+
+    def mark_heartbeat(self, stream: str):
+        previous = self._streams.get(stream)
+        since = previous.since if previous else time.time()
+        self._streams[stream] = StreamStatus(True, since, time.time())
+
+    def register_queue(self, name: str, depth: Callable[[], int]):
+        """Registrerar en kö; depth anropas först när en probe läser den."""
+        self._queues[name] = depth
+
+    def register_cache(
+        self, name: str, age: Callable[[], Optional[float]], max_age: float
+    ):
+        """Registrerar en cache; age returnerar ålder i sekunder eller None."""
+        self._caches[name] = (age, max_age)
+
+    # --- Läsare (probes) ---
+
+    def snapshot(self) -> dict:
+        """Aktuell status med åldrar i sekunder (None = aldrig mottaget)."""
+        now = time.time()
+        last_candle = self._last_candle_seen
+        streams = {
+            name: {
+                "connected": status.connected,
+                "state_age": now - status.since,
+                "heartbeat_age": (
+                    now - status.last_heartbeat
+                    if status.last_heartbeat is not None
+                    else None
+                ),
+            }
+            for name, status in list(self._streams.items())
+        }
+        queues = {}
+        for name, depth in list(self._queues.items()):
+            try:
+                queues[name] = int(depth())
+            except Exception:
+                queues[name] = None
+        caches = {}
+        for name, (age, _) in list(self._caches.items()):
+            try:
+                caches[name] = age()
+            except Exception:
+                caches[name] = None
+        return {
+            "uptime": now - self.started,
+            "last_candle_age": now - last_candle if last_candle else None,
+            "last_candle_time": self._last_candle,
+            "websockets": streams,
+            "queues": queues,
+            "caches": caches,
+        }
+
+    def readiness(self, snapshot: Optional[dict] = None):
+        """
+        Returns:
+            (ready, checks, snapshot) där checks är misslyckade kontroller
+            med orsak
+        """
+        snapshot = snapshot or self.snapshot()
+        failed = {}
+        candle_age = snapshot["last_candle_age"]
+        if candle_age is None or candle_age > self.max_candle_age:
+            failed["candles"] = f"senaste candle: {_age(candle_age)}"
+        for name in self.required_streams:
+            stream = snapshot["websockets"].get(name)
+            if not stream or not stream["connected"]:
+                failed[f"websocket:{name}"] = "ej ansluten"
+        for name, stream in snapshot["websockets"].items():
+            age = stream["heartbeat_age"]
+            if stream["connected"] and (age is None or age > self.max_heartbeat_age):
+                failed[f"heartbeat:{name}"] = f"senaste heartbeat: {_age(age)}"
+        for name, depth in snapshot["queues"].items():
+            if depth is None or depth > self.max_queue_depth:
+                failed[f"queue:{name}"] = f"djup {depth}"
+        for name, age in snapshot["caches"].items():
+            registered = self._caches.get(name)
+            if registered is None:
+                continue
+            if age is None or age > registered[1]:
+                failed[f"cache:{name}"] = f"ålder: {_age(age)}"
+        return not failed, failed, snapshot
+
+
+def _age(seconds):
+    return "aldrig" if seconds is None else f"{seconds:.1f}s"
+
+
+def respond(state: HealthState, path: str):
+    """
+    Svar för en health-förfrågan.
+
+    Returns:
+        (HTTP-status, JSON-payload) eller (404, None) för okända sökvägar
+    """
+    path_only = urlparse(path).path
+    if path_only == "/live":
+        return 200, {"status": "ok", "uptime": time.time() - state.started}
+    if path_only == "/ready":
+        ready, failed, snapshot = state.readiness()
+        payload = dict(snapshot, status="ready" if ready else "not_ready")
+        payload["failed"] = failed
+        return (200 if ready else 503), payload
+    if path_only in ("/", "/health"):
+        # Processen lever (alltid 200); readiness redovisas i svaret
+        ready, failed, snapshot = state.readiness()
+        return 200, dict(snapshot, status="ok", ready=ready, failed=failed)
+    return 404, None
+
+
+async def _handle_async(state: HealthState, reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        # Läs (och ignorera) headers fram till tomraden
+        while True:
+            line = await asyncio.wait_for(reader.readline(), 5)
+            if line in (b"\r\n", b"\n", b""):
+                break
+        parts = request_line.decode("latin-1").split()
+        if len(parts) < 2 or parts[0] != "GET":
+            status, payload = 405, None
+        else:
+            status, payload = respond(state, parts[1])
+        body = json.dumps(payload).encode() if payload is not None else b""
+        reason = http.HTTPStatus(status).phrase
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_health_async(
+    state: HealthState, port: int, host: str = "0.0.0.0", attempts: int = 5
+):
+    """
+    Health-endpoints i den körande event-loopen (ingen egen tråd).
+
+    Svaren ges av respond(). Provar attempts portar från port och kör tills
+    uppgiften avbryts.
+
+    Raises:
+        OSError: Om ingen av portarna kunde användas
+    """
+    server = None
+    for attempt in range(port, port + attempts):
+        try:
+            server = await asyncio.start_server(
+                functools.partial(_handle_async, state),
+                host,
+                attempt,
+                reuse_address=True,
+            )
+        except OSError as e:
+            logger.warning(
+                f"Kunde inte starta health-check server på port {attempt}: {e}"
+            )
+            continue
+        logger.info(f"Health-check server startad på port {attempt}")
+        break
+    if server is None:
+        raise OSError(
+            "Misslyckades att starta health-check server på alla försökta portar."
+        )
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,309 @@
+"""
+Indikatorregister med deklarerade beroenden och lat, cachad beräkning.
+
+Varje indikator registreras med namnen den beror på (``@indicator``). Ett
+``IndicatorGraph`` per dataram beräknar bara de noder som efterfrågas och
+deras beroenden, en gång var: ATR och ADX delar inte bara ``close`` utan
+också ``tr``, och MACD:s EMA:er återanvänds av strategins EMA när perioderna
+sammanfaller.
+
+Parametriserade mellanresultat har namn på formen ``familj:indata:fönster``
+och delas mellan alla som använder samma indata och fönster:
+
+- ``ema:close:20``: talib.EMA
+- ``mean:volume:20``: glidande medelvärde från första stapeln (min_periods=1)
+- ``sma:close:20`` / ``std:close:20``: glidande medelvärde/standardavvikelse
+  över hela fönstret (NaN innan fönstret är fyllt)
+
+Beroenden i ``@indicator`` får referera till parametrar med ``{namn}`` (se
+IndicatorParams). Strategier deklarerar vad de läser (t.ex.
+``fvg.FVG_INDICATORS``) och skickar det som ``indicators`` till
+``calculate_indicators``/``compute_indicators``.
+
+Modulen har inga sidoeffekter vid import (används från arbetsprocesser).
+"""
+
+from typing import Callable, Dict, Iterable, List, Mapping, NamedTuple, Tuple
+
+import numpy as np
+import talib
+from numpy.lib.stride_tricks import sliding_window_view
+
+MS_PER_HOUR = 3_600_000
+
+# Dataramens kolumner; allt annat är noder i grafen
+SOURCES = ("timestamp", "open", "high", "low", "close", "volume")
+
+# Samma kolumner som calculate_indicators alltid har beräknat
+DEFAULT_INDICATORS = (
+    "ema",
+    "atr",
+    "avg_volume",
+    "high_volume",
+    "rsi",
+    "adx",
+    "hour",
+    "within_trading_hours",
+)
+
+
+class IndicatorParams(NamedTuple):
+    ema_length: int
+    volume_multiplier: float
+    trading_start_hour: int
+    trading_end_hour: int
+    macd_fast: int = 12
+    macd_slow: int = 26
+    macd_signal: int = 9
+    bb_length: int = 20
+    bb_std: float = 2.0
+
+
+class Indicator(NamedTuple):
+    name: str
+    requires: Tuple[str, ...]
+    func: Callable
+
+
+_REGISTRY: Dict[str, Indicator] = {}
+_FAMILIES: Dict[str, Callable] = {}
+
+
+def indicator(name: str, *requires: str):
+    """
+    Registrerar func(params, *beroenden) som noden name.
+
+    Args:
+        requires: Nodnamn som func får som argument, i ordning; ``{parameter}``
+            ersätts med värdet i IndicatorParams
+    """
+
+    def register(func):
+        _REGISTRY[name] = Indicator(name, requires, func)
+        return func
+
+    return register
+
+
+def family(name: str):
+    """Registrerar func(indata, fönster) för noder med namnet ``name:indata:fönster``."""
+
+    def register(func):
+        _FAMILIES[name] = func
+        return func
+
+    return register
+
+
+def available() -> List[str]:
+    """Namngivna indikatorer i registret."""
+    return sorted(_REGISTRY)
+
+
+def _split(name: str):
+    kind, _, rest = name.partition(":")
+    source, _, window = rest.rpartition(":")
+    if kind not in _FAMILIES or not source or not window.isdigit():
+        raise KeyError(f"Okänd indikator: {name}")
+    return kind, source, int(window)
+
+
+def requires(name: str, params: IndicatorParams) -> Tuple[str, ...]:
+    """Noderna som name beror på direkt."""
+    if name in SOURCES:
+        return ()
+    if name in _REGISTRY:
+        fields = params._asdict()
+        return tuple(dep.format(**fields) for dep in _REGISTRY[name].requires)
+    return (_split(name)[1],)
+
+
+def plan(names: Iterable[str], params: IndicatorParams) -> List[str]:
+    """
+    Noderna som behövs för names i beräkningsordning (beroenden först).
+
+    Raises:
+        KeyError: Om en nod inte finns i registret
+        ValueError: Om beroendena bildar en cykel
+    """
+    order: List[str] = []
+    done = set(SOURCES)
+    for name in names:
+        if name in done:
+            continue
+        # Iterativ DFS: (nod, beroenden kvar att besöka)
+        stack = [(name, list(requires(name, params)))]
+        visiting = {name}
+        while stack:
+            node, pending = stack[-1]
+            while pending and pending[-1] in done:
+                pending.pop()
+            if not pending:
+                stack.pop()
+                visiting.discard(node)
+                done.add(node)
+                order.append(node)
+                continue
+            dep = pending.pop()
+            if dep in visiting:
+                raise ValueError(f"Cykliskt beroende via {dep}")
+            visiting.add(dep)
+            stack.append((dep, list(requires(dep, params))))
+    return order
+
+
+class IndicatorGraph:
+    """
+    Cache över en dataram: noder beräknas när de efterfrågas, en gång.
+
+    Args:
+        sources: Kolumnerna i SOURCES (eller en delmängd; ``hour`` får också
+            anges direkt, t.ex. från en tidszonsmedveten datetime-kolumn)
+        params: Parametrar för de parametriserade noderna
+    """
+
+    def __init__(self, sources: Mapping[str, np.ndarray], params: IndicatorParams):
+        self.params = params
+        self.values: Dict[str, np.ndarray] = dict(sources)
+        # Noder i den ordning de beräknades (för tester och felsökning)
+        self.computed: List[str] = []
+
+    @classmethod
+    def from_candles(cls, candles, params: IndicatorParams) -> "IndicatorGraph":
+        """Från en CandleArray; talib kräver float64."""
+        sources = {"timestamp": candles.timestamps}
+        for field in SOURCES[1:]:
+            sources[field] = getattr(candles, field).astype(np.float64, copy=False)
+        return cls(sources, params)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.values.values()), ()))
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.evaluate([name])[name]
+
+    def evaluate(self, names: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Beräknar names (och deras beroenden) som inte redan finns."""
+        names = list(names)
+        for node in plan([n for n in names if n not in self.values], self.params):
+            if node in self.values:
+                continue
+            args = [self.values[dep] for dep in requires(node, self.params)]
+            if node in _REGISTRY:
+                self.values[node] = _REGISTRY[node].func(self.params, *args)
+            else:
+                kind, _, window = _split(node)
+                self.values[node] = _FAMILIES[kind](args[0], window)
+            self.computed.append(node)
+        return {name: self.values[name] for name in names}
+
+
+# --- Familjer ---
+
+
+@family("ema")
+def _ema(values, window):
+    return talib.EMA(values, timeperiod=window)
+
+
+@family("mean")
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Som pandas rolling(window, min_periods=1).mean()."""
+    n = len(values)
+    out = np.empty(n)
+    head = min(window - 1, n)
+    out[:head] = np.cumsum(values[:head]) / np.arange(1, head + 1)
+    if n > head:
+        out[head:] = sliding_window_view(values, window).mean(axis=1)
+    return out
+
+
+@family("sma")
+def _sma(values, window):
+    return talib.SMA(values, timeperiod=window)
+
+
+@family("std")
+def _std(values, window):
+    return talib.STDDEV(values, timeperiod=window, nbdev=1)
+
+
+# --- Indikatorer ---
+
+
+@indicator("prev_close", "close")
+def _prev_close(params, close):
+    return np.r_[np.nan, close[:-1]]
+
+
+@indicator("tr", "high", "low", "prev_close")
+def _true_range(params, high, low, prev_close):
+    return np.fmax(
+        high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close))
+    )
+
+
+@indicator("ema", "ema:close:{ema_length}")
+@indicator("atr", "mean:tr:14")
+@indicator("avg_volume", "mean:volume:20")
+@indicator("macd_signal", "ema:macd:{macd_signal}")
+@indicator("bb_middle", "sma:close:{bb_length}")
+def _alias(params, values):
+    return values
+
+
+@indicator("high_volume", "volume", "avg_volume")
+def _high_volume(params, volume, avg_volume):
+    return volume > avg_volume * params.volume_multiplier
+
+
+def _period(n):
+    # talib kräver period >= 2; korta serier använder n - 1
+    return min(14, n - 1) if n > 1 else 2
+
+
+@indicator("rsi", "close")
+def _rsi(params, close):
+    try:
+        return np.nan_to_num(talib.RSI(close, timeperiod=_period(len(close))), nan=0.0)
+    except Exception:
+        return np.zeros(len(close))
+
+
+@indicator("adx", "high", "low", "close")
+def _adx(params, high, low, close):
+    try:
+        adx = talib.ADX(high, low, close, timeperiod=_period(len(close)))
+    except Exception:
+        return np.zeros(len(close))
+    return np.nan_to_num(adx, nan=0.0)
+
+
+@indicator("hour", "timestamp")
+def _hour(params, timestamps):
+    return (timestamps // MS_PER_HOUR) % 24
+
+
+@indicator("within_trading_hours", "hour")
+def _within_trading_hours(params, hour):
+    return (hour >= params.trading_start_hour) & (hour <= params.trading_end_hour)
+
+
+@indicator("macd", "ema:close:{macd_fast}", "ema:close:{macd_slow}")
+def _macd(params, fast, slow):
+    return fast - slow
+
+
+@indicator("macd_hist", "macd", "macd_signal")
+def _macd_hist(params, macd, signal):
+    return macd - signal
+
+
+@indicator("bb_upper", "sma:close:{bb_length}", "std:close:{bb_length}")
+def _bb_upper(params, middle, std):
+    return middle + params.bb_std * std
+
+
+@indicator("bb_lower", "sma:close:{bb_length}", "std:close:{bb_length}")
+def _bb_lower(params, middle, std):
+    return middle - params.bb_std * std
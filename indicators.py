@@ -0,0 +1,74 @@
+"""
+Indikatorberäkningar för strategin (EMA, ATR, volym, RSI, ADX, handelstimmar,
+MACD, Bollinger Bands) på en DataFrame, via registret i indicator_graph.
+
+Modulen har inga sidoeffekter vid import och kan därför användas från
+arbetsprocesser (t.ex. walk-forward) utan att ladda tradingbot.py.
+"""
+
+import logging
+
+from indicator_graph import DEFAULT_INDICATORS, IndicatorGraph, IndicatorParams
+
+logger = logging.getLogger(__name__)
+
+
+def calculate_indicators(
+    data,
+    ema_length,
+    volume_multiplier,
+    trading_start_hour,
+    trading_end_hour,
+    indicators=None,
+    **params,
+):
+    """
+    Lägger till indikatorkolumner i data.
+
+    Args:
+        indicators: Kolumner att beräkna (se indicator_graph.available());
+            standard är ema, atr, avg_volume, high_volume, rsi, adx, hour och
+            within_trading_hours. Bara de valda och deras beroenden beräknas.
+        params: Övriga IndicatorParams, t.ex. macd_fast eller bb_length
+
+    Returns:
+        data med kolumnerna, eller None vid fel
+    """
+    try:
+        required_columns = {"close", "high", "low", "volume"}
+        if not required_columns.issubset(data.columns):
+            raise ValueError(
+                f"Data is missing required columns: {required_columns - set(data.columns)}"
+            )
+
+        # Konvertera till float för talib-kompatibilitet
+        for col in ["close", "high", "low", "volume"]:
+            data[col] = data[col].astype(float)
+
+        if data["close"].isnull().all():
+            raise ValueError(
+                "The 'close' column is empty or contains only null values. Cannot calculate EMA."
+            )
+
+        sources = {
+            col: data[col].to_numpy() for col in ["close", "high", "low", "volume"]
+        }
+        if "datetime" in data.columns:
+            sources["hour"] = data["datetime"].dt.hour.to_numpy()
+        graph = IndicatorGraph(
+            sources,
+            IndicatorParams(
+                ema_length,
+                volume_multiplier,
+                trading_start_hour,
+                trading_end_hour,
+                **params,
+            ),
+        )
+        names = DEFAULT_INDICATORS if indicators is None else indicators
+        for name, values in graph.evaluate(names).items():
+            data[name] = values
+        return data
+    except Exception as e:
+        logger.error(f"Error calculating indicators: {e}")
+        return None
@@ -0,0 +1,258 @@
+"""
+Prometheus-mätvärden för bottens heta vägar.
+
+Histogram för orderläggning, REST-anrop mot börsen (per metod), bearbetning av
+websocket-meddelanden, indikatorberäkning och API-endpoints; räknare för
+cacheträffar/-missar och gauges för ködjup. Mätvärdena exponeras med
+``start_metrics_server`` på METRICS_PORT.
+
+prometheus_client är valfritt: saknas paketet blir alla mätvärden no-ops med
+samma gränssnitt, så instrumenterad kod behöver inte kontrollera det.
+"""
+
+import functools
+import logging
+import time
+from typing import Optional
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+    PROMETHEUS_AVAILABLE = True
+except ImportError:  # pragma: no cover - beror på miljön
+    PROMETHEUS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Från 0.5 ms (cacheträffar, websocket-meddelanden) till 10 s (långsamma REST-anrop)
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Exchange-metoder vars latens mäts (övriga attribut skickas vidare omätta)
+EXCHANGE_METHOD_PREFIXES = ("fetch_", "create_", "cancel_", "edit_", "load_markets")
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __call__(self, func):
+        return func
+
+
+class _NoopMetric:
+    """Ersätter Counter/Gauge/Histogram när prometheus_client saknas."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def time(self):
+        return _NoopTimer()
+
+
+if not PROMETHEUS_AVAILABLE:
+    Counter = Gauge = Histogram = _NoopMetric
+
+
+ORDER_LATENCY = Histogram(
+    "tradingbot_order_placement_seconds",
+    "Tid för att lägga en order (inklusive börsanrop)",
+    ["side", "type"],
+    buckets=LATENCY_BUCKETS,
+)
+ORDERS_PLACED = Counter(
+    "tradingbot_orders_placed_total",
+    "Antal orderförsök per utfall",
+    ["side", "type", "result"],
+)
+EXCHANGE_LATENCY = Histogram(
+    "tradingbot_exchange_request_seconds",
+    "Latens för REST-anrop mot börsen per ccxt-metod",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+EXCHANGE_ERRORS = Counter(
+    "tradingbot_exchange_errors_total",
+    "Misslyckade REST-anrop mot börsen per ccxt-metod och feltyp",
+    ["method", "error"],
+)
+WEBSOCKET_MESSAGE_SECONDS = Histogram(
+    "tradingbot_websocket_message_seconds",
+    "Bearbetningstid per mottaget websocket-meddelande",
+    ["stream"],
+    buckets=LATENCY_BUCKETS,
+)
+INDICATOR_SECONDS = Histogram(
+    "tradingbot_indicator_seconds",
+    "Tid för indikatorberäkning",
+    ["function"],
+    buckets=LATENCY_BUCKETS,
+)
+API_LATENCY = Histogram(
+    "tradingbot_api_request_seconds",
+    "Latens per API-endpoint",
+    ["endpoint", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "tradingbot_cache_requests_total",
+    "Cacheuppslag per cache och utfall (hit/miss)",
+    ["cache", "result"],
+)
+QUEUE_DEPTH = Gauge(
+    "tradingbot_queue_depth",
+    "Antal väntande element per kö",
+    ["queue"],
+)
+RATE_LIMIT_TOKENS = Gauge(
+    "tradingbot_rate_limit_tokens",
+    "Kvarvarande tokens i den delade rate limit-hinken",
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "tradingbot_rate_limit_wait_seconds",
+    "Väntetid på rate limit-budget per prioritet",
+    ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def record_cache(cache: str, hit: bool):
+    """Räknar en träff eller miss för cachen."""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def start_metrics_server(port: int, attempts: int = 1) -> Optional[int]:
+    """
+    Startar Prometheus HTTP-servern på port.
+
+    En upptagen port loggas som fel: Prometheus skrapar den konfigurerade
+    porten, så en tyst flytt till en annan port ger luckor i mätvärdena (eller
+    mätvärden från fel process). Med attempts > 1 provas följande portar, och
+    bytet loggas som fel.
+
+    Returns:
+        Porten servern lyssnar på, eller None om den inte kunde startas
+    """
+    if not PROMETHEUS_AVAILABLE:
+        logger.warning("prometheus_client saknas, metrics-servern är avstängd")
+        return None
+    for attempt in range(port, port + attempts):
+        try:
+            start_http_server(attempt)
+        except OSError as e:
+            logger.error(f"Metrics-servern kunde inte starta på port {attempt}: {e}")
+            continue
+        if attempt != port:
+            logger.error(
+                f"Metrics-servern lyssnar på port {attempt} i stället för {port}"
+            )
+        else:
+            logger.info(f"Prometheus metrics-server startad på port {attempt}")
+        return attempt
+    logger.error(
+        f"Kunde inte starta metrics-servern på portarna {port}-{port + attempts - 1}"
+        if attempts > 1
+        else f"Metrics-servern är avstängd: port {port} är upptagen"
+    )
+    return None
+
+
+class InstrumentedExchange:
+    """
+    Proxy runt en ccxt-exchange som mäter latensen för REST-metoderna.
+
+    Mätningen kostar två perf_counter-anrop och en histogramobservation per
+    anrop. Omslaget skapas en gång per metod och återanvänds så länge metoden
+    på exchange-objektet är densamma (t.ex. inte ersatt i tester).
+    """
+
+    def __init__(self, exchange):
+        object.__setattr__(self, "_exchange", exchange)
+        object.__setattr__(self, "_timed", {})
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if not callable(attr) or not name.startswith(EXCHANGE_METHOD_PREFIXES):
+            return attr
+        cached = self._timed.get(name)
+        if cached is not None and cached[0] == attr:
+            return cached[1]
+        histogram = EXCHANGE_LATENCY.labels(name)
+
+        @functools.wraps(attr)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                EXCHANGE_ERRORS.labels(name, type(e).__name__).inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+
+        self._timed[name] = (attr, timed)
+        return timed
+
+    def __setattr__(self, name, value):
+        cached = self._timed.get(name)
+        if cached is not None and value is cached[1]:
+            # Ett tidigare utlämnat omslag sätts tillbaka: lagra originalet
+            value = cached[0]
+        setattr(self._exchange, name, value)
+
+    def __repr__(self):
+        return f"InstrumentedExchange({self._exchange!r})"
+
+
+def instrument_app(app):
+    """Registrerar Flask-hooks som mäter latensen per endpoint."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_latency(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # Routens mönster (inte själva URL:en) håller nere antalet etiketter
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            API_LATENCY.labels(
+                endpoint, request.method, str(response.status_code)
+            ).observe(time.perf_counter() - started)
+        return response
+
+    return app
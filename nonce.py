@@ -0,0 +1,172 @@
+"""
+Monoton nonce-allokering med delad räknare och blockvis persistens.
+
+Räknaren (senaste nonce och slutet på det reserverade blocket) ligger i en
+mappad fil bredvid nonce-filen (``<path>.lock``) som delas av alla processer
+på maskinen. Varje ``next`` läser, ökar och skriver räknaren under
+``fcntl.flock`` på samma fil, så nonces är strikt växande över alla trådar och
+processer: Bitfinex kräver växande nonce per API-nyckel, och boten och API:t
+signerar med samma nyckel.
+
+Till disk skrivs bara när ett nytt block reserveras (standard 10 000 nonces):
+högvattenmärket (sista nonce i blocket) skrivs atomiskt och fsync:as innan
+blocket används. Den mappade räknaren fsync:as inte; stämmer dess blockslut
+inte med nonce-filen (t.ex. efter strömavbrott) börjar räknaren om ovanför
+märket, så en nonce återanvänds aldrig.
+
+Saknas fcntl (Windows) hålls räknaren i processen och bara trådsäkerheten
+gäller; kör då en process per API-nyckel.
+
+Nonce-filen har samma format som tidigare (``{"last_nonce": ...}``).
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - beror på plattformen
+    fcntl = None
+
+DEFAULT_BLOCK_SIZE = 10_000
+
+# Delad räknare: (senaste nonce, sista reserverade nonce)
+_COUNTER = struct.Struct("<qq")
+
+
+def _milliseconds() -> int:
+    return int(time.time() * 1000)
+
+
+class NonceAllocator:
+    """
+    Strikt växande nonce-källa, delad mellan trådar och processer.
+
+    Args:
+        path: Fil där högvattenmärket sparas
+        block_size: Antal nonces som reserveras per diskskrivning
+        clock: Funktion som returnerar aktuell tid i ms (nonce följer klockan
+            när den ligger före räknaren, som Bitfinex förväntar sig)
+    """
+
+    def __init__(
+        self,
+        path: str = "nonce_store.json",
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        clock: Optional[Callable[[], int]] = None,
+    ):
+        if block_size < 1:
+            raise ValueError("block_size måste vara minst 1")
+        self.path = path
+        self.block_size = block_size
+        self.clock = clock or _milliseconds
+        self._lock = threading.Lock()
+        # Räknaren i processen när fcntl saknas
+        self._last = 0
+        self._reserved = 0
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self._pid: Optional[int] = None
+
+    def next(self) -> int:
+        """Returnerar nästa nonce (större än alla tidigare från samma nonce-fil)."""
+        with self._lock:
+            if fcntl is None:
+                self._last, self._reserved = self._advance(self._last, self._reserved)
+                return self._last
+            counter = self._counter()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                last, reserved = self._advance(*_COUNTER.unpack_from(counter))
+                _COUNTER.pack_into(counter, 0, last, reserved)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._reserved = reserved
+            return last
+
+    __call__ = next
+
+    @property
+    def high_water_mark(self) -> int:
+        """Sista reserverade nonce (det som finns på disk)."""
+        return self._reserved
+
+    def _advance(self, last: int, reserved: int):
+        # Anropas med self._lock (och flock) hållet
+        nonce = max(last + 1, self.clock())
+        if nonce > reserved:
+            nonce = max(nonce, read_high_water_mark(self.path) + 1)
+            reserved = nonce + self.block_size - 1
+            _write_atomic(self.path, {"last_nonce": reserved})
+        return nonce, reserved
+
+    def _counter(self) -> mmap.mmap:
+        # Öppnas per process: ett ärvt flock-lås delas med föräldern efter fork
+        if self._map is not None and self._pid == os.getpid():
+            return self._map
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < _COUNTER.size:
+                os.ftruncate(fd, _COUNTER.size)
+            counter = mmap.mmap(fd, _COUNTER.size)
+            # Räknaren litas bara på om blockslutet stämmer med nonce-filen
+            if _COUNTER.unpack_from(counter)[1] != read_high_water_mark(self.path):
+                _COUNTER.pack_into(counter, 0, 0, 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd, self._map, self._pid = fd, counter, os.getpid()
+        return counter
+
+
+def read_high_water_mark(path: str) -> int:
+    """Läser sparat högvattenmärke; 0 om filen saknas eller är trasig."""
+    try:
+        with open(path, "r") as f:
+            return int(json.load(f).get("last_nonce", 0))
+    except (OSError, ValueError, TypeError, AttributeError):
+        return 0
+
+
+def _write_atomic(path: str, data: dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:  # pragma: no cover - t.ex. Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:  # pragma: no cover - filsystemet stöder inte fsync av katalog
+        pass
+    finally:
+        os.close(fd)
+
+
+_allocators: Dict[str, NonceAllocator] = {}
+_allocators_lock = threading.Lock()
+
+
+def get_allocator(
+    path: str = "nonce_store.json", block_size: int = DEFAULT_BLOCK_SIZE
+) -> NonceAllocator:
+    """Returnerar processens gemensamma allokerare för path."""
+    key = os.path.abspath(path)
+    allocator = _allocators.get(key)
+    if allocator is None:
+        with _allocators_lock:
+            allocator = _allocators.get(key)
+            if allocator is None:
+                allocator = NonceAllocator(path, block_size)
+                _allocators[key] = allocator
+    return allocator
@@ -0,0 +1,132 @@
+"""
+Minnescache för orderstatus från det autentiserade websocketflödet.
+
+Cachen speglar öppna ordrar från ``os``-snapshot och ``on``/``ou``-händelser
+och flyttar ordrar som stängs (``oc``) till en begränsad lista över nyligen
+stängda. Tillståndet kan sparas och återställas (se checkpoint.py), så att
+boten efter en omstart vet vilka ordrar den hade öppna innan snapshoten från
+börsen kommit.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Bitfinex order-format (index i ordermatrisen)
+ORDER_ID = 0
+ORDER_SYMBOL = 3
+ORDER_MTS_UPDATE = 5
+ORDER_AMOUNT = 6
+ORDER_AMOUNT_ORIG = 7
+ORDER_TYPE = 8
+ORDER_STATUS = 13
+ORDER_PRICE = 16
+ORDER_PRICE_AVG = 17
+
+
+def parse_order(order) -> Optional[dict]:
+    """Bitfinex ordermatris som dict, eller None om formatet är okänt."""
+    if not isinstance(order, (list, tuple)) or len(order) <= ORDER_STATUS:
+        return None
+
+    def field(index):
+        return order[index] if len(order) > index else None
+
+    return {
+        "id": order[ORDER_ID],
+        "symbol": field(ORDER_SYMBOL),
+        "amount": field(ORDER_AMOUNT),
+        "amount_orig": field(ORDER_AMOUNT_ORIG),
+        "type": field(ORDER_TYPE),
+        "status": field(ORDER_STATUS),
+        "price": field(ORDER_PRICE),
+        "price_avg": field(ORDER_PRICE_AVG),
+        "updated": field(ORDER_MTS_UPDATE),
+    }
+
+
+class OrderCache:
+    """
+    Trådsäker cache över öppna och nyligen stängda ordrar.
+
+    Args:
+        max_closed: Antal stängda ordrar som behålls
+    """
+
+    def __init__(self, max_closed: int = 500):
+        self.max_closed = max_closed
+        self._lock = threading.Lock()
+        self._open: Dict[int, dict] = {}
+        self._closed: "OrderedDict[int, dict]" = OrderedDict()
+        self._updated_at: Optional[float] = None
+
+    def _close(self, info: dict):
+        self._open.pop(info["id"], None)
+        self._closed[info["id"]] = info
+        self._closed.move_to_end(info["id"])
+        while len(self._closed) > self.max_closed:
+            self._closed.popitem(last=False)
+
+    def handle_message(self, data) -> bool:
+        """
+        Hanterar ett meddelande från kanal 0 om det gäller ordrar.
+
+        Returns:
+            bool: True om meddelandet var en ``os``/``on``/``ou``/``oc``-händelse
+        """
+        if not isinstance(data, list) or len(data) < 3 or data[0] != 0:
+            return False
+        event = data[1]
+        if event not in ("os", "on", "ou", "oc"):
+            return False
+        with self._lock:
+            if event == "os":
+                self._open = {}
+                for order in data[2] or []:
+                    info = parse_order(order)
+                    if info is not None:
+                        self._open[info["id"]] = info
+            else:
+                info = parse_order(data[2])
+                if info is not None:
+                    if event == "oc":
+                        self._close(info)
+                    else:
+                        self._open[info["id"]] = info
+            self._updated_at = time.time()
+        return True
+
+    def open_orders(self, symbol: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            orders = [dict(info) for info in self._open.values()]
+        if symbol is not None:
+            orders = [info for info in orders if info["symbol"] == symbol]
+        return orders
+
+    def get(self, order_id) -> Optional[dict]:
+        with self._lock:
+            info = self._open.get(order_id) or self._closed.get(order_id)
+            return dict(info) if info is not None else None
+
+    def age(self) -> Optional[float]:
+        updated_at = self._updated_at
+        return None if updated_at is None else time.time() - updated_at
+
+    def snapshot(self) -> dict:
+        """Tillståndet som JSON-kompatibel dict (för checkpoint)."""
+        with self._lock:
+            return {
+                "open": list(self._open.values()),
+                "closed": list(self._closed.values()),
+                "updated_at": self._updated_at,
+            }
+
+    def restore(self, state: dict):
+        """Återställer från snapshot(); en ny ``os``-snapshot ersätter de öppna."""
+        with self._lock:
+            self._open = {info["id"]: info for info in state.get("open", [])}
+            self._closed = OrderedDict(
+                (info["id"], info) for info in state.get("closed", [])
+            )
+            self._updated_at = state.get("updated_at")
@@ -0,0 +1,266 @@
+"""
+Portföljbacktest över flera symboler och tidsramar.
+
+Alla serier läggs i en gemensam kolumnstruktur: en tidsaxel (unionen av alla
+stapeltider) och en 2D-array per OHLCV-fält med en rad per (symbol, tidsram),
+NaN där serien saknar stapel. FVG-strategin utvärderas per serie, i samma process
+eller fördelat på en processpool, och resultaten läggs tillbaka på den gemensamma
+tidsaxeln så att portföljens P&L och exponering kan summeras kolumnvis.
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import BacktestResult, simulate
+from candles import CandleArray, compute_indicators
+from fvg import FVG_INDICATORS, fvg_signals
+from walk_forward import DEFAULT_PARAMS
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+SeriesKey = Tuple[str, str]
+
+
+@dataclass
+class AlignedSeries:
+    """
+    Flera OHLCV-serier på en gemensam tidsaxel.
+
+    Attributes:
+        keys: (symbol, tidsram) per rad
+        timestamps: Gemensam tidsaxel i ms (int64, stigande)
+        open/high/low/close/volume: float64-arrayer med formen (serier, staplar)
+    """
+
+    keys: List[SeriesKey]
+    timestamps: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    @classmethod
+    def from_frames(cls, frames: Dict[SeriesKey, pd.DataFrame]) -> "AlignedSeries":
+        """Bygger strukturen från OHLCV-DataFrames (med 'datetime') per serie."""
+        keys = list(frames)
+        stamps = {
+            key: frames[key]["datetime"]
+            .to_numpy(dtype="datetime64[ms]")
+            .astype(np.int64)
+            for key in keys
+        }
+        timestamps = (
+            np.unique(np.concatenate(list(stamps.values())))
+            if keys
+            else np.empty(0, dtype=np.int64)
+        )
+        columns = {
+            field: np.full((len(keys), len(timestamps)), np.nan) for field in FIELDS
+        }
+        for row, key in enumerate(keys):
+            cols = np.searchsorted(timestamps, stamps[key])
+            for field in FIELDS:
+                columns[field][row, cols] = frames[key][field].to_numpy(dtype=float)
+        return cls(keys=keys, timestamps=timestamps, **columns)
+
+    @property
+    def present(self) -> np.ndarray:
+        """Boolsk mask (serier, staplar) för staplar som finns i respektive serie."""
+        return ~np.isnan(self.close)
+
+    def series(self, row: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Tidsstämplar och OHLCV-kolumner för en serie, utan luckor."""
+        mask = self.present[row]
+        return self.timestamps[mask], {
+            field: getattr(self, field)[row, mask] for field in FIELDS
+        }
+
+
+@dataclass
+class PortfolioResult:
+    """
+    Resultat från en portföljbacktest.
+
+    Attributes:
+        keys: (symbol, tidsram) per rad i pnl/position/exposure
+        timestamps: Gemensam tidsaxel i ms
+        pnl: Ackumulerad P&L per serie och stapel (framåtfylld mellan staplar)
+        position: Nettoposition per serie och stapel
+        exposure: Signerad exponering (position * senaste pris) per serie och stapel
+        equity: Portföljens equity per stapel
+        results: BacktestResult per serie
+        stats: Sammanfattande nyckeltal för portföljen
+    """
+
+    keys: List[SeriesKey]
+    timestamps: np.ndarray
+    pnl: np.ndarray
+    position: np.ndarray
+    exposure: np.ndarray
+    equity: np.ndarray
+    results: Dict[SeriesKey, BacktestResult]
+    stats: Dict[str, float]
+
+    @property
+    def gross_exposure(self) -> np.ndarray:
+        return np.abs(self.exposure).sum(axis=0)
+
+    @property
+    def net_exposure(self) -> np.ndarray:
+        return self.exposure.sum(axis=0)
+
+
+def _evaluate_series(task):
+    """Indikatorer, signaler och simulering för en serie."""
+    key, timestamps, columns, params, hours, engine_params, dtype = task
+    candles = CandleArray(
+        timestamps, *(columns[field] for field in FIELDS), dtype=dtype
+    )
+    compute_indicators(
+        candles,
+        params["ema_length"],
+        params["volume_multiplier"],
+        hours[0],
+        hours[1],
+        indicators=FVG_INDICATORS,
+    )
+    long_signal, short_signal = fvg_signals(
+        candles, params["atr_multiplier"], params["lookback"]
+    )
+    result = simulate(
+        candles.timestamps,
+        candles.open,
+        candles.high,
+        candles.low,
+        candles.close,
+        long_signal,
+        short_signal,
+        stop_loss_pct=params["stop_loss_pct"],
+        take_profit_pct=params["take_profit_pct"],
+        **engine_params,
+    )
+    return key, result
+
+
+def _forward_fill(values, cols, width, before=0.0):
+    """Lägger värden på kolumnerna cols och fyller framåt; före första värdet: before."""
+    out = np.full(width, before, dtype=np.float64)
+    if len(cols) == 0:
+        return out
+    filled = np.zeros(width, dtype=np.int64)
+    filled[cols] = np.arange(1, len(cols) + 1)
+    filled = np.maximum.accumulate(filled)
+    started = filled > 0
+    out[started] = np.asarray(values, dtype=np.float64)[filled[started] - 1]
+    return out
+
+
+def portfolio_backtest(
+    data,
+    params: Optional[dict] = None,
+    overrides: Optional[Dict[SeriesKey, dict]] = None,
+    processes: Optional[int] = 1,
+    trading_start_hour: int = 0,
+    trading_end_hour: int = 23,
+    initial_equity: float = 10_000.0,
+    engine_params: Optional[dict] = None,
+    dtype=np.float64,
+) -> PortfolioResult:
+    """
+    Kör FVG-strategin på alla serier och summerar portföljens P&L och exponering.
+
+    Args:
+        data: AlignedSeries eller dict (symbol, tidsram) -> OHLCV-DataFrame
+        params: Strategiparametrar (se walk_forward.DEFAULT_PARAMS)
+        overrides: Parametrar per serie som ersätter params
+        processes: Antal processer; 1 kör i samma process, None = antal kärnor
+        initial_equity: Portföljens startkapital
+        engine_params: Extra argument till BacktestEngine (mängd, avgifter, gränser)
+        dtype: Precision för indikatorberäkningen per serie (np.float32 halverar minnet)
+
+    Returns:
+        PortfolioResult: Kurvor per serie och för hela portföljen
+    """
+    aligned = (
+        data if isinstance(data, AlignedSeries) else AlignedSeries.from_frames(data)
+    )
+    base = dict(DEFAULT_PARAMS)
+    base.update(params or {})
+    overrides = overrides or {}
+    engine_params = dict(engine_params or {})
+    engine_params["keep_curves"] = True
+    hours = (trading_start_hour, trading_end_hour)
+
+    tasks = []
+    for row, key in enumerate(aligned.keys):
+        timestamps, columns = aligned.series(row)
+        series_params = dict(base)
+        series_params.update(overrides.get(key, {}))
+        tasks.append(
+            (key, timestamps, columns, series_params, hours, engine_params, dtype)
+        )
+    logger.info(f"[PORTFOLIO] Backtest av {len(tasks)} serier")
+
+    if processes == 1 or len(tasks) <= 1:
+        evaluated = [_evaluate_series(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            evaluated = list(pool.map(_evaluate_series, tasks))
+
+    width = len(aligned.timestamps)
+    shape = (len(aligned.keys), width)
+    pnl = np.zeros(shape)
+    position = np.zeros(shape)
+    exposure = np.zeros(shape)
+    results = {}
+    for row, (key, result) in enumerate(evaluated):
+        results[key] = result
+        cols = np.searchsorted(aligned.timestamps, result.timestamps)
+        # Serierna delar portföljens kapital; bara varje series P&L summeras
+        series_pnl = result.equity - result.stats["initial_equity"]
+        pnl[row] = _forward_fill(series_pnl, cols, width)
+        position[row] = _forward_fill(result.position, cols, width)
+        mask = aligned.present[row]
+        price = _forward_fill(aligned.close[row, mask], np.flatnonzero(mask), width)
+        exposure[row] = position[row] * price
+
+    equity = initial_equity + pnl.sum(axis=0)
+    gross = np.abs(exposure).sum(axis=0)
+    if width:
+        peak = np.maximum.accumulate(np.r_[initial_equity, equity])[1:]
+        max_drawdown = float(((equity - peak) / peak).min())
+    else:
+        max_drawdown = 0.0
+    stats = {
+        "series": len(aligned.keys),
+        "bars": width,
+        "initial_equity": initial_equity,
+        "final_equity": float(equity[-1]) if width else initial_equity,
+        "net_pnl": float(equity[-1] - initial_equity) if width else 0.0,
+        "fees": sum(r.stats["fees"] for r in results.values()),
+        "trades": sum(r.stats["trades"] for r in results.values()),
+        "open_trades": sum(r.stats["open_trades"] for r in results.values()),
+        "max_drawdown": max_drawdown,
+        "max_gross_exposure": float(gross.max()) if width else 0.0,
+        "avg_gross_exposure": float(gross.mean()) if width else 0.0,
+    }
+    wins = sum(r.stats["wins"] for r in results.values())
+    stats["win_rate"] = wins / stats["trades"] if stats["trades"] else 0.0
+    return PortfolioResult(
+        keys=aligned.keys,
+        timestamps=aligned.timestamps,
+        pnl=pnl,
+        position=position,
+        exposure=exposure,
+        equity=equity,
+        results=results,
+        stats=stats,
+    )
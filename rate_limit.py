@@ -0,0 +1,286 @@
+"""
+Gemensam token-bucket för REST-anrop mot börsen, delad mellan processer.
+
+Boten och API:t (som startar boten som egen process) använder samma API-nyckel
+och därmed samma gräns hos Bitfinex. ``RateLimiter`` lagrar hinkens tillstånd
+(tokens och senaste påfyllnad) i en minnesmappad fil och uppdaterar det under
+``fcntl.flock``, så alla processer som öppnar samma fil delar budgeten. Låset
+hålls bara under själva uppdateringen (mikrosekunder); väntan sker utanför.
+
+Prioritet ges genom reserver: ordrar får tömma hinken helt, marknadsdata får
+inte ta de sista ``MARKET_RESERVE`` av kapaciteten och dashboardläsningar inte
+de sista ``DASHBOARD_RESERVE``. Under last stryps alltså läsningar först.
+
+``install`` kopplar limitern till en ccxt-exchange genom att ersätta
+``throttle`` (ccxt:s kostnad per endpoint behålls, en enhet = ``rateLimit`` ms)
+och köra order-metoderna med orderprioritet. Saknas fcntl (Windows) delas
+hinken bara mellan trådar i samma process.
+"""
+
+import functools
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import ccxt
+
+from metrics import RATE_LIMIT_TOKENS, RATE_LIMIT_WAIT_SECONDS
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - beror på plattformen
+    fcntl = None
+
+# Prioriteter (lägre värde = viktigare)
+ORDER = 0
+MARKET = 1
+DASHBOARD = 2
+PRIORITY_NAMES = {ORDER: "order", MARKET: "market", DASHBOARD: "dashboard"}
+
+# Andel av kapaciteten som lämnas kvar åt viktigare trafik
+MARKET_RESERVE = 0.25
+DASHBOARD_RESERVE = 0.5
+RESERVES = {ORDER: 0.0, MARKET: MARKET_RESERVE, DASHBOARD: DASHBOARD_RESERVE}
+
+# Metoder som körs med orderprioritet när install() används
+ORDER_METHODS = (
+    "create_order",
+    "create_limit_buy_order",
+    "create_limit_sell_order",
+    "create_market_buy_order",
+    "create_market_sell_order",
+    "cancel_order",
+    "cancel_all_orders",
+    "edit_order",
+)
+
+# tokens, senaste påfyllnad (epoch-sekunder)
+_STATE = struct.Struct("dd")
+_MAX_SLEEP = 0.25
+
+_context = threading.local()
+
+
+def current_priority() -> int:
+    """Trådens aktuella prioritet (MARKET om ingen är satt)."""
+    level = getattr(_context, "priority", None)
+    return MARKET if level is None else level
+
+
+def set_thread_priority(priority: Optional[int]):
+    """Sätter standardprioritet för tråden (None återställer till MARKET)."""
+    _context.priority = priority
+
+
+@contextmanager
+def priority(level: int):
+    """Kör blocket med given prioritet i den här tråden."""
+    previous = getattr(_context, "priority", None)
+    _context.priority = level
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+
+def default_path() -> str:
+    """Delad tillståndsfil för alla processer hos samma användare."""
+    user = hashlib.sha256(os.path.expanduser("~").encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"tradingbot-ratelimit-{user}.bin")
+
+
+class RateLimiter:
+    """
+    Token-bucket vars tillstånd delas mellan processer via en mappad fil.
+
+    Args:
+        path: Tillståndsfil; alla processer med samma fil delar budgeten
+        rate: Påfyllnad i kostnadsenheter per sekund
+        capacity: Hinkens storlek (största skur)
+        clock: Tidskälla i sekunder (gemensam för processerna)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        rate: float = 4.0,
+        capacity: float = 20.0,
+        clock=time.time,
+    ):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate och capacity måste vara positiva")
+        self.path = path or default_path()
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.clock = clock
+        self._lock = threading.Lock()
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with self._file_lock(fd):
+                if os.fstat(fd).st_size < _STATE.size:
+                    os.ftruncate(fd, _STATE.size)
+                    os.pwrite(fd, _STATE.pack(self.capacity, self.clock()), 0)
+            self._map = mmap.mmap(fd, _STATE.size)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    @contextmanager
+    def _file_lock(self, fd=None):
+        fd = self._fd if fd is None else fd
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _refill(self):
+        # Anropas med låsen hållna; returnerar (tokens, tidsstämpel)
+        tokens, updated = _STATE.unpack_from(self._map)
+        now = self.clock()
+        if now > updated:
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            updated = now
+        return tokens, updated
+
+    def _threshold(self, priority: int) -> float:
+        return RESERVES.get(priority, DASHBOARD_RESERVE) * self.capacity
+
+    def try_acquire(self, priority: int = MARKET, cost: float = 1.0) -> float:
+        """
+        Försöker ta cost tokens utan att vänta.
+
+        Returns:
+            0.0 om det lyckades, annars sekunder tills det kan lyckas
+        """
+        threshold = self._threshold(priority)
+        # En kostnad större än tillgängligt utrymme skulle aldrig gå igenom
+        cost = min(cost, self.capacity - threshold)
+        with self._lock, self._file_lock():
+            tokens, updated = self._refill()
+            if tokens - cost >= threshold:
+                tokens -= cost
+                _STATE.pack_into(self._map, 0, tokens, updated)
+                RATE_LIMIT_TOKENS.set(tokens)
+                return 0.0
+        return (threshold + cost - tokens) / self.rate
+
+    def acquire(
+        self,
+        priority: int = MARKET,
+        cost: float = 1.0,
+        timeout: Optional[float] = None,
+    ) -> float:
+        """
+        Väntar tills cost tokens finns tillgängliga för prioriteten.
+
+        Returns:
+            Väntetid i sekunder
+
+        Raises:
+            ccxt.RateLimitExceeded: Om budgeten inte räcker inom timeout
+        """
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(priority, cost)
+            waited = time.monotonic() - started
+            if not wait:
+                RATE_LIMIT_WAIT_SECONDS.labels(
+                    PRIORITY_NAMES.get(priority, "dashboard")
+                ).observe(waited)
+                return waited
+            if timeout is not None and waited + wait > timeout:
+                raise ccxt.RateLimitExceeded(
+                    f"Rate limit: ingen budget för {PRIORITY_NAMES.get(priority)} "
+                    f"inom {timeout} s"
+                )
+            time.sleep(min(wait, _MAX_SLEEP))
+
+    def remaining(self, priority: Optional[int] = None) -> float:
+        """Tokens kvar totalt, eller tillgängliga för en viss prioritet."""
+        with self._lock, self._file_lock():
+            tokens = self._refill()[0]
+        if priority is None:
+            return tokens
+        return max(0.0, tokens - self._threshold(priority))
+
+    def status(self) -> dict:
+        """Aktuell budget per prioritet (för /ratelimit och loggning)."""
+        tokens = self.remaining()
+        return {
+            "capacity": self.capacity,
+            "rate_per_second": self.rate,
+            "tokens": tokens,
+            "available": {
+                name: max(0.0, tokens - self._threshold(level))
+                for level, name in PRIORITY_NAMES.items()
+            },
+        }
+
+    def close(self):
+        if self._fd is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._fd = None
+
+
+def install(exchange, limiter: RateLimiter, order_methods=ORDER_METHODS):
+    """
+    Låter exchange-objektets REST-anrop gå genom limitern.
+
+    ccxt anropar ``throttle(cost)`` före varje anrop när enableRateLimit är
+    satt; den ersätts så att kostnaden dras från den delade hinken med trådens
+    prioritet. Order-metoderna körs med ORDER-prioritet.
+    """
+    exchange.enableRateLimit = True
+    exchange.throttle = lambda cost=None: limiter.acquire(
+        current_priority(), 1.0 if cost is None else cost
+    )
+    for name in order_methods:
+        method = getattr(exchange, name, None)
+        if method is None:
+            continue
+        setattr(exchange, name, _with_priority(method, ORDER))
+    exchange.rate_limiter = limiter
+    return exchange
+
+
+def _with_priority(method, level):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with priority(level):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(**kwargs) -> RateLimiter:
+    """
+    Processens delade limiter.
+
+    Inställningar läses från RATE_LIMIT_FILE, RATE_LIMIT_PER_SECOND och
+    RATE_LIMIT_BURST om de inte anges.
+    """
+    path = kwargs.pop("path", None) or os.getenv("RATE_LIMIT_FILE") or default_path()
+    kwargs.setdefault("rate", float(os.getenv("RATE_LIMIT_PER_SECOND", "4")))
+    kwargs.setdefault("capacity", float(os.getenv("RATE_LIMIT_BURST", "20")))
+    with _limiters_lock:
+        limiter = _limiters.get(path)
+        if limiter is None:
+            limiter = RateLimiter(path, **kwargs)
+            _limiters[path] = limiter
+    return limiter
@@ -0,0 +1,230 @@
+"""
+Högre tidsramar härledda lokalt från 1m-staplar.
+
+``resample`` slår ihop staplar till hinkar som börjar på jämna multiplar av
+tidsramen i UTC (som Bitfinex: 4h-staplar börjar 00, 04, 08 ... och 1d-staplar
+vid midnatt UTC). ``MultiTimeframeCandles`` håller en rullande 1m-buffert och en
+``CandleBuffer`` per tidsram. Varje ny 1m-batch räknar bara om hinkarna från
+batchens första stapel, så 5m/15m/1h/4h/1d kostar inga egna börsanrop.
+
+Den sista stapeln i varje tidsram är ofullständig (pågående hink) tills en 1m-
+stapel i nästa hink kommit. En hink som 1m-bufferten inte täcker från början
+räknas aldrig om lokalt; där gäller staplarna från ``seed`` (ett engångsanrop
+för historik som är äldre än bufferten).
+"""
+
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from candles import OHLCV_FIELDS, CandleArray, CandleBuffer, concat
+
+MS_PER_MINUTE = 60_000
+
+_UNITS = {"m": 1, "h": 60, "d": 1440}
+
+DEFAULT_TIMEFRAMES = ("5m", "15m", "1h", "4h", "1d")
+
+
+def timeframe_ms(timeframe: str) -> int:
+    """
+    Tidsramens längd i millisekunder.
+
+    Raises:
+        ValueError: Om tidsramen inte kan delas in i jämna UTC-hinkar (t.ex. 1w)
+    """
+    amount, unit = timeframe[:-1], timeframe[-1:]
+    if unit not in _UNITS or not amount.isdigit() or int(amount) <= 0:
+        raise ValueError(f"Tidsram stöds inte för resampling: {timeframe}")
+    return int(amount) * _UNITS[unit] * MS_PER_MINUTE
+
+
+def resample(candles: CandleArray, timeframe: str) -> CandleArray:
+    """
+    Slår ihop staplar (sorterade på tid) till timeframe.
+
+    Hinkar utan staplar utelämnas, som hos börsen. Den första och sista hinken
+    kan vara ofullständiga om candles inte täcker dem.
+    """
+    if not len(candles):
+        return concat([], candles.dtype)
+    step = timeframe_ms(timeframe)
+    buckets = candles.timestamps // step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    return CandleArray(
+        buckets[starts] * step,
+        candles.open[starts],
+        np.maximum.reduceat(candles.high, starts),
+        np.minimum.reduceat(candles.low, starts),
+        candles.close[ends],
+        np.add.reduceat(candles.volume, starts),
+        dtype=candles.dtype,
+    )
+
+
+def _since(candles: CandleArray, timestamp: int) -> CandleArray:
+    first = int(np.searchsorted(candles.timestamps, timestamp, side="left"))
+    return candles[first:]
+
+
+class MultiTimeframeCandles:
+    """
+    1m-buffert och härledda tidsramar för en symbol.
+
+    Args:
+        timeframes: Tidsramar som härleds (multiplar av base_timeframe)
+        capacity: Antal staplar som behålls per härledd tidsram
+        base_timeframe: Tidsramen som matas in med update
+        base_capacity: Minsta antal basstaplar; bufferten rymmer alltid den
+            största hinken plus en timme, så att den pågående hinken kan räknas om
+        dtype: Flyttalstyp för kolumnerna
+    """
+
+    def __init__(
+        self,
+        timeframes: Iterable[str] = DEFAULT_TIMEFRAMES,
+        capacity: int = 500,
+        base_timeframe: str = "1m",
+        base_capacity: Optional[int] = None,
+        dtype=np.float64,
+    ):
+        self.base_timeframe = base_timeframe
+        self.base_ms = timeframe_ms(base_timeframe)
+        self._steps: Dict[str, int] = {}
+        for timeframe in timeframes:
+            step = timeframe_ms(timeframe)
+            if timeframe == base_timeframe:
+                continue
+            if step % self.base_ms:
+                raise ValueError(f"{timeframe} är inte en multipel av {base_timeframe}")
+            self._steps[timeframe] = step
+        largest = max(self._steps.values(), default=self.base_ms) // self.base_ms
+        self.base = CandleBuffer(max(base_capacity or 0, largest + 60), dtype)
+        self.frames = {tf: CandleBuffer(capacity, dtype) for tf in self._steps}
+        # Största antal staplar som hämtats med seed per tidsram
+        self.seeded: Dict[str, int] = {}
+
+    @property
+    def timeframes(self):
+        return [self.base_timeframe, *self.frames]
+
+    def supports(self, timeframe: str) -> bool:
+        return timeframe == self.base_timeframe or timeframe in self.frames
+
+    def capacity(self, timeframe: str) -> int:
+        """Antal staplar som behålls för timeframe."""
+        if timeframe == self.base_timeframe:
+            return self.base.capacity
+        return self.frames[timeframe].capacity
+
+    def _covered_from(self, timeframe: str) -> Optional[int]:
+        # Första hink som basbufferten täcker från början
+        if not len(self.base):
+            return None
+        step = self._steps[timeframe]
+        first = int(self.base.candles.timestamps[0])
+        return -(-first // step) * step
+
+    def _refresh(self, timeframe: str, since: int) -> int:
+        step = self._steps[timeframe]
+        covered = self._covered_from(timeframe)
+        start = max(since - since % step, covered)
+        bars = resample(_since(self.base.candles, start), timeframe)
+        return self.frames[timeframe].merge(bars)
+
+    def update(self, new: CandleArray) -> Dict[str, int]:
+        """
+        Lägger till basstaplar (den sista får ersättas vid nästa anrop) och
+        räknar om de hinkar som påverkas.
+
+        Returns:
+            {tidsram: antal nya staplar}
+        """
+        if not len(new):
+            return {}
+        added = {self.base_timeframe: self.base.merge(new)}
+        since = int(new.timestamps[0])
+        for timeframe in self.frames:
+            added[timeframe] = self._refresh(timeframe, since)
+        return added
+
+    def seed(self, timeframe: str, candles: CandleArray):
+        """
+        Fyller på historik för timeframe från börsen (t.ex. vid start).
+
+        Hinkar som basbufferten täcker räknas om lokalt efteråt, så den
+        pågående stapeln kommer från 1m-flödet och inte från seed-anropet.
+        """
+        self.seeded[timeframe] = max(self.seeded.get(timeframe, 0), len(candles))
+        if timeframe == self.base_timeframe:
+            self.base.merge(candles)
+            return
+        frame = self.frames[timeframe]
+        if len(frame):
+            # Befintliga staplar är nyare än eller lika med seed-staplarna
+            older = candles.timestamps < frame.candles.timestamps[0]
+            candles = concat([candles[: int(older.sum())], frame.candles], frame.dtype)
+            frame.clear()
+        frame.merge(candles)
+        if len(self.base):
+            self._refresh(timeframe, int(self.base.candles.timestamps[0]))
+
+    def candles(self, timeframe: str, partial: bool = True) -> CandleArray:
+        """
+        Staplarna i timeframe; med partial=False utan den pågående hinken.
+        """
+        if timeframe == self.base_timeframe:
+            candles = self.base.candles
+        else:
+            candles = self.frames[timeframe].candles
+        if partial or not len(candles) or not self.is_partial(timeframe):
+            return candles
+        return candles[: len(candles) - 1]
+
+    def since(self, timeframe: str, timestamp: int) -> CandleArray:
+        """Staplar i timeframe från och med timestamp (epoch-ms)."""
+        return _since(self.candles(timeframe), timestamp)
+
+    def is_partial(self, timeframe: str) -> bool:
+        """Om den sista stapeln i timeframe är en pågående hink."""
+        if not len(self.base):
+            return False
+        if timeframe == self.base_timeframe:
+            return True
+        frame = self.frames[timeframe]
+        if not len(frame):
+            return False
+        step = self._steps[timeframe]
+        last_base = int(self.base.candles.timestamps[-1])
+        return frame.last_timestamp + step > last_base
+
+    def clear(self):
+        self.seeded.clear()
+        self.base.clear()
+        for frame in self.frames.values():
+            frame.clear()
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Bas och tidsramar som arrayer med nycklar 'tidsram:kolumn'."""
+        arrays = {}
+        for timeframe, buffer in (
+            (self.base_timeframe, self.base),
+            *self.frames.items(),
+        ):
+            for field, values in buffer.snapshot().items():
+                arrays[f"{timeframe}:{field}"] = values
+        return arrays
+
+    def restore(self, arrays: Dict[str, np.ndarray]):
+        """Återställer från snapshot(); okända tidsramar hoppas över."""
+        self.clear()
+        for timeframe, buffer in (
+            (self.base_timeframe, self.base),
+            *self.frames.items(),
+        ):
+            fields = ("timestamp", *OHLCV_FIELDS)
+            if all(f"{timeframe}:{field}" in arrays for field in fields):
+                buffer.restore(
+                    {field: arrays[f"{timeframe}:{field}"] for field in fields}
+                )
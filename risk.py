@@ -0,0 +1,493 @@
+"""
+Riskräknare och riskmotor för boten.
+
+``DailyCounters`` håller antal affärer och realiserat resultat för innevarande
+UTC-dygn och nollställs automatiskt vid dygnsskifte. Räknarna lever i
+processen (inte i en enskild strategikörning) och sparas i checkpointen, så
+att MAX_TRADES_PER_DAY och MAX_DAILY_LOSS gäller även över en omstart.
+
+``RiskEngine`` håller positioner per symbol och för portföljen, realiserat och
+orealiserat resultat och dagens räknare, och svarar på kontrollen före varje
+order i konstant tid.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+
+def utc_day(ts: Optional[float] = None) -> str:
+    """UTC-datum (ÅÅÅÅ-MM-DD) för epoch-sekunder ts (standard nu)."""
+    ts = time.time() if ts is None else ts
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+class DailyCounters:
+    """
+    Affärer och realiserat resultat per UTC-dygn.
+
+    Args:
+        clock: Tidskälla i epoch-sekunder
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.day = utc_day(clock())
+        self.trades = 0
+        self.realized_pnl = 0.0
+
+    def _roll(self):
+        day = utc_day(self.clock())
+        if day != self.day:
+            self.day = day
+            self.trades = 0
+            self.realized_pnl = 0.0
+
+    def record_trade(self, count: int = 1):
+        with self._lock:
+            self._roll()
+            self.trades += count
+
+    def record_pnl(self, pnl: float):
+        with self._lock:
+            self._roll()
+            self.realized_pnl += pnl
+
+    def current(self) -> dict:
+        """Dagens räknare (efter ev. dygnsskifte)."""
+        with self._lock:
+            self._roll()
+            return {
+                "day": self.day,
+                "trades": self.trades,
+                "realized_pnl": self.realized_pnl,
+            }
+
+    def restore(self, state: dict):
+        """Återställer från current(); räknare från ett tidigare dygn ignoreras."""
+        with self._lock:
+            if state.get("day") != utc_day(self.clock()):
+                return
+            self.day = state["day"]
+            self.trades = int(state.get("trades", 0))
+            self.realized_pnl = float(state.get("realized_pnl", 0.0))
+
+
+# Bitfinex trade-format (tu): [ID, SYMBOL, MTS_CREATE, ORDER_ID, EXEC_AMOUNT,
+# EXEC_PRICE, ORDER_TYPE, ORDER_PRICE, MAKER, FEE, FEE_CURRENCY, CID]
+TRADE_ID = 0
+TRADE_SYMBOL = 1
+TRADE_MTS = 2
+TRADE_ORDER_ID = 3
+TRADE_AMOUNT = 4
+TRADE_PRICE = 5
+TRADE_FEE = 9
+TRADE_FEE_CURRENCY = 10
+
+
+def split_pair(symbol: str):
+    """(bas, quote) för 'tBTCUSD', 'tTESTBTC:TESTUSD' eller 'BTC/USD'."""
+    if "/" in symbol:
+        base, quote = symbol.split("/", 1)
+        return base, quote.split(":")[0]
+    pair = symbol[1:] if symbol[:1] in ("t", "f") else symbol
+    if ":" in pair:
+        base, quote = pair.split(":", 1)
+        return base, quote
+    return pair[:3], pair[3:]
+
+
+def _fee_value(symbol: str, fee, fee_currency: Optional[str], price: float) -> float:
+    # Bitfinex anger avgiften som negativt tal; avgift i basvaluta räknas om
+    value = float(fee or 0.0)
+    if fee_currency == split_pair(symbol)[0]:
+        value *= price
+    return value
+
+
+def _trade_key(trade_id):
+    # Websocketflödet ger int, ccxt str
+    try:
+        return int(trade_id)
+    except (TypeError, ValueError):
+        return trade_id
+
+
+def _well_formed(trade) -> bool:
+    if not isinstance(trade, list) or len(trade) <= TRADE_PRICE:
+        return False
+    try:
+        float(trade[TRADE_AMOUNT])
+        float(trade[TRADE_PRICE])
+    except (TypeError, ValueError):
+        return False
+    return trade[TRADE_ORDER_ID] is not None
+
+
+class Position:
+    """Nettoposition med genomsnittligt anskaffningspris för en symbol."""
+
+    __slots__ = ("symbol", "amount", "avg_price", "realized_pnl", "mark_price")
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.amount = 0.0
+        self.avg_price = 0.0
+        self.realized_pnl = 0.0
+        self.mark_price: Optional[float] = None
+
+    @property
+    def unrealized_pnl(self) -> float:
+        if self.mark_price is None or not self.amount:
+            return 0.0
+        return (self.mark_price - self.avg_price) * self.amount
+
+    @property
+    def exposure(self) -> float:
+        price = self.mark_price if self.mark_price is not None else self.avg_price
+        return abs(self.amount) * price
+
+    def apply_fill(self, amount: float, price: float) -> float:
+        """Uppdaterar positionen med en fyllnad och returnerar realiserat resultat."""
+        realized = 0.0
+        if self.amount and (self.amount > 0) != (amount > 0):
+            closed = min(abs(amount), abs(self.amount))
+            direction = 1.0 if self.amount > 0 else -1.0
+            realized = (price - self.avg_price) * closed * direction
+            remaining = amount + closed * direction
+            self.amount -= closed * direction
+            if abs(self.amount) < 1e-12:
+                self.amount = 0.0
+                self.avg_price = 0.0
+            amount = remaining
+        if amount:
+            total = self.amount + amount
+            self.avg_price = (self.avg_price * self.amount + price * amount) / total
+            self.amount = total
+        self.realized_pnl += realized
+        return realized
+
+    def as_dict(self) -> dict:
+        return {
+            "symbol": self.symbol,
+            "amount": self.amount,
+            "avg_price": self.avg_price,
+            "realized_pnl": self.realized_pnl,
+            "mark_price": self.mark_price,
+            "unrealized_pnl": self.unrealized_pnl,
+        }
+
+
+class RiskEngine:
+    """
+    Positioner, resultat och riskgränser i realtid.
+
+    Positionerna uppdateras av fyllnader från websocketflödet (``tu``) och
+    värderas mot senast kända pris (``mark``). Summorna för hela portföljen
+    (orealiserat resultat, brutto-exponering) hålls uppdaterade inkrementellt,
+    så ``check`` före varje order är O(1) oavsett antal symboler.
+
+    Dagens förlust är realiserat resultat i dag plus orealiserat resultat på
+    öppna positioner. Ordrar som minskar en position tillåts alltid.
+
+    Args:
+        max_trades_per_day: Max antal ordrar per UTC-dygn
+        max_daily_loss: Förlustgräns per dygn i quote-valuta (positivt tal)
+        max_position: Max absolut positionsstorlek per symbol (None = ingen)
+        max_exposure: Max brutto-exponering för portföljen (None = ingen)
+        normalize: Översätter ordersymboler till websocketflödets symboler
+        clock: Tidskälla i epoch-sekunder
+    """
+
+    def __init__(
+        self,
+        max_trades_per_day: Optional[int] = None,
+        max_daily_loss: Optional[float] = None,
+        max_position: Optional[float] = None,
+        max_exposure: Optional[float] = None,
+        normalize=None,
+        clock=time.time,
+    ):
+        self.max_trades_per_day = max_trades_per_day
+        self.max_daily_loss = max_daily_loss
+        self.max_position = max_position
+        self.max_exposure = max_exposure
+        self.normalize = normalize or (lambda symbol: symbol)
+        self.daily = DailyCounters(clock)
+        self.halted: Optional[str] = None
+        self._lock = threading.Lock()
+        self._positions: Dict[str, Position] = {}
+        self._unrealized = 0.0
+        self._exposure = 0.0
+        self._seen_trades: "OrderedDict[int, bool]" = OrderedDict()
+        # Tid (ms) för senaste bokförda fyllnad; avstämningen hämtar det som
+        # kommit sedan dess. Utan historik räknas från start
+        self.last_fill_ms = int(clock() * 1000)
+
+    def _position(self, symbol: str) -> Position:
+        position = self._positions.get(symbol)
+        if position is None:
+            position = self._positions[symbol] = Position(symbol)
+        return position
+
+    def _update(self, position: Position, change):
+        # Håller portföljsummorna i takt med ändringen av en position
+        unrealized, exposure = position.unrealized_pnl, position.exposure
+        result = change()
+        self._unrealized += position.unrealized_pnl - unrealized
+        self._exposure += position.exposure - exposure
+        return result
+
+    # --- Uppdateringar ---
+
+    def mark(self, symbol: str, price: float):
+        """Värderar symbolens position mot senaste pris."""
+        if price is None or price <= 0:
+            return
+        symbol = self.normalize(symbol)
+        with self._lock:
+            position = self._position(symbol)
+
+            def change():
+                position.mark_price = float(price)
+
+            self._update(position, change)
+
+    def apply_fill(
+        self,
+        symbol: str,
+        amount: float,
+        price: float,
+        fee: float = 0.0,
+        fee_currency: Optional[str] = None,
+    ) -> float:
+        """
+        Bokför en fyllnad (amount > 0 köp, < 0 sälj) och returnerar realiserat
+        resultat inklusive avgift.
+        """
+        symbol = self.normalize(symbol)
+        fee_value = _fee_value(symbol, fee, fee_currency, price)
+        with self._lock:
+            position = self._position(symbol)
+
+            def change():
+                realized = position.apply_fill(float(amount), float(price))
+                # Egen fyllnad är också ett färskt marknadspris
+                position.mark_price = float(price)
+                position.realized_pnl += fee_value
+                return realized + fee_value
+
+            realized = self._update(position, change)
+        self.daily.record_pnl(realized)
+        return realized
+
+    def apply_fee(
+        self, symbol: str, fee: float, fee_currency: Optional[str], price: float
+    ):
+        """Bokför avgiften för en fyllnad som redan bokförts utan avgift."""
+        symbol = self.normalize(symbol)
+        fee_value = _fee_value(symbol, fee, fee_currency, price)
+        with self._lock:
+            self._position(symbol).realized_pnl += fee_value
+        self.daily.record_pnl(fee_value)
+
+    def handle_message(self, data) -> bool:
+        """
+        Hanterar fyllnader (``te``/``tu``) från kanal 0.
+
+        Bitfinex skickar samma fyllnad två gånger: ``te`` direkt och ``tu`` med
+        avgift strax efter. Positionen bokförs på det som kommer först och
+        avgiften när den finns; dubbletter känns igen på trade-id.
+
+        Returns:
+            bool: True om meddelandet var en välformad fyllnad (trade-listan
+            har order-id, mängd och pris); felformade fyllnader ignoreras
+        """
+        if not isinstance(data, list) or len(data) < 3 or data[0] != 0:
+            return False
+        if data[1] not in ("te", "tu"):
+            return False
+        trade = data[2]
+        if not _well_formed(trade):
+            return False
+        self._book(trade)
+        return True
+
+    def _book(self, trade) -> bool:
+        # Bokför en välformad fyllnad; True om den inte setts tidigare
+        has_fee = len(trade) > TRADE_FEE_CURRENCY
+        trade_id = _trade_key(trade[TRADE_ID])
+        with self._lock:
+            # None = ny fyllnad, False = bokförd utan avgift, True = klar
+            seen = self._seen_trades.get(trade_id)
+            self._seen_trades[trade_id] = bool(seen) or has_fee
+            while len(self._seen_trades) > 1000:
+                self._seen_trades.popitem(last=False)
+            mts = trade[TRADE_MTS]
+            if isinstance(mts, (int, float)) and mts > self.last_fill_ms:
+                self.last_fill_ms = int(mts)
+        fee = trade[TRADE_FEE] if has_fee else 0.0
+        fee_currency = trade[TRADE_FEE_CURRENCY] if has_fee else None
+        if seen is None:
+            self.apply_fill(
+                trade[TRADE_SYMBOL],
+                trade[TRADE_AMOUNT],
+                trade[TRADE_PRICE],
+                fee,
+                fee_currency,
+            )
+        elif seen is False and has_fee:
+            self.apply_fee(trade[TRADE_SYMBOL], fee, fee_currency, trade[TRADE_PRICE])
+        return seen is None
+
+    def reconcile(self, trades) -> List[list]:
+        """
+        Stämmer av mot börsens trade-historik (ccxt ``fetch_my_trades``).
+
+        Fyllnader som inte kom via websocket, t.ex. under ett avbrott eller
+        innan en omstart, och exits som gjorts direkt på börsen bokförs som om
+        de kommit som ``tu``; redan bokförda känns igen på trade-id.
+
+        Returns:
+            De nya fyllnaderna i Bitfinex trade-format (för t.ex. SL/TP-armering)
+        """
+        booked = []
+        for trade in sorted(trades or [], key=lambda t: t.get("timestamp") or 0):
+            try:
+                amount = float(trade["amount"])
+                row = [
+                    trade["id"],
+                    trade["symbol"],
+                    trade.get("timestamp"),
+                    trade.get("order"),
+                    amount if trade.get("side") == "buy" else -amount,
+                    float(trade["price"]),
+                    trade.get("type"),
+                    None,
+                    None,
+                    -float((trade.get("fee") or {}).get("cost") or 0.0),
+                    (trade.get("fee") or {}).get("currency"),
+                ]
+            except (KeyError, TypeError, ValueError):
+                continue
+            if self._book(row):
+                booked.append(row)
+        return booked
+
+    def record_order(self):
+        """Räknar en lagd order mot MAX_TRADES_PER_DAY."""
+        self.daily.record_trade()
+
+    def halt(self, reason: str = "manuellt stopp"):
+        self.halted = reason
+
+    def resume(self):
+        self.halted = None
+
+    # --- Kontroller ---
+
+    def daily_pnl(self) -> float:
+        return self.daily.current()["realized_pnl"] + self._unrealized
+
+    def check(
+        self, symbol: str, side: str, amount: float, price: Optional[float] = None
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Kontroll före order, O(1).
+
+        Args:
+            side: "buy" eller "sell"
+            price: Orderpris; standard är senaste markpris
+
+        Returns:
+            (tillåten, skäl om den nekas)
+        """
+        symbol = self.normalize(symbol)
+        signed = amount if side == "buy" else -amount
+        position = self._positions.get(symbol)
+        current = position.amount if position is not None else 0.0
+        new_amount = current + signed
+        # Ordrar som bara minskar positionen tillåts alltid
+        if current and abs(new_amount) <= abs(current) and (new_amount * current) >= 0:
+            return True, None
+        if self.halted:
+            return False, f"handel stoppad: {self.halted}"
+        daily = self.daily.current()
+        if (
+            self.max_trades_per_day is not None
+            and daily["trades"] >= self.max_trades_per_day
+        ):
+            return False, f"max antal affärer per dag ({self.max_trades_per_day})"
+        if (
+            self.max_daily_loss is not None
+            and daily["realized_pnl"] + self._unrealized <= -self.max_daily_loss
+        ):
+            return False, f"dagens förlustgräns ({self.max_daily_loss}) nådd"
+        if self.max_position is not None and abs(new_amount) > self.max_position:
+            return False, f"max position ({self.max_position}) för {symbol}"
+        if self.max_exposure is not None:
+            if price is None and position is not None:
+                price = position.mark_price
+            if price is not None:
+                added = (abs(new_amount) - abs(current)) * price
+                if self._exposure + added > self.max_exposure:
+                    return False, f"max exponering ({self.max_exposure})"
+        return True, None
+
+    # --- Rapportering och checkpoint ---
+
+    def position(self, symbol: str) -> float:
+        """Nettoposition för symbol (positiv lång, negativ kort)."""
+        position = self._positions.get(self.normalize(symbol))
+        return position.amount if position is not None else 0.0
+
+    def positions(self) -> List[dict]:
+        with self._lock:
+            return [p.as_dict() for p in self._positions.values() if p.amount]
+
+    def summary(self) -> dict:
+        daily = self.daily.current()
+        return {
+            **daily,
+            "unrealized_pnl": self._unrealized,
+            "daily_pnl": daily["realized_pnl"] + self._unrealized,
+            "exposure": self._exposure,
+            "halted": self.halted,
+        }
+
+    def snapshot(self) -> dict:
+        """Positioner och dagens räknare som JSON-kompatibel dict."""
+        with self._lock:
+            positions = [p.as_dict() for p in self._positions.values()]
+            seen = [trade_id for trade_id, done in self._seen_trades.items() if done]
+        return {
+            "daily": self.daily.current(),
+            "positions": positions,
+            "last_fill_ms": self.last_fill_ms,
+            "seen_trades": seen,
+        }
+
+    def restore(self, state: dict):
+        self.daily.restore(state.get("daily", {}))
+        with self._lock:
+            self._positions = {}
+            self._unrealized = 0.0
+            self._exposure = 0.0
+            if state.get("last_fill_ms") is not None:
+                self.last_fill_ms = int(state["last_fill_ms"])
+            self._seen_trades = OrderedDict(
+                (trade_id, True) for trade_id in state.get("seen_trades", [])
+            )
+            for item in state.get("positions", []):
+                position = self._position(item["symbol"])
+
+                def change(position=position, item=item):
+                    position.amount = item["amount"]
+                    position.avg_price = item["avg_price"]
+                    position.realized_pnl = item["realized_pnl"]
+                    position.mark_price = item["mark_price"]
+
+                self._update(position, change)
@@ -0,0 +1,310 @@
+"""
+En övervakad asyncio-runtime för botprocessen.
+
+``BotRuntime`` kör alla långlivade delar (flöden, strategi, orderuppdateringar,
+notifieringar och health) som uppgifter i en och samma event-loop. Varje del
+registreras med ``supervise`` och startas om med exponentiell backoff om den
+kraschar (eller avslutas, om ``restart="always"``). Blockerande arbete
+(ccxt-anrop, SMTP, indikatorberäkning) körs i en begränsad trådpool som även
+blir loopens standard-executor, så ``run_in_executor(None, ...)`` hamnar där.
+
+uvloop används om paketet finns och USE_UVLOOP inte är avstängt.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import signal
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - beror på miljön
+    uvloop = None
+
+# Grupper i start- och (omvänd) stoppordning; "state" (t.ex. checkpoints)
+# stoppas sist, när de andra delarna slutat ändra tillståndet
+GROUPS = ("state", "health", "notifications", "orders", "feeds", "strategy")
+
+RESTART_ON_FAILURE = "on_failure"
+RESTART_ALWAYS = "always"
+RESTART_NEVER = "never"
+
+
+class Component:
+    """Status för en övervakad del (läses av status())."""
+
+    __slots__ = (
+        "name",
+        "group",
+        "factory",
+        "restart",
+        "critical",
+        "state",
+        "restarts",
+        "last_error",
+        "started_at",
+        "task",
+    )
+
+    def __init__(self, name, group, factory, restart, critical):
+        self.name = name
+        self.group = group
+        self.factory = factory
+        self.restart = restart
+        self.critical = critical
+        self.state = "pending"
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class BotRuntime:
+    """
+    Event-loop med övervakade uppgifter och en begränsad executor.
+
+    Args:
+        max_workers: Trådar för blockerande arbete
+        notification_queue_size: Max antal väntande notifieringar
+        backoff: (första, största) väntetid i sekunder före omstart
+        stable_after: Sekunder en del måste ha kört för att backoff nollställs
+        use_uvloop: None = uvloop om det finns installerat
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        notification_queue_size: int = 100,
+        backoff=(1.0, 60.0),
+        stable_after: float = 60.0,
+        use_uvloop: Optional[bool] = None,
+    ):
+        self.max_workers = max_workers
+        self.notification_queue_size = notification_queue_size
+        self.backoff = backoff
+        self.stable_after = stable_after
+        self.use_uvloop = uvloop is not None if use_uvloop is None else use_uvloop
+        self.exit_code = 0
+        self.executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._components: Dict[str, Component] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._notifications: Optional[asyncio.Queue] = None
+
+    # --- Registrering ---
+
+    def supervise(
+        self,
+        name: str,
+        factory: Callable[[], Awaitable],
+        group: str = "feeds",
+        restart: str = RESTART_ON_FAILURE,
+        critical: bool = False,
+    ):
+        """
+        Registrerar en del som körs och övervakas när runtime startar.
+
+        Args:
+            factory: Funktion som returnerar en ny korutin för varje start
+            group: En av GROUPS (styr start- och stoppordning)
+            restart: on_failure, always eller never
+            critical: Misslyckas delen utan omstart stoppas hela processen
+                med exit-kod 1
+        """
+        if group not in GROUPS:
+            raise ValueError(f"Okänd grupp: {group}")
+        if name in self._components:
+            raise ValueError(f"Delen {name} är redan registrerad")
+        self._components[name] = Component(name, group, factory, restart, critical)
+
+    # --- Blockerande arbete och notifieringar ---
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Kör func i runtime-executorn (eller loopens standard-executor)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def notify(self, func, *args) -> bool:
+        """
+        Köar ett blockerande notifieringsanrop (t.ex. e-post) utan att vänta.
+
+        Kan anropas från loopen och från andra trådar. Utanför runtime körs
+        anropet i loopens executor, eller direkt om ingen loop körs.
+
+        Returns:
+            False om notifieringskön var full och anropet släpptes
+        """
+        loop = self._loop
+        if self._notifications is not None and loop is not None:
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                return self._enqueue(func, args)
+            loop.call_soon_threadsafe(self._enqueue, func, args)
+            return True
+        try:
+            future = asyncio.get_running_loop().run_in_executor(None, func, *args)
+        except RuntimeError:
+            func(*args)
+            return True
+        future.add_done_callback(_log_failure)
+        return True
+
+    def _enqueue(self, func, args) -> bool:
+        if self._notifications is None:
+            return False
+        try:
+            self._notifications.put_nowait((func, args))
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Notifieringskön är full, notifiering släpptes")
+            return False
+
+    def notification_depth(self) -> int:
+        return self._notifications.qsize() if self._notifications else 0
+
+    async def _notification_worker(self):
+        while True:
+            func, args = await self._notifications.get()
+            try:
+                await self.run_blocking(func, *args)
+            except Exception as e:
+                logger.error(f"Notifiering misslyckades: {e}")
+
+    # --- Livscykel ---
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "group": c.group,
+                "state": c.state,
+                "restarts": c.restarts,
+                "last_error": c.last_error,
+            }
+            for name, c in self._components.items()
+        }
+
+    def stop(self, exit_code: int = 0):
+        """Begär att runtime avslutas (trådsäkert)."""
+        self.exit_code = max(self.exit_code, exit_code)
+        if self._loop is None or self._stop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        except RuntimeError:  # loopen är redan stängd
+            pass
+
+    def run(self) -> int:
+        """Kör alla registrerade delar tills stop() anropas eller en signal kommer."""
+        if self.use_uvloop and uvloop is not None:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            logger.info("Använder uvloop som event-loop")
+        asyncio.run(self.serve())
+        return self.exit_code
+
+    async def serve(self):
+        """Kör runtime i den aktuella loopen (för anrop inifrån asyncio)."""
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._notifications = asyncio.Queue(self.notification_queue_size)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="bot-worker"
+        )
+        self._loop.set_default_executor(self.executor)
+        self._install_signal_handlers()
+        if "notifications" not in self._components:
+            self.supervise(
+                "notifications", self._notification_worker, group="notifications"
+            )
+        ordered = sorted(self._components.values(), key=lambda c: GROUPS.index(c.group))
+        for component in ordered:
+            component.task = asyncio.create_task(
+                self._supervise(component), name=f"runtime:{component.name}"
+            )
+        try:
+            await self._stop.wait()
+        finally:
+            await self._shutdown(ordered)
+
+    async def _shutdown(self, ordered: List[Component]):
+        logger.info("Stoppar runtime...")
+        for component in reversed(ordered):
+            if component.task is not None and not component.task.done():
+                component.task.cancel()
+                try:
+                    await component.task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            component.state = "stopped"
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._notifications = None
+
+    def _install_signal_handlers(self):
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Windows eller ej huvudtråden: KeyboardInterrupt avslutar ändå
+                pass
+
+    async def _supervise(self, component: Component):
+        delay = self.backoff[0]
+        while True:
+            component.state = "running"
+            component.started_at = time.monotonic()
+            failed = False
+            try:
+                await component.factory()
+                logger.info(f"Runtime: {component.name} avslutades")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failed = True
+                component.last_error = repr(e)
+                logger.error(f"Runtime: {component.name} kraschade: {e!r}")
+            restart = component.restart == RESTART_ALWAYS or (
+                failed and component.restart == RESTART_ON_FAILURE
+            )
+            if not restart:
+                component.state = "failed" if failed else "finished"
+                if failed and component.critical:
+                    logger.critical(
+                        f"Runtime: kritisk del {component.name} misslyckades, avslutar"
+                    )
+                    self.stop(exit_code=1)
+                return
+            if time.monotonic() - component.started_at >= self.stable_after:
+                delay = self.backoff[0]
+            component.state = "backoff"
+            component.restarts += 1
+            logger.info(f"Runtime: startar om {component.name} om {delay:.0f} s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.backoff[1])
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Notifiering misslyckades: {future.exception()}")
+
+
+def default_workers() -> int:
+    """EXECUTOR_WORKERS, annars 4."""
+    return int(os.getenv("EXECUTOR_WORKERS", "4"))
+
+
+def uvloop_setting() -> Optional[bool]:
+    """USE_UVLOOP: "auto" (standard), true eller false."""
+    value = os.getenv("USE_UVLOOP", "auto").lower()
+    if value in ("", "auto"):
+        return None
+    return value in ("true", "1", "yes")
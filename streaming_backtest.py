@@ -0,0 +1,230 @@
+"""
+Blockvis backtest för historik som inte ryms i minnet.
+
+Staplar läses från disk i block av fast storlek. Indikatortillståndet (EMA,
+rullande ATR- och volymfönster, föregående stängningskurs), de senaste
+``lookback`` + 2 staplarna för FVG och motorns positionsstatus följer med
+över blockgränserna, så minnesåtgången beror på blockstorleken och inte på
+historikens längd. Resultatet är detsamma som när hela historiken körs i minnet (calculate_indicators + fvg_signals + simulate).
+
+Filterreferensen ``mean_atr`` är medelvärdet över hela historiken. Den beräknas i
+ett första pass över filen om den inte anges.
+"""
+
+import logging
+import os
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import BacktestEngine, BacktestResult
+from fvg import fvg_signals
+
+logger = logging.getLogger(__name__)
+
+CANDLE_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+# Samma fönster som calculate_indicators
+ATR_PERIOD = 14
+VOLUME_WINDOW = 20
+
+CandleSource = Union[str, os.PathLike, Callable[[], Iterable[pd.DataFrame]]]
+
+
+def iter_csv_candles(path, chunk_size: int = 100_000) -> Iterator[pd.DataFrame]:
+    """
+    Läser en CSV med kolumnerna timestamp (ms), open, high, low, close, volume
+    i block om chunk_size rader, med en UTC-'datetime'-kolumn som i fetch_market_data.
+    """
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        chunk["datetime"] = pd.to_datetime(chunk["timestamp"], unit="ms", utc=True)
+        yield chunk
+
+
+def _chunks(source: CandleSource, chunk_size: int) -> Iterator[pd.DataFrame]:
+    if callable(source):
+        return iter(source())
+    return iter_csv_candles(source, chunk_size)
+
+
+class _RollingMean:
+    """Rullande medelvärde (min_periods=1) som behåller window-1 värden mellan block."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._tail = np.empty(0)
+
+    def update(self, values: np.ndarray) -> np.ndarray:
+        joined = np.concatenate([self._tail, values])
+        means = pd.Series(joined).rolling(self.window, min_periods=1).mean()
+        keep = self.window - 1
+        self._tail = joined[-keep:] if keep else joined[:0]
+        start = len(joined) - len(values)
+        return means.to_numpy()[start:]
+
+
+class IndicatorState:
+    """
+    Inkrementell variant av de indikatorer som FVG-signalerna använder.
+
+    Ger samma ema/atr/avg_volume/high_volume/within_trading_hours som
+    calculate_indicators på hela serien, men ett block i taget.
+
+    Args:
+        ema_length: Period för EMA (talib-kompatibel: SMA som startvärde)
+        volume_multiplier: Faktor för högvolymsfiltret
+        trading_start_hour: Första tillåtna timme
+        trading_end_hour: Sista tillåtna timme
+    """
+
+    def __init__(
+        self, ema_length, volume_multiplier, trading_start_hour, trading_end_hour
+    ):
+        self.ema_length = ema_length
+        self.volume_multiplier = volume_multiplier
+        self.trading_start_hour = trading_start_hour
+        self.trading_end_hour = trading_end_hour
+        self._ema_k = 2.0 / (ema_length + 1)
+        self._ema_seed = []
+        self._ema = None
+        self._prev_close = np.nan
+        self._atr = _RollingMean(ATR_PERIOD)
+        self._avg_volume = _RollingMean(VOLUME_WINDOW)
+
+    def _update_ema(self, close: np.ndarray) -> np.ndarray:
+        out = np.full(len(close), np.nan)
+        k = self._ema_k
+        prev = self._ema
+        for i, value in enumerate(close.tolist()):
+            if prev is None:
+                self._ema_seed.append(value)
+                if len(self._ema_seed) < self.ema_length:
+                    continue
+                # Samma summeringsordning som talib
+                total = 0.0
+                for seed in self._ema_seed:
+                    total += seed
+                prev = total / self.ema_length
+                self._ema_seed = []
+            else:
+                prev = ((value - prev) * k) + prev
+            out[i] = prev
+        self._ema = prev
+        return out
+
+    def update_atr(self, high, low, close) -> np.ndarray:
+        """ATR för ett block (används ensam i första passet för mean_atr)."""
+        prev_close = np.r_[self._prev_close, close[:-1]]
+        # Som pandas max(axis=1): NaN (första raden) ignoreras
+        tr = np.fmax(
+            high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close))
+        )
+        if len(close):
+            self._prev_close = close[-1]
+        return self._atr.update(tr)
+
+    def update(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Returnerar blocket med indikatorkolumner tillagda."""
+        data = chunk.copy()
+        for col in ["close", "high", "low", "volume"]:
+            data[col] = data[col].astype(float)
+        close = data["close"].to_numpy()
+        data["ema"] = self._update_ema(close)
+        data["atr"] = self.update_atr(
+            data["high"].to_numpy(), data["low"].to_numpy(), close
+        )
+        data["avg_volume"] = self._avg_volume.update(data["volume"].to_numpy())
+        data["high_volume"] = (
+            data["volume"] > data["avg_volume"] * self.volume_multiplier
+        )
+        data["hour"] = data["datetime"].dt.hour
+        data["within_trading_hours"] = data["hour"].between(
+            self.trading_start_hour, self.trading_end_hour
+        )
+        return data
+
+
+def compute_mean_atr(source: CandleSource, chunk_size: int = 100_000) -> float:
+    """Första passet: medel-ATR över hela historiken utan att läsa in den i minnet."""
+    state = IndicatorState(1, 1.0, 0, 23)
+    total, count = 0.0, 0
+    for chunk in _chunks(source, chunk_size):
+        atr = state.update_atr(
+            chunk["high"].to_numpy(dtype=float),
+            chunk["low"].to_numpy(dtype=float),
+            chunk["close"].to_numpy(dtype=float),
+        )
+        finite = atr[np.isfinite(atr)]
+        total += float(finite.sum())
+        count += len(finite)
+    return total / count if count else 0.0
+
+
+def streaming_backtest(
+    source: CandleSource,
+    ema_length: int,
+    volume_multiplier: float,
+    atr_multiplier: float,
+    lookback: int = 100,
+    trading_start_hour: int = 0,
+    trading_end_hour: int = 23,
+    chunk_size: int = 100_000,
+    mean_atr: Optional[float] = None,
+    keep_curves: bool = False,
+    **engine_params,
+) -> BacktestResult:
+    """
+    Kör FVG-backtesten blockvis över en historik på disk.
+
+    Args:
+        source: Sökväg till CSV (se iter_csv_candles) eller funktion som returnerar
+            en ny iterator av OHLCV-DataFrames vid varje anrop
+        chunk_size: Antal staplar per block
+        mean_atr: Referens-ATR för filtret; beräknas i ett första pass om None
+        keep_curves: Spara equity/position per stapel (växer med historiken)
+        engine_params: Argument till BacktestEngine (SL/TP, avgifter, dagsgränser)
+
+    Returns:
+        BacktestResult: Samma resultat som motsvarande körning i minnet
+    """
+    if mean_atr is None:
+        mean_atr = compute_mean_atr(source, chunk_size)
+    state = IndicatorState(
+        ema_length, volume_multiplier, trading_start_hour, trading_end_hour
+    )
+    engine = BacktestEngine(keep_curves=keep_curves, **engine_params)
+    previous = None
+    chunks = 0
+    for chunk in _chunks(source, chunk_size):
+        if chunk.empty:
+            continue
+        data = state.update(chunk)
+        # Öppna FVG på blockets första rader kan ha bildats upp till lookback + 2
+        # staplar tidigare; de staplarna följer med från föregående block
+        if previous is None:
+            framed = data
+            long_signal, short_signal = fvg_signals(
+                data, atr_multiplier, lookback, mean_atr=mean_atr
+            )
+        else:
+            framed = pd.concat([previous, data], ignore_index=True)
+            long_signal, short_signal = fvg_signals(
+                framed, atr_multiplier, lookback, mean_atr=mean_atr
+            )
+            carried = len(previous)
+            long_signal, short_signal = long_signal[carried:], short_signal[carried:]
+        engine.run(
+            data["datetime"].to_numpy(dtype="datetime64[ms]").astype(np.int64),
+            data["open"].to_numpy(dtype=float),
+            data["high"].to_numpy(dtype=float),
+            data["low"].to_numpy(dtype=float),
+            data["close"].to_numpy(dtype=float),
+            long_signal,
+            short_signal,
+        )
+        history = -(lookback + 2)
+        previous = framed.iloc[history:].copy()
+        chunks += 1
+    logger.info(f"[STREAMING] {chunks} block bearbetade")
+    return engine.finish()
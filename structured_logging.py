@@ -0,0 +1,277 @@
+"""
+Strukturerad, färgkodad loggning med snabb väg för avstängda nivåer.
+
+``StructuredLogger`` kontrollerar ``isEnabledFor`` innan något formateras och tar
+lata argument (``log.debug("rad %s: %s", index, row)`` eller en funktion som
+returnerar meddelandet). Kategorin skickas med posten; tidsstämpel, prefix och
+färg läggs på först av formatteraren.
+
+``setup_logging`` kopplar loggern till en ``QueueHandler``: handelstråden lägger
+bara posten på en kö och en bakgrundstråd (``QueueListener``) formaterar och
+skriver till konsol och fil, så loggning blockerar aldrig på I/O.
+"""
+
+import atexit
+import logging
+import os
+import logging.handlers
+import queue
+from typing import Optional
+
+try:
+    from pythonjsonlogger.json import JsonFormatter
+except ImportError:  # pragma: no cover - beror på miljön
+    JsonFormatter = None
+
+
+class TerminalColors:
+    """ANSI-färgkoder för terminalfärgning"""
+
+    RESET = "\033[0m"
+    BOLD = "\033[1m"
+    UNDERLINE = "\033[4m"
+    # Text färger
+    BLACK = "\033[30m"
+    RED = "\033[31m"
+    GREEN = "\033[32m"
+    YELLOW = "\033[33m"
+    BLUE = "\033[34m"
+    MAGENTA = "\033[35m"
+    CYAN = "\033[36m"
+    WHITE = "\033[37m"
+    # Ljusa färger
+    LIGHT_RED = "\033[91m"
+    LIGHT_GREEN = "\033[92m"
+    LIGHT_YELLOW = "\033[93m"
+    LIGHT_BLUE = "\033[94m"
+    LIGHT_MAGENTA = "\033[95m"
+    LIGHT_CYAN = "\033[96m"
+    LIGHT_WHITE = "\033[97m"
+    # Bakgrund
+    BG_BLACK = "\033[40m"
+    BG_RED = "\033[41m"
+    BG_GREEN = "\033[42m"
+    BG_YELLOW = "\033[43m"
+    BG_BLUE = "\033[44m"
+    BG_MAGENTA = "\033[45m"
+    BG_CYAN = "\033[46m"
+    BG_WHITE = "\033[47m"
+
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+# Färg per kategori; övriga kategorier färgas efter nivå
+CATEGORY_COLORS = {
+    "TRADE": TerminalColors.MAGENTA,
+    "ORDER": TerminalColors.LIGHT_BLUE,
+    "MARKET": TerminalColors.BLUE,
+    "STRATEGY": TerminalColors.LIGHT_CYAN,
+    "WEBSOCKET": TerminalColors.LIGHT_MAGENTA,
+    "NOTIFY": TerminalColors.LIGHT_GREEN,
+    # Separatorer
+    "": TerminalColors.BLUE,
+}
+LEVEL_COLORS = {
+    logging.DEBUG: TerminalColors.CYAN,
+    logging.INFO: TerminalColors.GREEN,
+    logging.WARNING: TerminalColors.YELLOW,
+    logging.ERROR: TerminalColors.RED,
+    logging.CRITICAL: TerminalColors.LIGHT_RED,
+}
+# Posten hamnar i anroparens funktion/rad, inte i StructuredLogger
+_STACKLEVEL = 3
+
+
+class StructuredLogger:
+    """
+    Wrapper över Python logger för att ge strukturerade, färgkodade meddelanden.
+
+    Meddelandet formateras bara om nivån är aktiv. Extra positionella argument
+    används som %-argument (som i logging) och ett anropbart meddelande anropas
+    först när posten faktiskt loggas.
+
+    Args:
+        logger_instance: Loggern som posterna skickas till
+        use_colors: ANSI-färger i konsolen; None läser USE_COLORS
+        level: Lognivå att sätta på loggern; None läser LOG_LEVEL (standard INFO)
+    """
+
+    def __init__(
+        self,
+        logger_instance,
+        use_colors: Optional[bool] = None,
+        level: Optional[str] = None,
+    ):
+        self.logger = logger_instance
+        # Läs miljövariabeln för att avgöra om färgad output ska användas
+        if use_colors is None:
+            use_colors = os.getenv("USE_COLORS", "true").lower() in (
+                "true",
+                "1",
+                "yes",
+            )
+        self.use_colors = use_colors
+        # Läs lognivå från miljövariabel eller defaulta till INFO
+        self.log_level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+        self.logger.setLevel(getattr(logging, self.log_level))
+
+    def isEnabledFor(self, level) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level, category, message, args):
+        if not self.logger.isEnabledFor(level):
+            return
+        if callable(message):
+            message = message()
+        self.logger.log(
+            level, message, *args, extra={"category": category}, stacklevel=_STACKLEVEL
+        )
+
+    def debug(self, message, *args, category="DEBUG"):
+        """Logga debug-meddelande"""
+        self._log(logging.DEBUG, category, message, args)
+
+    def info(self, message, *args, category="INFO"):
+        """Logga info-meddelande"""
+        self._log(logging.INFO, category, message, args)
+
+    def warning(self, message, *args, category="WARNING"):
+        """Logga varnings-meddelande"""
+        self._log(logging.WARNING, category, message, args)
+
+    def error(self, message, *args, category="ERROR"):
+        """Logga felmeddelande"""
+        self._log(logging.ERROR, category, message, args)
+
+    def critical(self, message, *args, category="CRITICAL"):
+        """Logga kritiskt meddelande"""
+        self._log(logging.CRITICAL, category, message, args)
+
+    def trade(self, message, *args):
+        """Logga ett handelsrelaterat meddelande"""
+        self._log(logging.INFO, "TRADE", message, args)
+
+    def order(self, message, *args):
+        """Logga ett orderrelaterat meddelande"""
+        self._log(logging.INFO, "ORDER", message, args)
+
+    def market(self, message, *args):
+        """Logga ett marknadsrelaterat meddelande"""
+        self._log(logging.INFO, "MARKET", message, args)
+
+    def strategy(self, message, *args):
+        """Logga ett strategirelaterat meddelande"""
+        self._log(logging.INFO, "STRATEGY", message, args)
+
+    def websocket(self, message, *args):
+        """Logga ett websocket-relaterat meddelande"""
+        self._log(logging.INFO, "WEBSOCKET", message, args)
+
+    def notification(self, message, *args):
+        """Logga ett notifikationsrelaterat meddelande"""
+        self._log(logging.INFO, "NOTIFY", message, args)
+
+    def separator(self, char="-", length=80):
+        """Skriv en separator i loggen"""
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(char * length, extra={"category": ""}, stacklevel=2)
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Konsolformat ``HH:MM:SS [KATEGORI] meddelande``, färgat om use_colors.
+
+    Poster utan kategori (från vanliga logging-anrop) får nivån som kategori;
+    separatorer (tom kategori) skrivs utan prefix.
+    """
+
+    def __init__(self, use_colors: bool = True):
+        super().__init__(datefmt="%H:%M:%S")
+        self.use_colors = use_colors
+
+    def format(self, record):
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            message = f"{message}\n{record.exc_text}"
+        category = getattr(record, "category", record.levelname)
+        color = None
+        if self.use_colors:
+            color = CATEGORY_COLORS.get(category) or LEVEL_COLORS.get(record.levelno)
+        if not category:
+            if color:
+                return f"{color}{message}{TerminalColors.RESET}"
+            return message
+        timestamp = self.formatTime(record, self.datefmt)
+        category_str = f"[{category}]".ljust(12)
+        if color:
+            return (
+                f"{color}{timestamp} {TerminalColors.BOLD}{category_str}"
+                f"{TerminalColors.RESET}{color} {message}{TerminalColors.RESET}"
+            )
+        return f"{timestamp} {category_str} {message}"
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler som släpper poster (och räknar dem) när kön är full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(
+    logger: logging.Logger,
+    log_file: Optional[str] = "tradingbot.log",
+    use_json: bool = True,
+    use_colors: bool = False,
+    queue_size: int = 100_000,
+) -> logging.handlers.QueueListener:
+    """
+    Kopplar loggern till en kö och startar en bakgrundstråd som skriver posterna.
+
+    Args:
+        logger: Loggern (normalt rotloggern) som ska skriva via kön
+        log_file: Fil för alla poster (DEBUG och uppåt); None för ingen fil
+        use_json: JSON-rader i konsolen om python-json-logger finns
+        use_colors: Färgad konsolutskrift när JSON inte används
+        queue_size: Max antal väntande poster; fler släpps hellre än att blockera
+
+    Returns:
+        QueueListener: Stoppas (och töms) automatiskt vid programslut
+    """
+    if JsonFormatter and use_json:
+        console = logging.StreamHandler()
+        console.setFormatter(JsonFormatter(LOG_FORMAT))
+    else:
+        console = logging.StreamHandler()
+        console.setFormatter(StructuredFormatter(use_colors))
+    handlers = [console]
+    if log_file:
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener):
+    # QueueListener.stop() tål inte att anropas två gånger (3.11)
+    if listener._thread is not None:
+        listener.stop()
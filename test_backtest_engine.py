@@ -0,0 +1,181 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_engine import (  # noqa: E402
+    EXIT_OPEN,
+    EXIT_STOP_LOSS,
+    EXIT_TAKE_PROFIT,
+    BacktestEngine,
+    simulate,
+    simulate_ticks,
+)
+
+
+def bars(rows):
+    """rows: lista med (open, high, low, close) -> arrayer med minut-tidsstämplar."""
+    arr = np.asarray(rows, dtype=float)
+    ts = np.arange(len(arr), dtype=np.int64) * 60_000
+    return ts, arr[:, 0], arr[:, 1], arr[:, 2], arr[:, 3]
+
+
+def signal(n, *indices):
+    out = np.zeros(n, dtype=bool)
+    out[list(indices)] = True
+    return out
+
+
+def test_long_take_profit_with_fees():
+    ts, o, h, lo, c = bars(
+        [(100, 100, 100, 100), (100, 101, 99, 100), (100, 105, 99, 104)]
+    )
+    result = simulate(
+        ts,
+        o,
+        h,
+        lo,
+        c,
+        signal(3, 0),
+        signal(3),
+        stop_loss_pct=2,
+        take_profit_pct=4,
+        amount=1.0,
+        maker_fee=0.001,
+        taker_fee=0.002,
+    )
+    trades = result.trades
+    assert trades["exit_reason"][0] == EXIT_TAKE_PROFIT
+    assert trades["exit_price"][0] == pytest.approx(104.0)
+    assert trades["fees"][0] == pytest.approx(100 * 0.001 + 104 * 0.001)
+    assert trades["pnl"][0] == pytest.approx(4.0 - 0.204)
+    assert result.equity[-1] == pytest.approx(10_000 + 4.0 - 0.204)
+
+
+@pytest.mark.parametrize(
+    "rule, reason, price",
+    [
+        ("stop_first", EXIT_STOP_LOSS, 98.0),
+        ("take_profit_first", EXIT_TAKE_PROFIT, 104.0),
+        ("open_proximity", EXIT_TAKE_PROFIT, 104.0),
+    ],
+)
+def test_intrabar_rules_when_both_levels_hit(rule, reason, price):
+    # Öppning 103.5 ligger närmare TP (104) än SL (98)
+    ts, o, h, lo, c = bars([(100, 100, 100, 100), (103.5, 105, 97, 100)])
+    result = simulate(
+        ts,
+        o,
+        h,
+        lo,
+        c,
+        signal(2, 0),
+        signal(2),
+        amount=1.0,
+        intrabar=rule,
+        stop_loss_pct=2,
+        take_profit_pct=4,
+    )
+    assert result.trades["exit_reason"][0] == reason
+    assert result.trades["exit_price"][0] == pytest.approx(price)
+
+
+def test_short_gap_through_stop_fills_at_open():
+    ts, o, h, lo, c = bars([(100, 100, 100, 100), (110, 111, 109, 110)])
+    result = simulate(
+        ts,
+        o,
+        h,
+        lo,
+        c,
+        signal(2),
+        signal(2, 0),
+        amount=1.0,
+        stop_loss_pct=2,
+        take_profit_pct=4,
+        taker_fee=0.0,
+        maker_fee=0.0,
+    )
+    assert result.trades["exit_reason"][0] == EXIT_STOP_LOSS
+    assert result.trades["exit_price"][0] == pytest.approx(110.0)
+    assert result.trades["pnl"][0] == pytest.approx(-10.0)
+
+
+def test_open_position_marked_to_market_at_end():
+    ts, o, h, lo, c = bars([(100, 100, 100, 100), (100, 101, 99.5, 101)])
+    result = simulate(
+        ts,
+        o,
+        h,
+        lo,
+        c,
+        signal(2, 0),
+        signal(2),
+        amount=1.0,
+        maker_fee=0.0,
+        stop_loss_pct=2,
+        take_profit_pct=4,
+    )
+    assert result.trades["exit_reason"][0] == EXIT_OPEN
+    assert result.stats["open_trades"] == 1
+    assert result.position[-1] == pytest.approx(1.0)
+    assert result.equity[-1] == pytest.approx(10_001.0)
+
+
+def test_max_trades_per_day_limits_entries():
+    ts, o, h, lo, c = bars([(100, 100, 100, 100)] * 10)
+    result = simulate(
+        ts, o, h, lo, c, np.ones(10, dtype=bool), signal(10), max_trades_per_day=3
+    )
+    assert len(result.trades["side"]) == 3
+
+
+def test_tick_replay():
+    prices = [100, 101, 99, 104.5, 103]
+    result = simulate_ticks(
+        np.arange(5) * 1000,
+        prices,
+        signal(5, 0),
+        signal(5),
+        stop_loss_pct=2,
+        take_profit_pct=4,
+        amount=1.0,
+    )
+    assert result.trades["exit_reason"][0] == EXIT_TAKE_PROFIT
+    assert result.trades["exit_index"][0] == 3
+
+
+def test_chunked_run_matches_single_pass():
+    rng = np.random.default_rng(7)
+    n = 20_000
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * 1.001
+    low = np.minimum(open_, close) * 0.999
+    ts = np.arange(n, dtype=np.int64) * 60_000
+    longs = rng.random(n) < 0.01
+    shorts = rng.random(n) < 0.01
+    params = dict(stop_loss_pct=0.5, take_profit_pct=0.5, max_trades_per_day=50)
+
+    single = simulate(ts, open_, high, low, close, longs, shorts, **params)
+    engine = BacktestEngine(**params)
+    for start in range(0, n, 1_337):
+        sl = slice(start, start + 1_337)
+        engine.run(
+            ts[sl], open_[sl], high[sl], low[sl], close[sl], longs[sl], shorts[sl]
+        )
+    chunked = engine.finish()
+
+    for name, column in single.trades.items():
+        np.testing.assert_array_equal(column, chunked.trades[name])
+    np.testing.assert_allclose(single.equity, chunked.equity)
+    assert single.stats["trades"] == chunked.stats["trades"]
+
+
+def test_unknown_intrabar_rule_raises():
+    with pytest.raises(ValueError):
+        BacktestEngine(intrabar="random")
@@ -0,0 +1,101 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from candles import CandleArray, CandleBuffer, compute_indicators  # noqa: E402
+from fvg import fvg_signals  # noqa: E402
+from indicators import calculate_indicators  # noqa: E402
+
+
+@pytest.fixture
+def ohlcv():
+    rng = np.random.default_rng(5)
+    n = 2_000
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 2e-3, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * 1.002
+    low = np.minimum(open_, close) * 0.998
+    outside = rng.random(n) < 0.1
+    low[outside] = close[outside] * 1.001
+    volume = rng.uniform(1, 10, n)
+    volume[outside] *= 5
+    timestamps = 1_700_000_000_000 + np.arange(n) * 60_000
+    return np.c_[timestamps, open_, high, low, close, volume].tolist()
+
+
+def frame_from(ohlcv):
+    # Samma konstruktion som fetch_market_data
+    df = pd.DataFrame(
+        ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"]
+    )
+    df["timestamp"] = df["timestamp"].astype("int64")
+    df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
+    return df.set_index("timestamp")
+
+
+def test_float64_matches_calculate_indicators(ohlcv):
+    expected = calculate_indicators(frame_from(ohlcv), 10, 1.5, 3, 20)
+    candles = compute_indicators(CandleArray.from_ohlcv(ohlcv), 10, 1.5, 3, 20)
+    frame = candles.to_frame()
+    assert list(frame.columns) == list(expected.columns)
+    for column in ["ema", "atr", "avg_volume", "rsi", "adx"]:
+        np.testing.assert_allclose(frame[column], expected[column], rtol=1e-12)
+    for column in ["high_volume", "within_trading_hours", "hour"]:
+        np.testing.assert_array_equal(frame[column], expected[column])
+    for ours, theirs in zip(fvg_signals(candles, 0.5), fvg_signals(expected, 0.5)):
+        np.testing.assert_array_equal(ours, theirs)
+
+
+def test_float32_halves_memory_and_keeps_signals(ohlcv):
+    wide = compute_indicators(CandleArray.from_ohlcv(ohlcv), 10, 1.5, 0, 23)
+    compact = compute_indicators(
+        CandleArray.from_ohlcv(ohlcv, dtype=np.float32), 10, 1.5, 0, 23
+    )
+    assert compact["ema"].dtype == np.float32
+    assert compact.nbytes < 0.6 * wide.nbytes
+    np.testing.assert_allclose(compact["ema"], wide["ema"], rtol=1e-6)
+    assert compact.flags.dtype == np.uint8
+
+
+def test_slices_are_views_with_independent_flags(ohlcv):
+    candles = CandleArray.from_ohlcv(ohlcv)
+    part = candles[100:200]
+    assert len(part) == 100
+    assert np.shares_memory(part.close, candles.close)
+    compute_indicators(part, 10, 1.5, 0, 23)
+    assert "ema" not in candles.indicators
+    assert not candles["within_trading_hours"].any()
+    assert part["within_trading_hours"].all()
+
+
+def test_from_frame_round_trip(ohlcv):
+    frame = frame_from(ohlcv)
+    candles = CandleArray.from_frame(frame)
+    np.testing.assert_array_equal(candles.timestamps, frame.index.to_numpy())
+    pd.testing.assert_frame_equal(candles.to_frame(), frame, check_freq=False)
+
+
+def test_candle_buffer_merges_gap_and_keeps_capacity(ohlcv):
+    buffer = CandleBuffer(capacity=100)
+    assert buffer.merge(CandleArray.from_ohlcv(ohlcv[:80])) == 80
+    # Gapet hämtas från senaste stapeln (som kan ha ändrats) och framåt
+    revised = [list(row) for row in ohlcv[79:130]]
+    revised[0][4] = 1.0
+    assert buffer.merge(CandleArray.from_ohlcv(revised)) == 50
+    assert len(buffer) == 100
+    assert buffer.last_timestamp == int(ohlcv[129][0])
+    assert buffer.candles.close[-51] == 1.0
+    np.testing.assert_array_equal(
+        np.diff(buffer.candles.timestamps), np.full(99, 60_000)
+    )
+
+    restored = CandleBuffer(capacity=100)
+    restored.restore(buffer.snapshot())
+    np.testing.assert_array_equal(restored.candles.close, buffer.candles.close)
+    assert restored.last_timestamp == buffer.last_timestamp
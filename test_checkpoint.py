@@ -0,0 +1,102 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from checkpoint import (  # noqa: E402
+    CheckpointError,
+    Checkpointer,
+    read_checkpoint,
+    write_checkpoint,
+)
+
+
+def test_roundtrip_keeps_state_and_arrays(tmp_path):
+    path = str(tmp_path / "bot.ckpt")
+    ts = np.arange(5, dtype=np.int64) * 60_000
+    close = np.linspace(100, 104, 5, dtype=np.float32)
+    write_checkpoint(
+        path,
+        {
+            "candles": ({"symbol": "BTC/USD"}, {"timestamp": ts, "close": close}),
+            "risk": ({"trades": 2}, {}),
+        },
+    )
+    _, sections = read_checkpoint(path)
+    state, arrays = sections["candles"]
+    assert state == {"symbol": "BTC/USD"}
+    np.testing.assert_array_equal(arrays["timestamp"], ts)
+    assert arrays["close"].dtype == np.float32
+    np.testing.assert_array_equal(arrays["close"], close)
+    assert sections["risk"] == ({"trades": 2}, {})
+    # Binärt: arrayerna lagras som råa byte, inte som JSON-listor
+    assert os.path.getsize(path) < 400
+
+
+def test_truncated_or_foreign_file_is_rejected(tmp_path):
+    path = str(tmp_path / "bot.ckpt")
+    write_checkpoint(path, {"a": ({}, {"x": np.arange(1000.0)})})
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-100])
+    with pytest.raises(CheckpointError):
+        read_checkpoint(path)
+    with open(path, "wb") as f:
+        f.write(b"not a checkpoint")
+    with pytest.raises(CheckpointError):
+        read_checkpoint(path)
+
+
+def test_checkpointer_restores_registered_sections(tmp_path):
+    path = str(tmp_path / "bot.ckpt")
+    state = {"counter": 3, "values": np.arange(4.0)}
+    restored = {}
+
+    saver = Checkpointer(path)
+    saver.register(
+        "counter", lambda: ({"n": state["counter"]}, {"v": state["values"]}), None
+    )
+    assert saver.save()
+    assert saver.age() is not None
+
+    loader = Checkpointer(path)
+    loader.register("counter", None, lambda s, a: restored.update(n=s["n"], v=a["v"]))
+    loader.register("unused", None, lambda s, a: restored.update(unused=True))
+    assert loader.restore() == {"counter": True}
+    assert restored["n"] == 3
+    np.testing.assert_array_equal(restored["v"], np.arange(4.0))
+
+
+def test_restore_ignores_missing_corrupt_and_old(tmp_path):
+    path = str(tmp_path / "bot.ckpt")
+    checkpointer = Checkpointer(path, max_age=60)
+    checkpointer.register("x", lambda: ({}, {}), lambda s, a: None)
+    assert checkpointer.restore() == {}
+    with open(path, "wb") as f:
+        f.write(b"garbage")
+    assert checkpointer.restore() == {}
+    checkpointer.save()
+    checkpointer.max_age = -1
+    assert checkpointer.restore() == {}
+
+
+def test_run_saves_when_cancelled(tmp_path):
+    path = str(tmp_path / "bot.ckpt")
+    checkpointer = Checkpointer(path, interval=3600)
+    checkpointer.register("x", lambda: ({"saved": True}, {}), lambda s, a: None)
+
+    async def run():
+        task = asyncio.create_task(checkpointer.run())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert read_checkpoint(path)[1]["x"][0] == {"saved": True}
@@ -0,0 +1,140 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from coalescing import CoalescingExchange, SingleFlight  # noqa: E402
+
+
+class SlowExchange:
+    id = "bitfinex"
+    has = {"fetchTickers": True}
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", limit=100, params=None):
+        self.calls.append(("fetch_ohlcv", symbol, timeframe, limit))
+        time.sleep(self.delay)
+        return [[0, 1, 2, 0.5, 1.5, 10]] * limit
+
+    def fetch_open_orders(self, symbol=None):
+        self.calls.append(("fetch_open_orders", symbol))
+        time.sleep(self.delay)
+        raise RuntimeError("börsen svarar inte")
+
+    def fetch_ticker(self, symbol):
+        self.calls.append(("fetch_ticker", symbol))
+        return {"symbol": symbol, "last": 1.0}
+
+    def fetch_tickers(self, symbols=None):
+        self.calls.append(("fetch_tickers", tuple(symbols)))
+        time.sleep(self.delay)
+        # Okända symboler saknas i svaret, som hos ccxt
+        return {s: {"symbol": s, "last": 2.0} for s in symbols if s != "tUNKNOWN"}
+
+    def create_order(self, *args):
+        self.calls.append(("create_order",) + args)
+        return {"id": len(self.calls)}
+
+
+def run_concurrently(func, args_list):
+    results = [None] * len(args_list)
+    errors = [None] * len(args_list)
+
+    def worker(i, args):
+        try:
+            results[i] = func(*args)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [
+        threading.Thread(target=worker, args=(i, args))
+        for i, args in enumerate(args_list)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_identical_concurrent_reads_share_one_call():
+    upstream = SlowExchange()
+    exchange = CoalescingExchange(upstream, batch_window=0)
+    results, errors = run_concurrently(
+        exchange.fetch_ohlcv, [("tBTCUSD", "1m", 5)] * 8 + [("tETHUSD", "1m", 5)]
+    )
+    assert errors == [None] * 9
+    assert all(r is results[0] for r in results[:8])
+    assert sorted(c[1] for c in upstream.calls) == ["tBTCUSD", "tETHUSD"]
+
+    # Efter anropet cachas inget: nästa läsning går till börsen igen
+    exchange.fetch_ohlcv("tBTCUSD", "1m", 5)
+    assert len(upstream.calls) == 3
+
+
+def test_errors_are_fanned_out_and_writes_pass_through():
+    upstream = SlowExchange()
+    exchange = CoalescingExchange(upstream)
+    _, errors = run_concurrently(exchange.fetch_open_orders, [("tBTCUSD",)] * 4)
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert len(upstream.calls) == 1
+
+    exchange.create_order("tBTCUSD", "limit", "buy", 1, 1)
+    exchange.create_order("tBTCUSD", "limit", "buy", 1, 1)
+    assert [c[0] for c in upstream.calls].count("create_order") == 2
+    assert exchange.id == "bitfinex"
+
+
+def test_tickers_for_different_symbols_are_batched():
+    upstream = SlowExchange()
+    exchange = CoalescingExchange(upstream, batch_window=0.05)
+    symbols = ["tBTCUSD", "tETHUSD", "tBTCUSD", "tUNKNOWN"]
+    results, errors = run_concurrently(exchange.fetch_ticker, [(s,) for s in symbols])
+    assert errors == [None] * 4
+    assert [r["symbol"] for r in results] == symbols
+    batches = [c for c in upstream.calls if c[0] == "fetch_tickers"]
+    assert len(batches) == 1
+    assert sorted(batches[0][1]) == ["tBTCUSD", "tETHUSD", "tUNKNOWN"]
+    # Symbolen som saknades i svaret hämtades för sig
+    assert ("fetch_ticker", "tUNKNOWN") in upstream.calls
+
+    upstream.calls.clear()
+    assert exchange.fetch_ticker("tBTCUSD")["last"] == 1.0
+    assert upstream.calls == [("fetch_ticker", "tBTCUSD")]
+
+
+def test_solo_ticker_calls_skip_the_batch_window():
+    upstream = SlowExchange()
+    exchange = CoalescingExchange(upstream, batch_window=0.5)
+    # Första fönstret väntar (samtidighet antas tills ett ensamt anrop setts)
+    exchange.fetch_ticker("tBTCUSD")
+    started = time.perf_counter()
+    for _ in range(5):
+        exchange.fetch_ticker("tETHUSD")
+    assert time.perf_counter() - started < 0.25
+    assert upstream.calls[-1] == ("fetch_ticker", "tETHUSD")
+
+
+def test_monkeypatched_methods_are_used():
+    upstream = SlowExchange()
+    exchange = CoalescingExchange(upstream, batch_window=0)
+    exchange.fetch_ohlcv = lambda *args, **kwargs: "patchad"
+    assert exchange.fetch_ohlcv("tBTCUSD") == "patchad"
+    original = exchange.fetch_open_orders
+    exchange.fetch_open_orders = original
+    assert upstream.fetch_open_orders.__func__ is SlowExchange.fetch_open_orders
+
+
+def test_single_flight_leader_error_does_not_leak_state():
+    flight = SingleFlight()
+    with pytest.raises(ZeroDivisionError):
+        flight.do("k", lambda: 1 / 0)
+    assert flight.do("k", lambda: 42) == 42
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from candles import CandleArray, compute_indicators  # noqa: E402
+from compute_pool import ComputePool, SignalParams, compute_signals  # noqa: E402
+from fvg import fvg_signals  # noqa: E402
+
+PARAMS = SignalParams(20, 1.5, 0, 23, 1.0, 5)
+
+
+def make_candles(n, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 2e-3, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * 1.002
+    low = np.minimum(open_, close) * 0.998
+    volume = rng.uniform(1, 10, n)
+    timestamps = 1_700_000_000_000 + np.arange(n) * 60_000
+    return CandleArray(timestamps, open_, high, low, close, volume)
+
+
+def expected(candles):
+    reference = compute_indicators(
+        candles[:], *PARAMS[:4]
+    )  # skiva: originalet lämnas orört
+    return reference, fvg_signals(reference, PARAMS.atr_multiplier, PARAMS.lookback)
+
+
+@pytest.fixture
+def pool():
+    pool = ComputePool(processes=2).start()
+    yield pool
+    pool.close()
+
+
+def test_process_pool_matches_inline(pool):
+    candles = make_candles(1_000)
+    reference, (long_ref, short_ref) = expected(candles)
+    result = asyncio.run(pool.compute("BTC/USD", candles, PARAMS))
+    for name in ("ema", "atr", "avg_volume", "rsi", "adx"):
+        np.testing.assert_array_equal(
+            result.candles[name], reference[name], err_msg=name
+        )
+    np.testing.assert_array_equal(result.candles.flags, reference.flags)
+    np.testing.assert_array_equal(result.long_signal, long_ref)
+    np.testing.assert_array_equal(result.short_signal, short_ref)
+    assert result.long_signal.dtype == bool
+
+
+def test_block_is_reused_and_grows(pool):
+    async def run():
+        first = await pool.compute("BTC/USD", make_candles(100), PARAMS)
+        name = pool._blocks["BTC/USD"].shm.name
+        again = await pool.compute("BTC/USD", make_candles(120, seed=4), PARAMS)
+        assert pool._blocks["BTC/USD"].shm.name == name
+        bigger = await pool.compute("BTC/USD", make_candles(5_000), PARAMS)
+        assert pool._blocks["BTC/USD"].shm.name != name
+        return first, again, bigger
+
+    first, again, bigger = asyncio.run(run())
+    assert (len(first.candles), len(again.candles), len(bigger.candles)) == (
+        100,
+        120,
+        5_000,
+    )
+    np.testing.assert_array_equal(
+        again.candles["ema"], expected(make_candles(120, seed=4))[0]["ema"]
+    )
+
+
+def test_symbols_run_concurrently(pool):
+    symbols = {f"S{i}": make_candles(500, seed=i) for i in range(4)}
+
+    async def run():
+        results = await asyncio.gather(
+            *(pool.compute(s, c, PARAMS) for s, c in symbols.items())
+        )
+        return dict(zip(symbols, results))
+
+    results = asyncio.run(run())
+    for symbol, candles in symbols.items():
+        np.testing.assert_array_equal(
+            results[symbol].long_signal, expected(candles)[1][0]
+        )
+
+
+def test_close_unlinks_shared_memory(pool):
+    from multiprocessing import shared_memory
+
+    asyncio.run(pool.compute("BTC/USD", make_candles(50), PARAMS))
+    name = pool._blocks["BTC/USD"].shm.name
+    pool.close()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_inline_mode_uses_thread_pool():
+    candles = make_candles(300)
+    result = asyncio.run(ComputePool(processes=0).compute("X", candles, PARAMS))
+    direct = compute_signals(make_candles(300), PARAMS)
+    np.testing.assert_array_equal(result.long_signal, direct.long_signal)
+    # Anroparens staplar får inga indikatorer i inline-läget heller
+    assert candles.indicators == {}
@@ -0,0 +1,208 @@
+import json
+import os
+import sys
+
+import ccxt
+import pytest
+from websockets.sync.client import connect
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from exchange_simulator import (  # noqa: E402
+    SimulatedBitfinexServer,
+    SimulatedExchange,
+    parse_symbol,
+)
+from wallet_cache import WalletCache  # noqa: E402
+
+SYMBOL = "tTESTBTC:TESTUSD"
+START = 1_700_000_000_000
+
+
+class Clock:
+    def __init__(self, now=START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, minutes):
+        self.now += minutes * 60_000
+
+
+def make_exchange(**kwargs):
+    clock = Clock()
+    exchange = SimulatedExchange(clock=clock, history_minutes=2000, **kwargs)
+    return exchange, clock
+
+
+def test_parse_symbol_formats():
+    assert parse_symbol("BTC/USD") == ("BTC", "USD")
+    assert parse_symbol("tBTCUSD") == ("BTC", "USD")
+    assert parse_symbol(SYMBOL) == ("TESTBTC", "TESTUSD")
+
+
+def test_ohlcv_is_deterministic_and_aggregates():
+    exchange, _ = make_exchange(seed=7)
+    other, _ = make_exchange(seed=7)
+    five = exchange.fetch_ohlcv(SYMBOL, "5m", limit=4)
+    assert five == other.fetch_ohlcv(SYMBOL, "5m", limit=4)
+    assert len(five) == 4
+    assert all(isinstance(row[0], int) for row in five)
+
+    first = five[0]
+    minutes = exchange.fetch_ohlcv(SYMBOL, "1m", since=first[0], limit=5)
+    assert first[1] == minutes[0][1]
+    assert first[2] == max(row[2] for row in minutes)
+    assert first[3] == min(row[3] for row in minutes)
+    assert first[4] == minutes[-1][4]
+    assert first[5] == pytest.approx(sum(row[5] for row in minutes))
+
+    ticker = exchange.fetch_ticker(SYMBOL)
+    book = exchange.fetch_order_book(SYMBOL, limit=5)
+    assert ticker["bid"] < ticker["last"] < ticker["ask"]
+    assert book["bids"][0][0] == ticker["bid"]
+    assert book["asks"][0][0] == ticker["ask"]
+    assert len(book["bids"]) == 5
+
+
+def test_market_order_fills_with_fee_and_updates_balance():
+    exchange, _ = make_exchange(taker_fee=0.002, slippage_bps=10)
+    ask = exchange.fetch_ticker(SYMBOL)["ask"]
+    before = exchange.fetch_balance()["TESTUSD"]["total"]
+
+    order = exchange.create_market_buy_order(SYMBOL, 0.1, {"type": "EXCHANGE MARKET"})
+    assert order["status"] == "closed"
+    assert order["average"] == pytest.approx(ask * 1.001)
+    assert order["fee"]["cost"] == pytest.approx(order["cost"] * 0.002)
+    assert order["info"][8] == "EXCHANGE MARKET"
+    balance = exchange.fetch_balance()
+    assert balance["TESTBTC"]["total"] == pytest.approx(10.1)
+    assert balance["TESTUSD"]["total"] == pytest.approx(
+        before - order["cost"] - order["fee"]["cost"]
+    )
+
+    with pytest.raises(ccxt.InsufficientFunds):
+        exchange.create_market_sell_order(SYMBOL, 1_000)
+    with pytest.raises(ccxt.InvalidOrder):
+        exchange.create_limit_buy_order(SYMBOL, 0.1, None)
+
+
+def test_limit_order_rests_until_price_reaches_it():
+    exchange, clock = make_exchange(maker_fee=0.001)
+    ask = exchange.fetch_ticker(SYMBOL)["ask"]
+    # Fyllnadsnivå som prisbanan når inom 2000 minuter
+    target = max(row[2] for row in exchange.fetch_ohlcv(SYMBOL, "1m", limit=1))
+    price = max(ask * 1.001, target)
+    order = exchange.create_limit_sell_order(SYMBOL, 0.5, price)
+    assert order["status"] == "open"
+    assert exchange.fetch_balance()["TESTBTC"]["used"] == pytest.approx(0.5)
+
+    for _ in range(2000):
+        clock.advance(1)
+        if not exchange.fetch_open_orders(SYMBOL):
+            break
+    filled = exchange.fetch_order(order["id"])
+    assert filled["status"] == "closed"
+    assert filled["average"] == price
+    assert filled["fee"]["cost"] == pytest.approx(0.5 * price * 0.001)
+    assert exchange.fetch_balance()["TESTBTC"] == {
+        "free": pytest.approx(9.5),
+        "used": pytest.approx(0.0),
+        "total": pytest.approx(9.5),
+    }
+    assert exchange.fetch_my_trades(SYMBOL)[-1]["takerOrMaker"] == "maker"
+
+
+def test_cancel_releases_reserved_funds():
+    exchange, _ = make_exchange()
+    order = exchange.create_limit_buy_order(SYMBOL, 1.0, 1_000.0)
+    assert exchange.fetch_balance()["TESTUSD"]["used"] > 0
+    canceled = exchange.cancel_order(order["id"], SYMBOL)
+    assert canceled["status"] == "canceled"
+    assert exchange.fetch_open_orders() == []
+    assert exchange.fetch_balance()["TESTUSD"]["used"] == 0
+    with pytest.raises(ccxt.OrderNotFound):
+        exchange.cancel_order(order["id"])
+
+
+def test_websocket_protocol_round_trip():
+    exchange = SimulatedExchange(seed=1)
+    server = SimulatedBitfinexServer(exchange, candle_interval=0.05)
+    uri = server.start()
+    try:
+        with connect(uri) as ws:
+            assert json.loads(ws.recv())["event"] == "info"
+            ws.send(json.dumps({"event": "auth", "apiKey": "k", "authSig": "s"}))
+            assert json.loads(ws.recv())["status"] == "OK"
+            cache = WalletCache(wallet_type="exchange")
+            for _ in range(3):
+                cache.handle_message(json.loads(ws.recv()))
+            assert cache.as_balance()["total"]["TESTUSD"] == 100_000.0
+
+            ws.send(
+                json.dumps(
+                    {
+                        "event": "subscribe",
+                        "channel": "candles",
+                        "key": f"trade:1m:{SYMBOL}",
+                    }
+                )
+            )
+            subscribed = json.loads(ws.recv())
+            chan_id = subscribed["chanId"]
+            snapshot = json.loads(ws.recv())
+            assert snapshot[0] == chan_id
+            assert len(snapshot[1][0]) == 6
+            # Nyaste stapeln först, som Bitfinex
+            assert snapshot[1][0][0] > snapshot[1][1][0]
+
+            ws.send(json.dumps({"event": "ping", "cid": 42}))
+            pong = json.loads(ws.recv(timeout=5))
+            while not isinstance(pong, dict):
+                pong = json.loads(ws.recv(timeout=5))
+            assert pong == {"event": "pong", "ts": pong["ts"], "cid": 42}
+
+            order = exchange.create_limit_buy_order(SYMBOL, 0.01, 1_000.0)
+            exchange.cancel_order(order["id"])
+            events = {}
+            while "oc" not in events:
+                message = json.loads(ws.recv(timeout=5))
+                if message[0] == 0:
+                    events[message[1]] = message[2]
+            assert events["on"][0] == int(order["id"])
+            assert events["on"][13] == "ACTIVE"
+            assert events["oc"][13] == "CANCELED"
+            assert events["oc"][3] == SYMBOL
+    finally:
+        server.stop()
+
+
+def test_websocket_trades_channel():
+    exchange = SimulatedExchange(seed=2)
+    server = SimulatedBitfinexServer(exchange, trade_interval=0.05)
+    uri = server.start()
+    try:
+        with connect(uri) as ws:
+            assert json.loads(ws.recv())["event"] == "info"
+            ws.send(
+                json.dumps(
+                    {"event": "subscribe", "channel": "trades", "symbol": SYMBOL}
+                )
+            )
+            chan_id = json.loads(ws.recv())["chanId"]
+            chan, snapshot = json.loads(ws.recv())
+            assert chan == chan_id
+            # [ID, MTS, AMOUNT, PRICE], nyaste först
+            assert len(snapshot[0]) == 4
+            assert snapshot[0][0] > snapshot[-1][0]
+            assert snapshot[0][1] > snapshot[-1][1]
+            update = json.loads(ws.recv(timeout=5))
+            while update[1] == "hb":
+                update = json.loads(ws.recv(timeout=5))
+            assert update[:2] == [chan_id, "te"]
+            assert update[2][0] > snapshot[0][0]
+            assert update[2][3] > 0
+    finally:
+        server.stop()
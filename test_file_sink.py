@@ -0,0 +1,112 @@
+import os
+import sys
+import threading
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import file_sink  # noqa: E402
+from file_sink import FileSink, parse_fsync  # noqa: E402
+
+
+def read(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def test_lines_are_written_in_order_per_file(tmp_path):
+    sink = FileSink().start()
+    orders, errors = str(tmp_path / "orders.txt"), str(tmp_path / "errors.log")
+    for i in range(500):
+        sink.write(orders, f"order {i}\n")
+        if i % 100 == 0:
+            sink.write(errors, f"fel {i}\n")
+    assert sink.flush()
+    assert read(orders) == [f"order {i}" for i in range(500)]
+    assert read(errors) == [f"fel {i}" for i in range(0, 500, 100)]
+    sink.close()
+
+
+def test_burst_is_written_with_few_syscalls(tmp_path, monkeypatch):
+    sink = FileSink()
+    path = str(tmp_path / "orders.txt")
+    writes = []
+    original = file_sink._Handle.__init__
+
+    def counting_init(handle, p):
+        original(handle, p)
+        raw = handle.file
+
+        class Counting:
+            def write(self, data):
+                writes.append(len(data))
+                return raw.write(data)
+
+            def __getattr__(self, name):
+                return getattr(raw, name)
+
+        handle.file = Counting()
+
+    monkeypatch.setattr(file_sink._Handle, "__init__", counting_init)
+    # Köa hela skuren innan tråden startar: ett varv, ett write
+    for i in range(300):
+        sink.write(path, f"fill {i}\n")
+    sink.start()
+    assert sink.flush()
+    assert len(writes) == 1
+    assert len(read(path)) == 300
+    sink.close()
+
+
+def test_short_writes_are_completed(tmp_path, monkeypatch):
+    sink = FileSink()
+    path = str(tmp_path / "orders.txt")
+    original = file_sink._Handle.__init__
+
+    def short_init(handle, p):
+        original(handle, p)
+        raw = handle.file
+
+        class Short:
+            def write(self, data):
+                # Som ett write som avbryts efter några byte
+                return raw.write(data[:7])
+
+            def __getattr__(self, name):
+                return getattr(raw, name)
+
+        handle.file = Short()
+
+    monkeypatch.setattr(file_sink._Handle, "__init__", short_init)
+    for i in range(50):
+        sink.write(path, f"fill {i}\n")
+    sink.start()
+    assert sink.flush()
+    assert read(path) == [f"fill {i}" for i in range(50)]
+    sink.close()
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    sink = FileSink(maxsize=2)
+    path = str(tmp_path / "a.txt")
+    sink._thread = threading.current_thread()  # hindra autostart
+    assert [sink.write(path, "x\n") for _ in range(3)] == [True, True, False]
+    assert sink.dropped == 1
+
+
+def test_reopens_removed_file_and_fsync_policy(tmp_path):
+    sink = FileSink(fsync_interval=0).start()
+    path = str(tmp_path / "a.txt")
+    sink.write(path, "1\n")
+    assert sink.flush()
+    os.remove(path)
+    sink.write(path, "2\n")
+    assert sink.flush()
+    assert read(path) == ["2"]
+    assert not sink._handles[path].dirty
+    sink.close()
+
+    assert parse_fsync(None) is None
+    assert parse_fsync("never") is None
+    assert parse_fsync("always") == 0.0
+    assert parse_fsync("2.5") == 2.5
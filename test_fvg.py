@@ -0,0 +1,94 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fvg import GapIndex, detect_fvg, find_gaps, fvg_gaps  # noqa: E402
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=["high", "low", "close"])
+
+
+def test_find_gaps_three_candle_pattern():
+    high = np.array([10.0, 12.0, 14.0, 13.0, 9.0])
+    low = np.array([9.0, 10.0, 12.0, 11.0, 8.0])
+    bullish, bearish = find_gaps(high, low)
+    # high[0] < low[2] respektive low[2] > high[4]
+    assert bullish.tolist() == [False, False, True, False, False]
+    assert bearish.tolist() == [False, False, False, False, True]
+
+
+def test_gap_is_used_until_filled():
+    data = frame(
+        [
+            [10.0, 9.0, 9.5],
+            [12.0, 10.0, 11.8],
+            [14.0, 12.0, 13.0],  # bullish FVG [10, 12]
+            [13.5, 11.5, 11.8],  # återtest in i gapet
+            [12.0, 9.9, 10.5],  # low når botten: gapet fylls
+            [12.0, 10.2, 11.0],
+        ]
+    )
+    gaps = fvg_gaps(data, lookback=10)
+    assert np.isnan(gaps["bull_high"][2])
+    assert (gaps["bull_low"][3], gaps["bull_high"][3]) == (10.0, 12.0)
+    assert np.isnan(gaps["bull_high"][4:]).all()
+    assert np.isnan(gaps["bear_high"]).all()
+
+
+def test_bearish_gap_and_lookback_expiry():
+    data = frame(
+        [
+            [20.0, 18.0, 18.5],
+            [18.5, 16.0, 16.2],
+            [15.0, 13.0, 13.5],  # bearish FVG [15, 18]
+            [16.0, 14.0, 15.5],
+            [16.5, 14.5, 16.0],
+            [16.5, 14.5, 16.0],
+        ]
+    )
+    gaps = fvg_gaps(data, lookback=2)
+    assert (gaps["bear_low"][3], gaps["bear_high"][3]) == (15.0, 18.0)
+    assert gaps["bear_high"][4] == 18.0
+    # Äldre än lookback staplar
+    assert np.isnan(gaps["bear_high"][5])
+    assert detect_fvg(data.iloc[:5], 2, bullish=False) == (18.0, 15.0)
+
+
+def test_gap_index_live_updates():
+    index = GapIndex(lookback=100)
+    index.add(0, 10.0, 12.0)
+    index.add(1, 11.0, 15.0)
+    assert index.inside(13.0) == (11.0, 15.0)
+    assert index.inside(16.0) is None
+    # Ett tick vid 11.0 fyller det andra gapet men inte det första
+    assert index.inside(11.0) == (10.0, 12.0)
+    assert len(index) == 1
+    assert index.update(2, low=9.0, high=12.0) == 1
+    assert index.inside(11.0) is None
+
+
+def test_matches_brute_force():
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 1, 400))
+    data = frame(
+        np.c_[close + rng.random(400), close - rng.random(400), close].tolist()
+    )
+    high, low = data["high"].to_numpy(), data["low"].to_numpy()
+    lookback = 15
+    gaps = fvg_gaps(data, lookback)
+    for j in range(len(data)):
+        tops = [
+            low[k]
+            for k in range(max(2, j - lookback), j)
+            if high[k - 2] < low[k]
+            and low[slice(k + 1, j + 1)].min() > high[k - 2]
+            and high[k - 2] <= close[j] <= low[k]
+        ]
+        expected = max(tops) if tops else np.nan
+        assert np.isclose(gaps["bull_high"][j], expected, equal_nan=True)
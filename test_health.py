@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+import urllib.error
+import urllib.request
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from health import HealthState, serve_health_async  # noqa: E402
+
+
+def ready_state():
+    state = HealthState(max_candle_age=60, required_streams=("orders",))
+    state.mark_connected("orders")
+    state.mark_candle(time.time() * 1000)
+    return state
+
+
+def test_readiness_requires_candles_and_streams():
+    state = HealthState(required_streams=("orders",))
+    ready, failed, snapshot = state.readiness()
+    assert not ready
+    assert set(failed) == {"candles", "websocket:orders"}
+    assert snapshot["last_candle_age"] is None
+
+    state.mark_connected("orders")
+    state.mark_candle(time.time() * 1000)
+    ready, failed, _ = state.readiness()
+    assert ready and failed == {}
+
+    state.mark_disconnected("orders")
+    ready, failed, snapshot = state.readiness()
+    assert not ready and "websocket:orders" in failed
+    assert snapshot["websockets"]["orders"]["connected"] is False
+
+
+def test_stale_heartbeat_queue_and_cache_fail_readiness():
+    state = ready_state()
+    state.max_heartbeat_age = 0.0
+    state.mark_heartbeat("orders")
+    time.sleep(0.01)
+    assert "heartbeat:orders" in state.readiness()[1]
+
+    state = ready_state()
+    depth = [0]
+    state.register_queue("ws_orders", lambda: depth[0])
+    state.register_cache("wallet", lambda: None, max_age=30)
+    ready, failed, snapshot = state.readiness()
+    assert failed == {"cache:wallet": "ålder: aldrig"}
+    assert snapshot["queues"] == {"ws_orders": 0}
+
+    state.register_cache("wallet", lambda: 1.0, max_age=30)
+    depth[0] = state.max_queue_depth + 1
+    ready, failed, _ = state.readiness()
+    assert list(failed) == ["queue:ws_orders"]
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_http_endpoints():
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    state = HealthState(required_streams=("orders",))
+
+    async def probe():
+        task = asyncio.create_task(serve_health_async(state, port, "127.0.0.1", 1))
+        await asyncio.sleep(0.05)
+        loop = asyncio.get_running_loop()
+        try:
+            status, payload = await loop.run_in_executor(None, get, f"{base}/live")
+            assert status == 200 and payload["status"] == "ok"
+
+            status, payload = await loop.run_in_executor(None, get, f"{base}/ready")
+            assert status == 503 and payload["status"] == "not_ready"
+
+            status, payload = await loop.run_in_executor(None, get, f"{base}/health")
+            assert status == 200 and payload["status"] == "ok"
+            assert payload["ready"] is False
+
+            state.mark_connected("orders")
+            state.mark_candle(time.time() * 1000)
+            status, payload = await loop.run_in_executor(None, get, f"{base}/ready")
+            assert status == 200 and payload["failed"] == {}
+        finally:
+            task.cancel()
+
+    asyncio.run(probe())
+
+
+def test_async_server_serves_same_endpoints():
+    port = free_port()
+    state = HealthState()
+    state.mark_candle(time.time() * 1000)
+
+    async def probe():
+        task = asyncio.create_task(serve_health_async(state, port, "127.0.0.1", 1))
+        await asyncio.sleep(0.05)
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.gather(
+                *(
+                    loop.run_in_executor(None, get, f"http://127.0.0.1:{port}{path}")
+                    for path in ("/ready", "/live", "/missing")
+                )
+            )
+        finally:
+            task.cancel()
+
+    ready, live, missing = asyncio.run(probe())
+    assert ready[0] == 200 and ready[1]["status"] == "ready"
+    assert live[0] == 200 and live[1]["status"] == "ok"
+    assert missing == (404, None)
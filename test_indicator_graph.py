@@ -0,0 +1,127 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import talib
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from candles import CandleArray, compute_indicators  # noqa: E402
+from fvg import FVG_INDICATORS, fvg_signals  # noqa: E402
+from indicator_graph import (  # noqa: E402
+    _REGISTRY,
+    Indicator,
+    IndicatorGraph,
+    IndicatorParams,
+    available,
+    plan,
+)
+from indicators import calculate_indicators  # noqa: E402
+
+PARAMS = IndicatorParams(12, 1.5, 0, 23)
+
+
+def make_candles(n=600, seed=5):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 2e-3, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * 1.002
+    low = np.minimum(open_, close) * 0.998
+    volume = rng.uniform(1, 10, n)
+    timestamps = 1_700_000_000_000 + np.arange(n) * 60_000
+    return CandleArray(timestamps, open_, high, low, close, volume)
+
+
+def test_plan_only_includes_dependencies():
+    order = plan(FVG_INDICATORS, PARAMS)
+    assert "rsi" not in order and "adx" not in order
+    # Beroenden före de som använder dem
+    assert order.index("tr") < order.index("mean:tr:14") < order.index("atr")
+    assert order.index("avg_volume") < order.index("high_volume")
+    assert order.index("hour") < order.index("within_trading_hours")
+
+
+def test_shared_intermediates_are_computed_once():
+    graph = IndicatorGraph.from_candles(make_candles(), PARAMS)
+    # ema_length == macd_fast: strategins EMA och MACD:s snabba EMA är samma nod
+    graph.evaluate(["ema", "macd", "macd_hist", "bb_upper", "bb_lower", "atr"])
+    assert graph.computed.count("ema:close:12") == 1
+    assert graph.computed.count("sma:close:20") == 1
+    assert graph.computed.count("std:close:20") == 1
+    assert "rsi" not in graph.computed
+    computed = len(graph.computed)
+    # Redan beräknade noder räknas inte om
+    graph.evaluate(["macd", "atr"])
+    assert len(graph.computed) == computed
+
+
+def test_macd_and_bollinger_match_talib():
+    candles = make_candles()
+    graph = IndicatorGraph.from_candles(candles, PARAMS)
+    values = graph.evaluate(["macd", "macd_signal", "macd_hist", "bb_upper"])
+    values.update(graph.evaluate(["bb_middle", "bb_lower"]))
+    macd, signal, hist = talib.MACD(candles.close, 12, 26, 9)
+    # talib.MACD startar EMA:erna vid olika staplar; skillnaden klingar av
+    tail = slice(200, None)
+    np.testing.assert_allclose(values["macd"][tail], macd[tail], rtol=1e-9)
+    np.testing.assert_allclose(values["macd_signal"][tail], signal[tail], rtol=1e-9)
+    np.testing.assert_allclose(values["macd_hist"][tail], hist[tail], atol=1e-9)
+    upper, middle, lower = talib.BBANDS(candles.close, 20, 2.0, 2.0)
+    np.testing.assert_allclose(values["bb_upper"], upper, rtol=1e-12)
+    np.testing.assert_allclose(values["bb_middle"], middle, rtol=1e-12)
+    np.testing.assert_allclose(values["bb_lower"], lower, rtol=1e-12)
+
+
+def test_default_columns_match_pandas_reference():
+    candles = make_candles(300)
+    frame = candles.to_frame()
+    data = calculate_indicators(frame.copy(), 12, 1.5, 3, 20)
+    # Referens med pandas (samma definitioner som före registret)
+    tr = pd.concat(
+        [
+            frame["high"] - frame["low"],
+            (frame["high"] - frame["close"].shift()).abs(),
+            (frame["low"] - frame["close"].shift()).abs(),
+        ],
+        axis=1,
+    ).max(axis=1)
+    atr = tr.rolling(window=14, min_periods=1).mean()
+    avg_volume = frame["volume"].rolling(window=20, min_periods=1).mean()
+    np.testing.assert_allclose(data["atr"], atr, rtol=1e-12)
+    np.testing.assert_allclose(data["avg_volume"], avg_volume, rtol=1e-12)
+    np.testing.assert_allclose(data["ema"], talib.EMA(frame["close"], 12))
+    np.testing.assert_array_equal(
+        data["high_volume"], frame["volume"] > avg_volume * 1.5
+    )
+    np.testing.assert_array_equal(
+        data["within_trading_hours"], frame["datetime"].dt.hour.between(3, 20)
+    )
+    for column in ("rsi", "adx"):
+        assert not data[column].isnull().any()
+
+
+def test_strategy_subset_gives_same_signals():
+    full = compute_indicators(make_candles(), 20, 1.5, 0, 23)
+    subset = compute_indicators(
+        make_candles(), 20, 1.5, 0, 23, indicators=FVG_INDICATORS
+    )
+    assert set(subset.indicators) == {"ema", "atr"}
+    for ours, theirs in zip(fvg_signals(subset, 1.0, 5), fvg_signals(full, 1.0, 5)):
+        np.testing.assert_array_equal(ours, theirs)
+    frame = subset.to_frame()
+    assert "rsi" not in frame and "within_trading_hours" in frame
+
+
+def test_unknown_and_cyclic_indicators(monkeypatch):
+    assert {"macd", "bb_upper", "atr"} <= set(available())
+    with pytest.raises(KeyError):
+        plan(["nope"], PARAMS)
+    frame = make_candles(50).to_frame()
+    assert calculate_indicators(frame, 12, 1.5, 0, 23, indicators=["nope"]) is None
+    monkeypatch.setitem(_REGISTRY, "loop_a", Indicator("loop_a", ("loop_b",), None))
+    monkeypatch.setitem(_REGISTRY, "loop_b", Indicator("loop_b", ("loop_a",), None))
+    with pytest.raises(ValueError):
+        plan(["loop_a"], PARAMS)
@@ -0,0 +1,99 @@
+import logging
+import os
+import socket
+import sys
+
+import pytest
+from flask import Flask
+from prometheus_client import REGISTRY
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import (  # noqa: E402
+    InstrumentedExchange,
+    instrument_app,
+    record_cache,
+    start_metrics_server,
+)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class FakeExchange:
+    id = "bitfinex"
+
+    def fetch_ticker(self, symbol):
+        return {"symbol": symbol, "last": 1.0}
+
+    def cancel_order(self, order_id):
+        raise ValueError("okänd order")
+
+
+def test_instrumented_exchange_times_rest_methods():
+    exchange = InstrumentedExchange(FakeExchange())
+    count = "tradingbot_exchange_request_seconds_count"
+    before = sample(count, method="fetch_ticker")
+
+    assert exchange.fetch_ticker("tBTCUSD")["last"] == 1.0
+    assert exchange.fetch_ticker is exchange.fetch_ticker
+    assert exchange.id == "bitfinex"
+    assert sample(count, method="fetch_ticker") == before + 1
+
+    errors = sample(
+        "tradingbot_exchange_errors_total", method="cancel_order", error="ValueError"
+    )
+    with pytest.raises(ValueError):
+        exchange.cancel_order("1")
+    assert (
+        sample(
+            "tradingbot_exchange_errors_total",
+            method="cancel_order",
+            error="ValueError",
+        )
+        == errors + 1
+    )
+
+
+def test_instrumented_exchange_follows_replaced_methods(monkeypatch):
+    exchange = InstrumentedExchange(FakeExchange())
+    exchange.fetch_ticker("tBTCUSD")
+    monkeypatch.setattr(exchange, "fetch_ticker", lambda symbol: {"last": 2.0})
+    assert exchange.fetch_ticker("tBTCUSD")["last"] == 2.0
+    monkeypatch.undo()
+    assert exchange.fetch_ticker("tBTCUSD")["last"] == 1.0
+
+
+def test_cache_counter_and_api_latency():
+    hits = sample("tradingbot_cache_requests_total", cache="test", result="hit")
+    record_cache("test", True)
+    record_cache("test", False)
+    assert (
+        sample("tradingbot_cache_requests_total", cache="test", result="hit")
+        == hits + 1
+    )
+
+    app = instrument_app(Flask(__name__))
+
+    @app.route("/item/<int:item_id>")
+    def item(item_id):
+        return {"id": item_id}
+
+    labels = {"endpoint": "/item/<int:item_id>", "method": "GET", "status": "200"}
+    before = sample("tradingbot_api_request_seconds_count", **labels)
+    client = app.test_client()
+    client.get("/item/1")
+    client.get("/item/2")
+    assert sample("tradingbot_api_request_seconds_count", **labels) == before + 2
+
+
+def test_busy_metrics_port_is_an_error_not_a_silent_move(caplog):
+    with socket.socket() as busy:
+        busy.bind(("", 0))
+        busy.listen()
+        port = busy.getsockname()[1]
+        with caplog.at_level(logging.ERROR, logger="metrics"):
+            assert start_metrics_server(port) is None
+    assert f"port {port} är upptagen" in caplog.text
@@ -0,0 +1,99 @@
+import json
+import multiprocessing
+import os
+import sys
+import threading
+
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import nonce  # noqa: E402
+from nonce import NonceAllocator, get_allocator, read_high_water_mark  # noqa: E402
+
+
+def test_nonces_increase_and_persist_block_end(tmp_path):
+    path = str(tmp_path / "nonce.json")
+    allocator = NonceAllocator(path, block_size=100, clock=lambda: 1_000)
+    nonces = [allocator.next() for _ in range(250)]
+    assert nonces == list(range(1_000, 1_250))
+    # Tre block reserverade, filen innehåller slutet på det sista
+    with open(path) as f:
+        assert json.load(f) == {"last_nonce": 1_299}
+
+
+def test_restart_never_reuses_reserved_nonces(tmp_path):
+    path = str(tmp_path / "nonce.json")
+    first = NonceAllocator(path, block_size=10_000, clock=lambda: 5)
+    used = first.next()
+    restarted = NonceAllocator(path, block_size=10_000, clock=lambda: 5)
+    # Den delade räknaren finns kvar: fortsätter direkt efter
+    assert restarted.next() == used + 1
+    # Räknaren förlorad (t.ex. omstart av maskinen): börjar ovanför märket
+    if nonce.fcntl is not None:
+        os.remove(path + ".lock")
+    rebooted = NonceAllocator(path, block_size=10_000, clock=lambda: 5)
+    assert rebooted.next() > first.high_water_mark
+
+
+def test_follows_clock_when_ahead(tmp_path):
+    now = [1_000]
+    allocator = NonceAllocator(str(tmp_path / "n.json"), clock=lambda: now[0])
+    assert allocator.next() == 1_000
+    now[0] = 50_000
+    assert allocator.next() == 50_000
+    now[0] = 10
+    assert allocator.next() == 50_001
+
+
+def test_thread_safe(tmp_path):
+    allocator = NonceAllocator(str(tmp_path / "n.json"), block_size=50)
+    results = []
+
+    def worker():
+        results.extend(allocator.next() for _ in range(500))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(results)) == len(results) == 4_000
+
+
+def _allocate(path, count, queue):
+    allocator = NonceAllocator(path, block_size=20, clock=lambda: 0)
+    queue.put([allocator.next() for _ in range(count)])
+
+
+@pytest.mark.skipif(nonce.fcntl is None, reason="kräver fcntl")
+def test_processes_share_one_counter(tmp_path):
+    path = str(tmp_path / "n.json")
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_allocate, args=(path, 200, queue)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    results = [n for _ in procs for n in queue.get(timeout=30)]
+    for p in procs:
+        p.join()
+    assert len(set(results)) == len(results) == 800
+    # En räknare, inte ett block per process: inga luckor mellan processerna
+    assert sorted(results) == list(range(min(results), min(results) + 800))
+    assert read_high_water_mark(path) >= max(results)
+
+
+@pytest.mark.skipif(nonce.fcntl is None, reason="kräver fcntl")
+def test_interleaved_allocators_are_strictly_increasing(tmp_path):
+    path = str(tmp_path / "n.json")
+    bot = NonceAllocator(path, block_size=10_000, clock=lambda: 0)
+    api = NonceAllocator(path, block_size=10_000, clock=lambda: 0)
+    nonces = [allocator.next() for _ in range(50) for allocator in (bot, api)]
+    assert nonces == sorted(nonces) and len(set(nonces)) == 100
+
+
+def test_get_allocator_is_shared_per_path(tmp_path):
+    path = str(tmp_path / "n.json")
+    assert get_allocator(path) is get_allocator(path)
+    assert get_allocator(path) is not get_allocator(str(tmp_path / "other.json"))
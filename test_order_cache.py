@@ -0,0 +1,50 @@
+import os
+import sys
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from order_cache import OrderCache  # noqa: E402
+
+
+def order(order_id, status="ACTIVE", amount=0.5, price=100.0, symbol="tBTCUSD"):
+    # [ID, GID, CID, SYMBOL, MTS_CREATE, MTS_UPDATE, AMOUNT, AMOUNT_ORIG, TYPE,
+    #  TYPE_PREV, MTS_TIF, _, FLAGS, STATUS, _, _, PRICE, PRICE_AVG]
+    return [
+        order_id, None, 1, symbol, 0, 1, amount, 1.0, "EXCHANGE LIMIT",
+        None, None, None, 0, status, None, None, price, 0.0,
+    ]  # fmt: skip
+
+
+def test_tracks_open_and_closed_orders():
+    cache = OrderCache()
+    assert cache.handle_message([0, "os", [order(1), order(2)]])
+    assert cache.handle_message([0, "on", order(3, symbol="tETHUSD")])
+    assert cache.handle_message([0, "ou", order(1, "PARTIALLY FILLED", 0.2)])
+    assert cache.handle_message([0, "oc", order(2, "EXECUTED @ 100.0", 0.0)])
+    assert not cache.handle_message([0, "ws", []])
+    assert not cache.handle_message([0, "hb"])
+
+    assert sorted(o["id"] for o in cache.open_orders()) == [1, 3]
+    assert [o["id"] for o in cache.open_orders("tETHUSD")] == [3]
+    assert cache.get(1)["amount"] == 0.2
+    assert cache.get(2)["status"].startswith("EXECUTED")
+    assert cache.age() is not None
+
+
+def test_closed_orders_are_bounded():
+    cache = OrderCache(max_closed=2)
+    for order_id in range(5):
+        cache.handle_message([0, "oc", order(order_id, "CANCELED")])
+    assert cache.get(0) is None
+    assert cache.get(4) is not None
+
+
+def test_snapshot_roundtrip():
+    cache = OrderCache()
+    cache.handle_message([0, "os", [order(1)]])
+    cache.handle_message([0, "oc", order(2, "EXECUTED")])
+    restored = OrderCache()
+    restored.restore(cache.snapshot())
+    assert [o["id"] for o in restored.open_orders()] == [1]
+    assert restored.get(2)["status"] == "EXECUTED"
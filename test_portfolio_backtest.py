@@ -0,0 +1,102 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_engine import simulate  # noqa: E402
+from fvg import fvg_signals  # noqa: E402
+from indicators import calculate_indicators  # noqa: E402
+from portfolio_backtest import AlignedSeries, portfolio_backtest  # noqa: E402
+
+
+def synthetic_ohlcv(n, freq, seed):
+    """Slumpvandring med korta vekar, så att FVG bildas och återtestas."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 6e-3, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * 1.0005
+    low = np.minimum(open_, close) * 0.9995
+    volume = rng.uniform(1, 10, n)
+    volume[rng.random(n) < 0.2] *= 5
+    return pd.DataFrame(
+        {
+            "datetime": pd.date_range("2024-01-01", periods=n, freq=freq),
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume,
+        }
+    )
+
+
+def basket():
+    return {
+        ("BTC/USD", "1h"): synthetic_ohlcv(300, "h", 1),
+        ("ETH/USD", "1h"): synthetic_ohlcv(250, "h", 2),
+        ("BTC/USD", "4h"): synthetic_ohlcv(75, "4h", 3),
+    }
+
+
+def test_aligned_series_union_axis():
+    aligned = AlignedSeries.from_frames(basket())
+    assert aligned.close.shape == (3, 300)
+    assert aligned.present.sum(axis=1).tolist() == [300, 250, 75]
+    timestamps, columns = aligned.series(2)
+    assert len(timestamps) == 75
+    np.testing.assert_array_equal(
+        columns["close"], basket()[("BTC/USD", "4h")]["close"].to_numpy()
+    )
+
+
+def test_portfolio_matches_single_series_backtests():
+    frames = basket()
+    result = portfolio_backtest(
+        frames, params={"atr_multiplier": 0.0}, engine_params={"amount": 1.0}
+    )
+    total = 0.0
+    for key, frame in frames.items():
+        data = calculate_indicators(frame.copy(), 20, 1.5, 0, 23)
+        longs, shorts = fvg_signals(data, 0.0, 100)
+        single = simulate(
+            frame["datetime"].to_numpy(dtype="datetime64[ms]").astype(np.int64),
+            frame["open"].to_numpy(),
+            frame["high"].to_numpy(),
+            frame["low"].to_numpy(),
+            frame["close"].to_numpy(),
+            longs,
+            shorts,
+            amount=1.0,
+        )
+        assert result.results[key].stats["trades"] == single.stats["trades"]
+        total += single.stats["net_pnl"]
+    assert result.stats["net_pnl"] == pytest.approx(total)
+    assert result.equity[-1] == pytest.approx(10_000.0 + total)
+    assert result.stats["trades"] > 0
+
+
+def test_exposure_uses_forward_filled_prices():
+    result = portfolio_backtest(
+        basket(), params={"atr_multiplier": 0.0}, engine_params={"amount": 1.0}
+    )
+    row = result.keys.index(("BTC/USD", "4h"))
+    # 4h-serien saknar staplar mellan sina tider; positionen ligger kvar
+    held = np.flatnonzero(result.position[row])
+    assert len(held) > 0
+    assert np.all(result.exposure[row, held] != 0)
+    np.testing.assert_allclose(
+        result.gross_exposure, np.abs(result.exposure).sum(axis=0)
+    )
+
+
+def test_process_pool_matches_in_process():
+    params = {"atr_multiplier": 0.0}
+    serial = portfolio_backtest(basket(), params=params, processes=1)
+    pooled = portfolio_backtest(basket(), params=params, processes=2)
+    np.testing.assert_array_equal(serial.equity, pooled.equity)
+    assert serial.stats == pooled.stats
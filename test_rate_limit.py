@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import sys
+
+import ccxt
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rate_limit  # noqa: E402
+from rate_limit import (  # noqa: E402
+    DASHBOARD,
+    MARKET,
+    ORDER,
+    RateLimiter,
+    install,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_reserves_give_orders_priority(tmp_path):
+    clock = FakeClock()
+    limiter = RateLimiter(str(tmp_path / "rl.bin"), rate=1, capacity=8, clock=clock)
+    # Dashboard får bara ta ner till halva hinken, marknadsdata till en fjärdedel
+    assert [limiter.try_acquire(DASHBOARD) for _ in range(4)] == [0.0] * 4
+    assert limiter.try_acquire(DASHBOARD) == pytest.approx(1.0)
+    assert [limiter.try_acquire(MARKET) for _ in range(2)] == [0.0] * 2
+    assert limiter.try_acquire(MARKET) > 0
+    assert [limiter.try_acquire(ORDER) for _ in range(2)] == [0.0] * 2
+    assert limiter.remaining() == 0
+    assert limiter.try_acquire(ORDER) == pytest.approx(1.0)
+
+    clock.now += 3
+    status = limiter.status()
+    assert status["tokens"] == pytest.approx(3)
+    assert status["available"] == {"order": 3, "market": 1, "dashboard": 0}
+
+
+def test_acquire_times_out(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "rl.bin"), rate=0.1, capacity=1)
+    assert limiter.acquire(ORDER) == pytest.approx(0, abs=0.05)
+    with pytest.raises(ccxt.RateLimitExceeded):
+        limiter.acquire(ORDER, timeout=0.1)
+
+
+def _consume(path, queue):
+    limiter = RateLimiter(path, rate=0.001, capacity=50)
+    queue.put(sum(1 for _ in range(40) if limiter.try_acquire(ORDER) == 0))
+
+
+@pytest.mark.skipif(rate_limit.fcntl is None, reason="kräver fcntl")
+def test_budget_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "rl.bin")
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_consume, args=(path, queue)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    granted = sum(queue.get(timeout=30) for _ in procs)
+    for p in procs:
+        p.join()
+    assert granted == 50
+
+
+def test_install_throttles_ccxt_with_thread_priority(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "rl.bin"), rate=100, capacity=100)
+    calls = []
+    limiter.acquire = lambda level, cost=1.0, timeout=None: calls.append((level, cost))
+    exchange = ccxt.bitfinex()
+    exchange.fetch = lambda *args, **kwargs: [1]
+    seen = []
+    exchange.create_order = lambda *args: seen.append(rate_limit.current_priority())
+    install(exchange, limiter)
+
+    exchange.publicGetPlatformStatus()
+    with rate_limit.priority(DASHBOARD):
+        exchange.publicGetPlatformStatus()
+    assert [level for level, _ in calls] == [MARKET, DASHBOARD]
+    assert all(cost > 0 for _, cost in calls)
+
+    exchange.create_order("tBTCUSD", "limit", "buy", 1, 1)
+    assert seen == [ORDER]
+    assert rate_limit.current_priority() == MARKET
@@ -0,0 +1,114 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from candles import OHLCV_FIELDS, CandleArray  # noqa: E402
+from exchange_simulator import SimulatedExchange  # noqa: E402
+from resample import MultiTimeframeCandles, resample, timeframe_ms  # noqa: E402
+
+# 2023-11-14 22:13 UTC: mitt i en 4h- och en 1d-hink
+START = 1_700_000_000_000 - 1_700_000_000_000 % 60_000
+
+
+class Clock:
+    def __init__(self, now=START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, minutes):
+        self.now += minutes * 60_000
+
+
+def make_exchange():
+    clock = Clock()
+    return SimulatedExchange(clock=clock, history_minutes=5000), clock
+
+
+def fetch(exchange, timeframe, limit, since=None):
+    ohlcv = exchange.fetch_ohlcv("BTC/USD", timeframe, since=since, limit=limit)
+    return CandleArray.from_ohlcv(ohlcv)
+
+
+def assert_same(ours, theirs):
+    np.testing.assert_array_equal(ours.timestamps, theirs.timestamps)
+    for field in OHLCV_FIELDS:
+        np.testing.assert_allclose(getattr(ours, field), getattr(theirs, field))
+
+
+def test_timeframe_ms():
+    assert timeframe_ms("15m") == 900_000
+    assert timeframe_ms("4h") == 14_400_000
+    assert timeframe_ms("1d") == 86_400_000
+    with pytest.raises(ValueError):
+        timeframe_ms("1w")
+
+
+@pytest.mark.parametrize("timeframe", ["5m", "15m", "1h"])
+def test_resample_matches_exchange_buckets(timeframe):
+    exchange, _ = make_exchange()
+    minutes = fetch(exchange, "1m", 600)
+    ours = resample(minutes, timeframe)
+    # Första hinken täcks inte helt av 1m-staplarna
+    ours = ours[1:]
+    theirs = fetch(exchange, timeframe, len(ours), since=int(ours.timestamps[0]))
+    assert_same(ours, theirs)
+    assert (ours.timestamps % timeframe_ms(timeframe) == 0).all()
+
+
+def test_incremental_updates_match_exchange():
+    exchange, clock = make_exchange()
+    store = MultiTimeframeCandles(("5m", "15m", "1h"), capacity=100)
+    store.update(fetch(exchange, "1m", 200))
+    for _ in range(40):
+        clock.advance(3)
+        # Som candle_feed: från och med senaste (ofullständiga) stapeln
+        store.update(fetch(exchange, "1m", 100, since=store.base.last_timestamp))
+    for timeframe in ("5m", "15m", "1h"):
+        ours = store.candles(timeframe)
+        theirs = fetch(exchange, timeframe, len(ours), since=int(ours.timestamps[0]))
+        assert_same(ours, theirs)
+
+
+def test_partial_bar():
+    exchange, clock = make_exchange()
+    store = MultiTimeframeCandles(("5m",), capacity=100)
+    clock.now -= clock.now % 300_000 - 120_000  # två minuter in i en 5m-hink
+    store.update(fetch(exchange, "1m", 30))
+    assert store.is_partial("5m")
+    complete = store.candles("5m", partial=False)
+    assert len(complete) == len(store.candles("5m")) - 1
+    assert complete.timestamps[-1] + 300_000 == store.candles("5m").timestamps[-1]
+
+
+def test_seed_keeps_older_history_and_local_recent_bars():
+    exchange, _ = make_exchange()
+    store = MultiTimeframeCandles(("1h", "4h"), capacity=50)
+    store.update(fetch(exchange, "1m", 300))
+    local = len(store.candles("1h"))
+    assert local < 20
+    store.seed("1h", fetch(exchange, "1h", 40))
+    ours = store.candles("1h")
+    assert len(ours) == 40 and store.seeded["1h"] == 40
+    assert_same(ours, fetch(exchange, "1h", 40))
+    # Bara 4h-hinkar som 1m-bufferten täcker från början räknas lokalt
+    local_4h = store.candles("4h")
+    assert local_4h.timestamps[0] >= store.base.candles.timestamps[0]
+    # Bitfinex har ingen 4h-tidsram; den finns bara lokalt
+    assert_same(local_4h, resample(store.since("1m", local_4h.timestamps[0]), "4h"))
+
+
+def test_snapshot_restore():
+    exchange, _ = make_exchange()
+    store = MultiTimeframeCandles(("5m", "1h"), capacity=100)
+    store.update(fetch(exchange, "1m", 200))
+    restored = MultiTimeframeCandles(("5m", "1h"), capacity=100)
+    restored.restore(store.snapshot())
+    for timeframe in ("1m", "5m", "1h"):
+        assert_same(restored.candles(timeframe), store.candles(timeframe))
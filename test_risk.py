@@ -0,0 +1,189 @@
+import os
+import sys
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest  # noqa: E402
+
+from risk import DailyCounters, RiskEngine, split_pair  # noqa: E402
+
+DAY = 1_700_000_000.0  # 2023-11-14 22:13 UTC
+
+
+def test_daily_counters_roll_over_at_utc_midnight():
+    now = [DAY]
+    counters = DailyCounters(clock=lambda: now[0])
+    counters.record_trade()
+    counters.record_pnl(-12.5)
+    assert counters.current() == {
+        "day": "2023-11-14",
+        "trades": 1,
+        "realized_pnl": -12.5,
+    }
+    now[0] += 2 * 3600
+    assert counters.current() == {"day": "2023-11-15", "trades": 0, "realized_pnl": 0.0}
+
+
+def test_restore_only_applies_to_the_same_day():
+    now = [DAY]
+    counters = DailyCounters(clock=lambda: now[0])
+    counters.record_trade(3)
+    state = counters.current()
+
+    same_day = DailyCounters(clock=lambda: now[0])
+    same_day.restore(state)
+    assert same_day.current()["trades"] == 3
+
+    now[0] += 86_400
+    next_day = DailyCounters(clock=lambda: now[0])
+    next_day.restore(state)
+    assert next_day.current()["trades"] == 0
+
+
+def engine(**kwargs):
+    now = [DAY]
+    return RiskEngine(clock=lambda: now[0], **kwargs), now
+
+
+def test_fills_realise_pnl_and_marks_give_unrealised():
+    risk, _ = engine()
+    risk.apply_fill("tBTCUSD", 1.0, 100.0)
+    risk.apply_fill("tBTCUSD", 1.0, 110.0)
+    assert risk.positions()[0]["avg_price"] == pytest.approx(105.0)
+    risk.mark("tBTCUSD", 120.0)
+    assert risk.summary()["unrealized_pnl"] == pytest.approx(30.0)
+    # Stänger 1.5, vänder inte
+    assert risk.apply_fill("tBTCUSD", -1.5, 115.0) == pytest.approx(15.0)
+    summary = risk.summary()
+    assert summary["realized_pnl"] == pytest.approx(15.0)
+    assert summary["unrealized_pnl"] == pytest.approx(0.5 * 10.0)
+    assert summary["exposure"] == pytest.approx(0.5 * 115.0)
+    # Vänder till kort: resten öppnas till fyllnadspriset
+    risk.apply_fill("tBTCUSD", -1.0, 100.0)
+    position = risk.positions()[0]
+    assert position["amount"] == pytest.approx(-0.5)
+    assert position["avg_price"] == pytest.approx(100.0)
+    assert risk.summary()["realized_pnl"] == pytest.approx(15.0 - 2.5)
+
+
+def test_portfolio_totals_follow_each_symbol():
+    risk, _ = engine()
+    risk.apply_fill("tBTCUSD", 1.0, 100.0)
+    risk.apply_fill("tETHUSD", -2.0, 50.0)
+    risk.mark("tBTCUSD", 90.0)
+    risk.mark("tETHUSD", 40.0)
+    summary = risk.summary()
+    assert summary["unrealized_pnl"] == pytest.approx(-10.0 + 20.0)
+    assert summary["exposure"] == pytest.approx(90.0 + 80.0)
+
+
+def trade(trade_id, amount, price, fee=None):
+    # te: [ID, SYMBOL, MTS, ORDER_ID, AMOUNT, PRICE, TYPE, ORDER_PRICE, MAKER, CID]
+    # tu: som te men med FEE, FEE_CURRENCY före CID
+    base = [trade_id, "tBTCUSD", 0, 9, amount, price, "EXCHANGE LIMIT", price, 1]
+    return base + ([fee, "USD", 5] if fee is not None else [5])
+
+
+def test_te_and_tu_are_booked_once_with_fee():
+    risk, _ = engine()
+    assert risk.handle_message([0, "te", trade(1, 1.0, 100.0)])
+    assert risk.handle_message([0, "tu", trade(1, 1.0, 100.0, fee=-0.2)])
+    assert risk.handle_message([0, "tu", trade(1, 1.0, 100.0, fee=-0.2)])
+    assert not risk.handle_message([0, "oc", []])
+    # Felformade fyllnader bokförs inte och ger False (armerar inga nivåer)
+    assert not risk.handle_message([0, "te", [3, "tBTCUSD", 0, 7]])
+    assert not risk.handle_message([0, "te", trade(4, None, 100.0)])
+    assert risk.positions()[0]["amount"] == pytest.approx(1.0)
+    assert risk.summary()["realized_pnl"] == pytest.approx(-0.2)
+    assert risk.position("tBTCUSD") == pytest.approx(1.0)
+    assert risk.position("tETHUSD") == 0.0
+    # Simulatorn skickar bara te, med avgift
+    risk.handle_message([0, "te", trade(2, -1.0, 101.0, fee=-0.2)])
+    assert risk.positions() == []
+    assert risk.summary()["realized_pnl"] == pytest.approx(-0.2 + 1.0 - 0.2)
+
+
+def test_check_enforces_limits_but_allows_reducing_orders():
+    risk, now = engine(
+        max_trades_per_day=2, max_daily_loss=50.0, max_position=2.0, max_exposure=300
+    )
+    assert risk.check("tBTCUSD", "buy", 1.0, 100.0) == (True, None)
+    assert not risk.check("tBTCUSD", "buy", 3.0, 100.0)[0]
+    assert not risk.check("tBTCUSD", "buy", 1.0, 400.0)[0]
+
+    risk.apply_fill("tBTCUSD", 1.0, 100.0)
+    risk.record_order()
+    risk.record_order()
+    allowed, reason = risk.check("tBTCUSD", "buy", 0.1, 100.0)
+    assert not allowed and "affärer" in reason
+    assert risk.check("tBTCUSD", "sell", 1.0) == (True, None)
+
+    now[0] += 86_400
+    assert risk.check("tBTCUSD", "buy", 0.1, 100.0)[0]
+    risk.mark("tBTCUSD", 40.0)
+    allowed, reason = risk.check("tBTCUSD", "buy", 0.1, 40.0)
+    assert not allowed and "förlust" in reason
+
+    risk.mark("tBTCUSD", 100.0)
+    risk.halt("test")
+    assert not risk.check("tBTCUSD", "buy", 0.1)[0]
+    assert risk.check("tBTCUSD", "sell", 0.5)[0]
+    risk.resume()
+    assert risk.check("tBTCUSD", "buy", 0.1)[0]
+
+
+def test_symbols_are_normalised_and_state_restored():
+    risk, now = engine(normalize=lambda s: "tBTCUSD" if s == "BTC/USD" else s)
+    risk.apply_fill("tBTCUSD", 0.5, 100.0)
+    risk.mark("BTC/USD", 110.0)
+    risk.record_order()
+    assert risk.summary()["unrealized_pnl"] == pytest.approx(5.0)
+
+    restored, _ = engine()
+    restored.daily.clock = lambda: now[0]
+    restored.restore(risk.snapshot())
+    assert restored.summary()["unrealized_pnl"] == pytest.approx(5.0)
+    assert restored.summary()["trades"] == 1
+    assert split_pair("tTESTBTC:TESTUSD") == ("TESTBTC", "TESTUSD")
+    assert split_pair("BTC/USD") == ("BTC", "USD")
+
+
+def rest_trade(trade_id, side, amount, price, timestamp, fee=0.2):
+    # Som ccxt fetch_my_trades
+    return {
+        "id": str(trade_id),
+        "order": 70 + trade_id,
+        "symbol": "tBTCUSD",
+        "timestamp": timestamp,
+        "side": side,
+        "price": price,
+        "amount": amount,
+        "fee": {"cost": fee, "currency": "USD"},
+    }
+
+
+def test_reconcile_books_missed_fills_once():
+    risk, _ = engine()
+    start = risk.last_fill_ms
+    risk.handle_message([0, "te", trade(1, 1.0, 100.0)])
+    missed = [
+        rest_trade(1, "buy", 1.0, 100.0, start),
+        rest_trade(2, "sell", 0.4, 110.0, start + 5),
+    ]
+    booked = risk.reconcile(missed + [{"id": "3"}])
+    # Fyllnad 1 kom redan via websocket (int-id), 2 missades
+    assert [row[0] for row in booked] == ["2"]
+    assert booked[0][3] == 72 and booked[0][4] == pytest.approx(-0.4)
+    assert risk.position("tBTCUSD") == pytest.approx(0.6)
+    # te saknade avgift; den bokförs från REST-historiken
+    assert risk.summary()["realized_pnl"] == pytest.approx(4.0 - 0.2 - 0.2)
+    assert risk.last_fill_ms == start + 5
+    assert risk.reconcile(missed) == []
+
+    # Sedda trade-id och senaste fyllnadstid överlever en omstart
+    restored, _ = engine()
+    restored.restore(risk.snapshot())
+    assert restored.last_fill_ms == start + 5
+    assert restored.reconcile(missed) == []
+    assert restored.position("tBTCUSD") == pytest.approx(0.6)
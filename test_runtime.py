@@ -0,0 +1,93 @@
+import asyncio
+import os
+import sys
+import threading
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from runtime import RESTART_ALWAYS, RESTART_NEVER, BotRuntime  # noqa: E402
+
+
+def make_runtime():
+    return BotRuntime(max_workers=2, backoff=(0.01, 0.05), use_uvloop=False)
+
+
+def test_failed_component_is_restarted_with_backoff():
+    runtime = make_runtime()
+    attempts = []
+
+    async def flaky():
+        attempts.append(len(attempts))
+        if len(attempts) < 3:
+            raise ConnectionError("tappad anslutning")
+        runtime.stop()
+
+    runtime.supervise("feed", flaky, group="feeds")
+    assert runtime.run() == 0
+    status = runtime.status()["feed"]
+    assert attempts == [0, 1, 2]
+    assert status["restarts"] == 2
+    assert "ConnectionError" in status["last_error"]
+
+
+def test_restart_policies_and_critical_failure():
+    runtime = make_runtime()
+    runs = {"once": 0, "always": 0}
+
+    async def once():
+        runs["once"] += 1
+
+    async def always():
+        runs["always"] += 1
+        await asyncio.sleep(0)
+
+    async def health():
+        await asyncio.sleep(0.05)
+        raise OSError("port upptagen")
+
+    runtime.supervise("strategy", once, group="strategy", restart=RESTART_NEVER)
+    runtime.supervise("orders", always, group="orders", restart=RESTART_ALWAYS)
+    runtime.supervise(
+        "health", health, group="health", restart=RESTART_NEVER, critical=True
+    )
+    assert runtime.run() == 1
+    assert runs["once"] == 1 and runs["always"] > 1
+    assert runtime.status()["strategy"]["state"] == "stopped"
+
+
+def test_blocking_work_and_notifications_use_bounded_executor():
+    runtime = make_runtime()
+    threads = []
+    sent = threading.Event()
+
+    def blocking():
+        threads.append(threading.current_thread().name)
+        return 42
+
+    def send(subject):
+        threads.append(threading.current_thread().name)
+        sent.set()
+
+    async def strategy():
+        assert await runtime.run_blocking(blocking) == 42
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, blocking)
+        # Notifiering från en annan tråd (t.ex. place_order i executorn)
+        await runtime.run_blocking(runtime.notify, send, "order")
+        await loop.run_in_executor(None, sent.wait, 5)
+        runtime.stop()
+
+    runtime.supervise("strategy", strategy, group="strategy", restart=RESTART_NEVER)
+    runtime.run()
+    assert sent.is_set()
+    assert len(threads) == 3
+    assert all(name.startswith("bot-worker") for name in threads)
+    assert runtime.executor._max_workers == 2
+
+
+def test_notify_outside_runtime_runs_directly():
+    runtime = make_runtime()
+    calls = []
+    assert runtime.notify(calls.append, "direkt")
+    assert calls == ["direkt"]
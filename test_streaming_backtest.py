@@ -0,0 +1,107 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import talib
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_engine import simulate  # noqa: E402
+from fvg import fvg_signals  # noqa: E402
+from indicators import calculate_indicators  # noqa: E402
+from streaming_backtest import (  # noqa: E402
+    IndicatorState,
+    compute_mean_atr,
+    streaming_backtest,
+)
+
+PARAMS = dict(ema_length=10, volume_multiplier=1.5, atr_multiplier=0.5)
+ENGINE = dict(stop_loss_pct=0.5, take_profit_pct=0.5, amount=1.0)
+
+
+@pytest.fixture
+def candles_csv(tmp_path):
+    """Slumpvandring i ccxt-format där vissa staplar stänger under low."""
+    rng = np.random.default_rng(11)
+    n = 3_000
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 2e-3, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * 1.002
+    low = np.minimum(open_, close) * 0.998
+    outside = rng.random(n) < 0.1
+    low[outside] = close[outside] * 1.001
+    volume = rng.uniform(1, 10, n)
+    volume[outside] *= 5
+    frame = pd.DataFrame(
+        {
+            "timestamp": 1_700_000_000_000 + np.arange(n, dtype=np.int64) * 60_000,
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume,
+        }
+    )
+    path = tmp_path / "candles.csv"
+    frame.to_csv(path, index=False)
+    return path
+
+
+def in_memory(path):
+    data = pd.read_csv(path)
+    data["datetime"] = pd.to_datetime(data["timestamp"], unit="ms", utc=True)
+    data = calculate_indicators(data, PARAMS["ema_length"], 1.5, 0, 23)
+    longs, shorts = fvg_signals(data, PARAMS["atr_multiplier"], 100)
+    return data, simulate(
+        data["timestamp"].to_numpy(),
+        data["open"].to_numpy(),
+        data["high"].to_numpy(),
+        data["low"].to_numpy(),
+        data["close"].to_numpy(),
+        longs,
+        shorts,
+        **ENGINE,
+    )
+
+
+def test_incremental_indicators_match_calculate_indicators(candles_csv):
+    data, _ = in_memory(candles_csv)
+    state = IndicatorState(PARAMS["ema_length"], 1.5, 0, 23)
+    raw = pd.read_csv(candles_csv)
+    raw["datetime"] = pd.to_datetime(raw["timestamp"], unit="ms", utc=True)
+    blocks = raw.groupby(np.arange(len(raw)) // 7)
+    parts = [state.update(block) for _, block in blocks]
+    streamed = pd.concat(parts)
+    # EMA följer talib exakt, även över blockgränser
+    np.testing.assert_array_equal(
+        streamed["ema"].to_numpy(), talib.EMA(raw["close"].to_numpy(), 10)
+    )
+    np.testing.assert_allclose(streamed["atr"], data["atr"], rtol=1e-12)
+    np.testing.assert_allclose(streamed["avg_volume"], data["avg_volume"], rtol=1e-12)
+    np.testing.assert_array_equal(streamed["high_volume"], data["high_volume"])
+
+
+@pytest.mark.parametrize("chunk_size", [7, 97, 1_000, 10_000])
+def test_streaming_matches_in_memory(candles_csv, chunk_size):
+    data, expected = in_memory(candles_csv)
+    assert compute_mean_atr(candles_csv, chunk_size) == pytest.approx(
+        data["atr"].mean(), rel=1e-12
+    )
+    result = streaming_backtest(
+        candles_csv, chunk_size=chunk_size, keep_curves=True, **PARAMS, **ENGINE
+    )
+    assert expected.stats["trades"] > 0
+    for name, column in expected.trades.items():
+        np.testing.assert_array_equal(column, result.trades[name])
+    np.testing.assert_allclose(result.equity, expected.equity)
+    assert result.stats["trades"] == expected.stats["trades"]
+
+
+def test_streaming_without_curves_keeps_stats(candles_csv):
+    _, expected = in_memory(candles_csv)
+    result = streaming_backtest(candles_csv, chunk_size=500, **PARAMS, **ENGINE)
+    assert len(result.equity) == 0
+    assert result.stats["final_equity"] == pytest.approx(expected.stats["final_equity"])
@@ -0,0 +1,110 @@
+import logging
+import os
+import queue
+import sys
+import threading
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from structured_logging import (  # noqa: E402
+    NonBlockingQueueHandler,
+    StructuredFormatter,
+    StructuredLogger,
+    setup_logging,
+)
+
+
+class Counted:
+    """Räknar hur många gånger argumentet formateras."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return "counted"
+
+
+def make_logger(name):
+    logger = logging.getLogger(f"test_structured_logging.{name}")
+    logger.propagate = False
+    logger.handlers.clear()
+    return logger
+
+
+def test_disabled_level_formats_nothing():
+    logger = make_logger("disabled")
+    log = StructuredLogger(logger, use_colors=False, level="INFO")
+    arg = Counted()
+    built = []
+
+    log.debug("rad %s", arg)
+    log.debug(lambda: built.append(1) or "dyrt meddelande")
+    assert arg.calls == 0
+    assert built == []
+
+
+def test_lazy_arguments_and_category(tmp_path):
+    logger = make_logger("lazy")
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    log = StructuredLogger(logger, use_colors=False, level="DEBUG")
+
+    log.trade("köp %s @ %.1f", "BTC", 30000)
+    log.info("testläge", category="TEST")
+    log.debug(lambda: "beräknat")
+    log.separator("=", 5)
+
+    assert [r.getMessage() for r in records] == [
+        "köp BTC @ 30000.0",
+        "testläge",
+        "beräknat",
+        "=====",
+    ]
+    assert [r.category for r in records] == ["TRADE", "TEST", "DEBUG", ""]
+    # Posten pekar på anroparen, inte på StructuredLogger
+    assert records[0].funcName == "test_lazy_arguments_and_category"
+
+    formatter = StructuredFormatter(use_colors=False)
+    assert formatter.format(records[0]).endswith("[TRADE]      köp BTC @ 30000.0")
+    assert formatter.format(records[3]) == "====="
+    colored = StructuredFormatter(use_colors=True).format(records[0])
+    assert colored.startswith("\033[35m") and colored.endswith("\033[0m")
+
+
+def test_setup_logging_writes_from_background_thread(tmp_path):
+    logger = make_logger("queued")
+    log_file = tmp_path / "bot.log"
+    log = StructuredLogger(logger, use_colors=False, level="INFO")
+    listener = setup_logging(logger, str(log_file), use_json=False)
+    writers = []
+    for handler in listener.handlers:
+        emit = handler.emit
+        handler.emit = lambda record, emit=emit: (
+            writers.append(threading.current_thread()),
+            emit(record),
+        )
+    try:
+        assert [type(h) for h in logger.handlers] == [NonBlockingQueueHandler]
+        log.order("order %s lagd", 42)
+        log.debug("syns inte")
+    finally:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    content = log_file.read_text()
+    assert "INFO order 42 lagd" in content
+    assert "syns inte" not in content
+    assert writers and threading.current_thread() not in writers
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "msg", None, None)
+    handler.handle(record)
+    handler.handle(record)
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
@@ -0,0 +1,162 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from candles import OHLCV_FIELDS  # noqa: E402
+from trade_bars import (  # noqa: E402
+    TickBarBuilder,
+    TradeBarBuilder,
+    TimeBarBuilder,
+    TradeBars,
+    VolumeBarBuilder,
+    make_builder,
+)
+
+START = 1_700_000_000_000
+
+
+def make_trades(n, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = START + np.cumsum(rng.integers(0, 700, n))
+    prices = 30_000 * np.exp(np.cumsum(rng.normal(0, 1e-4, n)))
+    amounts = rng.lognormal(-3, 1, n) * rng.choice([-1, 1], n)
+    return timestamps, prices, amounts
+
+
+def reference(keys, starts_at, prices, volumes):
+    # Långsam referens: en stapel per sammanhängande nyckel
+    bars = []
+    for key, ts, price, volume in zip(keys, starts_at, prices, volumes):
+        if bars and bars[-1][0] == key:
+            bar = bars[-1]
+            bar[3] = max(bar[3], price)
+            bar[4] = min(bar[4], price)
+            bar[5] = price
+            bar[6] += volume
+        else:
+            bars.append([key, ts, price, price, price, price, volume])
+    return np.array([bar[1:] for bar in bars])
+
+
+def as_rows(candles):
+    columns = [candles.timestamps] + [getattr(candles, f) for f in OHLCV_FIELDS]
+    return np.column_stack(columns)
+
+
+@pytest.mark.parametrize("spec", ["5s", "vol:0.5", "tick:7"])
+def test_add_and_add_many_match_reference(spec):
+    timestamps, prices, amounts = make_trades(2000)
+    volumes = np.abs(amounts)
+    if spec == "5s":
+        keys = timestamps // 5000
+        starts_at = keys * 5000
+    elif spec == "vol:0.5":
+        keys = (np.r_[0.0, np.cumsum(volumes[:-1])] // 0.5).astype(int)
+        starts_at = timestamps
+    else:
+        keys = np.arange(len(timestamps)) // 7
+        starts_at = timestamps
+    expected = reference(keys, starts_at, prices, volumes)
+
+    one = make_builder(spec, capacity=5000)
+    closed = sum(one.add(*trade) for trade in zip(timestamps, prices, amounts))
+    assert closed == len(one) >= len(expected) - 1
+    np.testing.assert_allclose(as_rows(one.candles()), expected[:closed])
+    np.testing.assert_allclose(as_rows(one.candles(partial=True)), expected)
+
+    # Batchvis i ojämna delar ger samma staplar
+    many = make_builder(spec, capacity=5000)
+    bounds = [0, 1, 2, 500, 501, 1337, 2000]
+    closed = 0
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        part = slice(lo, hi)
+        closed += many.add_many(timestamps[part], prices[part], amounts[part])
+    assert closed == len(many) == len(one)
+    np.testing.assert_allclose(as_rows(many.candles(partial=True)), expected)
+
+
+def test_make_builder():
+    assert isinstance(make_builder("1s"), TimeBarBuilder)
+    assert make_builder("15s").interval_ms == 15_000
+    assert make_builder("1m").interval_ms == 60_000
+    assert isinstance(make_builder("vol:2.5"), VolumeBarBuilder)
+    assert isinstance(make_builder("tick:100"), TickBarBuilder)
+    for spec in ("4x", "vol:0", "vol:abc", "tick:", "s"):
+        with pytest.raises(ValueError):
+            make_builder(spec)
+    # Basen saknar stapelnyckel och kan inte skapas direkt
+    with pytest.raises(TypeError):
+        TradeBarBuilder("5s")
+
+
+def test_capacity_keeps_latest_bars():
+    timestamps, prices, amounts = make_trades(5000, seed=1)
+    builder = make_builder("tick:3", capacity=50)
+    for trade in zip(timestamps, prices, amounts):
+        builder.add(*trade)
+    reference_builder = make_builder("tick:3", capacity=10_000)
+    reference_builder.add_many(timestamps, prices, amounts)
+    assert len(builder) == 50
+    np.testing.assert_allclose(
+        as_rows(builder.candles()), as_rows(reference_builder.candles())[-50:]
+    )
+    # Stor batch: bara de senaste capacity staplarna behålls
+    builder.add_many(timestamps, prices, amounts)
+    assert len(builder) == 50
+
+
+def test_time_bars_flush_and_late_trades():
+    builder = make_builder("1s")
+    builder.add(START + 100, 10.0, 1.0)
+    # En sen trade räknas till den öppna stapeln
+    builder.add(START - 2000, 12.0, -1.0)
+    assert builder.flush(START + 999) == 0
+    assert builder.flush(START + 1000) == 1
+    bar = as_rows(builder.candles())[-1]
+    np.testing.assert_allclose(bar, [START, 10.0, 12.0, 10.0, 12.0, 2.0])
+    assert builder.flush(START + 5000) == 0
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_late_trade_after_flush_opens_no_duplicate_bar(batch):
+    builder = make_builder("1s")
+    builder.add(START, 10.0, 1.0)
+    builder.add(START + 500, 11.0, 1.0)
+    assert builder.flush(START + 1000) == 1
+    # Sen trade i den redan stängda sekunden räknas till nästa stapel
+    late = [START + 900, START + 1100], [12.0, 13.0], [1.0, 1.0]
+    if batch:
+        builder.add_many(*late)
+    else:
+        for trade in zip(*late):
+            builder.add(*trade)
+    bars = as_rows(builder.candles(partial=True))
+    np.testing.assert_array_equal(bars[:, 0], [START, START + 1000])
+    np.testing.assert_allclose(bars[-1], [START + 1000, 12.0, 13.0, 12.0, 13.0, 2.0])
+
+
+def test_trade_bars_publishes_and_skips_seen_trades():
+    bars = TradeBars(["1s", "tick:2"])
+    published = []
+    bars.subscribe(lambda spec, builder: published.append((spec, len(builder))))
+    # Snapshot: nyaste först
+    bars.add_snapshot([[3, START + 1500, 0.1, 101.0], [2, START + 200, -0.2, 100.0]])
+    # Tickstapeln är full efter två trades och stängs direkt
+    assert published == [("1s", 1), ("tick:2", 1)]
+    published.clear()
+    # Samma trade igen ("tu" efter "te") och äldre snapshot hoppas över
+    bars.add(3, START + 1500, 0.1, 101.0)
+    bars.add_snapshot([[3, START + 1500, 0.1, 101.0]])
+    assert published == []
+    bars.add(4, START + 1600, 0.3, 102.0)
+    bars.add(5, START + 1700, 0.3, 103.0)
+    assert published == [("tick:2", 2)]
+    published.clear()
+    bars.flush(START + 2000)
+    assert published == [("1s", 2)]
+    assert bars.last_id == 5
@@ -0,0 +1,212 @@
+import os
+import sys
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from triggers import STOP_LOSS, TAKE_PROFIT, TriggerEngine  # noqa: E402
+
+
+def test_long_bracket_fires_stop_loss_and_cancels_take_profit():
+    engine = TriggerEngine()
+    engine.add_bracket("BTC/USD", "buy", 0.5, stop_loss=95.0, take_profit=110.0)
+    assert len(engine) == 2
+    assert engine.on_tick("BTC/USD", 100.0) == []
+    assert engine.levels("BTC/USD") == {"above": 110.0, "below": 95.0}
+
+    fired = engine.on_tick("BTC/USD", 94.0)
+    assert [(t.kind, t.side, t.amount) for t in fired] == [(STOP_LOSS, "sell", 0.5)]
+    # OCO: take-profit avaktiveras när stop-loss utlöses
+    assert len(engine) == 0
+    assert engine.on_tick("BTC/USD", 120.0) == []
+
+
+def test_short_bracket_fires_take_profit():
+    engine = TriggerEngine()
+    engine.add_bracket("BTC/USD", "sell", 1.0, stop_loss=105.0, take_profit=90.0)
+    fired = engine.on_tick("BTC/USD", 89.5)
+    assert [(t.kind, t.side) for t in fired] == [(TAKE_PROFIT, "buy")]
+    assert engine.on_tick("BTC/USD", 106.0) == []
+
+
+def test_only_breached_levels_fire_in_price_order():
+    engine = TriggerEngine()
+    for level in (90.0, 80.0, 85.0, 70.0):
+        engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=level)
+    engine.add_bracket("ETH/USD", "buy", 1.0, stop_loss=99.0)
+    fired = engine.on_tick("BTC/USD", 82.0)
+    assert [t.price for t in fired] == [90.0, 85.0]
+    assert len(engine) == 3
+
+
+def test_cancel_and_compaction():
+    engine = TriggerEngine()
+    groups = [
+        engine.add_bracket("BTC/USD", "buy", 1.0, 50.0 + i, 150.0 + i)
+        for i in range(10)
+    ]
+    for group in groups[:8]:
+        assert engine.cancel(group)
+    assert not engine.cancel(groups[0])
+    assert len(engine) == 4
+    assert engine.levels("BTC/USD") == {"above": 158.0, "below": 59.0}
+    assert [t.price for t in engine.on_tick("BTC/USD", 158.5)] == [158.0]
+
+
+def test_pending_bracket_is_armed_by_fill():
+    engine = TriggerEngine()
+    engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=95.0, order_id="42")
+    assert engine.on_tick("BTC/USD", 90.0) == []
+    assert engine.arm(42) == 1
+    assert engine.arm(42) == 0
+    assert len(engine.on_tick("BTC/USD", 90.0)) == 1
+
+
+def test_pair_is_retired_only_after_confirm():
+    engine = TriggerEngine()
+    group = engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=95.0, take_profit=110)
+    (fired,) = engine.on_tick("BTC/USD", 94.0)
+    # Exit-ordern på väg: inget i paret kan utlösas igen
+    assert engine.on_tick("BTC/USD", 90.0) == []
+    assert engine.on_tick("BTC/USD", 120.0) == []
+    assert engine.snapshot()["groups"] != []
+    assert engine.confirm(fired)
+    assert not engine.confirm(fired)
+    assert engine.snapshot() == {"groups": []}
+    assert not engine.cancel(group)
+
+
+def test_failed_exit_rearms_pair():
+    engine = TriggerEngine()
+    engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=95.0, take_profit=110.0)
+    (fired,) = engine.on_tick("BTC/USD", 94.0)
+    assert len(engine) == 0
+    assert engine.rearm(fired)
+    assert len(engine) == 2
+    assert engine.levels("BTC/USD") == {"above": 110.0, "below": 95.0}
+    # Nivån är fortfarande passerad: nästa tick försöker igen
+    (retry,) = engine.on_tick("BTC/USD", 94.5)
+    assert (retry.kind, retry.failures) == (STOP_LOSS, 1)
+    assert engine.rearm(retry)
+    assert engine.confirm(engine.on_tick("BTC/USD", 111.0)[0])
+    assert len(engine) == 0
+
+
+def test_cancel_while_exit_in_flight():
+    engine = TriggerEngine()
+    group = engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=95.0)
+    (fired,) = engine.on_tick("BTC/USD", 94.0)
+    assert engine.cancel(group)
+    assert not engine.rearm(fired)
+    assert engine.on_tick("BTC/USD", 90.0) == []
+
+
+def test_order_symbols_and_ticker_symbols_share_book():
+    ids = {"BTC/USD": "tBTCUSD", "ETH/USD": "tETHUSD"}
+    engine = TriggerEngine(normalize=lambda symbol: ids.get(symbol, symbol))
+    group = engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=95.0)
+    engine.add_bracket("ETH/USD", "sell", 2.0, take_profit=10.0, order_id="9")
+    assert engine.markets() == {"tBTCUSD", "tETHUSD"}
+    (fired,) = engine.on_tick("tBTCUSD", 94.0)
+    # Exit-ordern läggs med ordersymbolen
+    assert fired.symbol == "BTC/USD"
+    assert engine.rearm(fired)
+    assert engine.levels("BTC/USD") == {"above": None, "below": 95.0}
+    assert engine.cancel(group)
+    assert engine.markets() == {"tETHUSD"}
+
+
+def test_fill_before_bracket_arms_at_once():
+    engine = TriggerEngine()
+    # te hinner fram innan place_order registrerat paret
+    assert engine.arm("5", -0.4, trade_id=1) == 0
+    engine.add_bracket("BTC/USD", "sell", 1.0, stop_loss=105.0, order_id=5)
+    (fired,) = engine.on_tick("BTC/USD", 106.0)
+    assert (fired.side, fired.amount) == ("buy", 0.4)
+
+
+def test_partial_fills_size_the_exit():
+    engine = TriggerEngine()
+    engine.add_bracket("BTC/USD", "buy", 1.0, 95.0, 110.0, order_id="8")
+    assert engine.arm(8, 0.25, trade_id=1) == 2
+    # tu för samma fyllnad räknas inte igen
+    assert engine.arm(8, 0.25, trade_id=1) == 0
+    assert engine.arm(8, 0.5, trade_id=2) == 0
+    assert engine.arm(8, 0.5, trade_id=3) == 0
+    (fired,) = engine.on_tick("BTC/USD", 94.0)
+    assert fired.amount == 1.0
+
+
+def test_cancelled_order_drops_pending_pair():
+    engine = TriggerEngine()
+    engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=95.0, order_id="1")
+    engine.add_bracket("ETH/USD", "buy", 1.0, stop_loss=9.0, order_id="2")
+    engine.arm("2", 0.3, trade_id=7)
+    assert engine.cancel_order(1)
+    assert not engine.cancel_order(1)
+    # Delfylld order: paret behålls med den fyllda mängden
+    assert not engine.cancel_order(2)
+    assert engine.markets() == {"ETH/USD"}
+    assert [g[0][4] for g in engine.snapshot()["groups"]] == [0.3]
+
+
+def test_snapshot_restore():
+    engine = TriggerEngine()
+    engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=95.0, take_profit=110.0)
+    engine.add_bracket("BTC/USD", "sell", 2.0, take_profit=80.0, order_id=7)
+    cancelled = engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=50.0)
+    engine.cancel(cancelled)
+
+    restored = TriggerEngine()
+    assert restored.restore(engine.snapshot()) == 2
+    # Vilande tills reconcile(); sparas ändå oförändrade i en ny checkpoint
+    assert len(restored) == 0
+    assert restored.snapshot() == engine.snapshot()
+    assert restored.reconcile() == 0
+    assert len(restored) == 2
+    restored.arm(7)
+    fired = restored.on_tick("BTC/USD", 79.0)
+    assert sorted((t.kind, t.side, t.amount) for t in fired) == [
+        (STOP_LOSS, "sell", 1.0),
+        (TAKE_PROFIT, "buy", 2.0),
+    ]
+
+
+def test_restore_checks_positions_and_open_orders():
+    engine = TriggerEngine()
+    engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=95.0, take_profit=110.0)
+    engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=90.0)
+    engine.add_bracket("ETH/USD", "buy", 1.0, stop_loss=9.0)
+    engine.add_bracket("ETH/USD", "sell", 1.0, take_profit=8.0, order_id="7")
+    engine.add_bracket("ETH/USD", "sell", 1.0, take_profit=8.0, order_id="8")
+    positions = {"BTC/USD": 1.5, "ETH/USD": -2.0}
+
+    restored = TriggerEngine()
+    restored.restore(engine.snapshot())
+    # Positionerna och ordrarna kontrolleras först efter återanslutningen
+    assert restored.on_tick("BTC/USD", 89.0) == []
+    dropped = restored.reconcile(
+        position=lambda symbol: positions.get(symbol, 0.0),
+        is_open=lambda order_id: order_id == "7",
+    )
+    # ETH-positionen är kort: den långa stop-lossen och order 8 släpps
+    assert dropped == 2
+    assert restored.markets() == {"BTC/USD", "ETH/USD"}
+    assert restored.on_tick("ETH/USD", 5.0) == []
+    # Exit-mängderna begränsas till positionen (1.0 + 0.5)
+    fired = restored.on_tick("BTC/USD", 89.0)
+    assert sorted((t.price, t.amount) for t in fired) == [(90.0, 0.5), (95.0, 1.0)]
+    assert restored.arm("7") == 1
+
+
+def test_order_filled_while_down_arms_on_reconcile():
+    engine = TriggerEngine()
+    engine.add_bracket("BTC/USD", "buy", 1.0, stop_loss=95.0, order_id="7")
+
+    restored = TriggerEngine()
+    restored.restore(engine.snapshot())
+    # Fyllnaden hämtas via REST innan ordern hunnit stämmas av
+    assert restored.arm("7", 0.4, trade_id=1) == 0
+    assert restored.reconcile(is_open=lambda order_id: False) == 0
+    fired = restored.on_tick("BTC/USD", 94.0)
+    assert [(t.kind, t.amount) for t in fired] == [(STOP_LOSS, 0.4)]
@@ -0,0 +1,125 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_engine import simulate  # noqa: E402
+from candles import CandleArray, compute_indicators  # noqa: E402
+from fvg import FVG_INDICATORS, fvg_signals  # noqa: E402
+from walk_forward import expand_grid, make_windows, walk_forward  # noqa: E402
+
+
+def synthetic_ohlcv(n=600, seed=3):
+    """Slumpvandring med korta vekar, så att FVG bildas och återtestas."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 6e-3, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * 1.0005
+    low = np.minimum(open_, close) * 0.9995
+    volume = rng.uniform(1, 10, n)
+    volume[rng.random(n) < 0.2] *= 5
+    return pd.DataFrame(
+        {
+            "datetime": pd.date_range("2024-01-01", periods=n, freq="h"),
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume,
+        }
+    )
+
+
+def test_make_windows_rolling_and_anchored():
+    assert make_windows(10, 4, 2) == [(0, 4, 6), (2, 6, 8), (4, 8, 10)]
+    assert make_windows(10, 4, 3, step=3, anchored=True) == [(0, 4, 7), (0, 7, 10)]
+    assert make_windows(5, 4, 2) == []
+
+
+def test_expand_grid_fills_defaults_and_rejects_unknown():
+    grid = expand_grid({"ema_length": [10, 20], "atr_multiplier": [0.5]})
+    assert len(grid) == 2
+    assert {p["ema_length"] for p in grid} == {10, 20}
+    assert all(p["take_profit_pct"] == 4.0 for p in grid)
+    with pytest.raises(ValueError):
+        expand_grid({"rsi_length": [14]})
+
+
+def test_walk_forward_report_in_process():
+    data = synthetic_ohlcv()
+    report = walk_forward(
+        data,
+        {"ema_length": [5, 20], "atr_multiplier": [0.0, 1.0]},
+        train_size=200,
+        test_size=100,
+        processes=1,
+        engine_params={"amount": 1.0},
+    )
+    assert report["oos"]["windows"] == 4
+    assert not report["errors"]
+    # Den sammanfogade kurvan täcker exakt alla teststaplar
+    assert len(report["equity"]) == 4 * 100
+    assert report["oos"]["net_pnl"] == pytest.approx(report["equity"][-1] - 10_000.0)
+    assert sum(p["windows"] for p in report["param_stability"]) == 4
+    for window in report["windows"]:
+        assert window["test"][0] == window["train"][1]
+    assert report["oos"]["trades"] > 0
+
+
+def test_walk_forward_process_pool_matches_in_process():
+    data = synthetic_ohlcv(n=400)
+    kwargs = dict(
+        param_grid={"ema_length": [5, 20]},
+        train_size=200,
+        test_size=100,
+        engine_params={"amount": 1.0},
+    )
+    serial = walk_forward(data, processes=1, **kwargs)
+    pooled = walk_forward(data, processes=2, **kwargs)
+    assert serial["oos"] == pooled["oos"]
+    np.testing.assert_array_equal(serial["equity"], pooled["equity"])
+
+
+def test_test_window_sees_gaps_from_training_bars():
+    # Testdelen ska få samma signaler som en körning över hela fönstret
+    data = synthetic_ohlcv(n=300, seed=2)
+    params = {"atr_multiplier": [0.0], "lookback": [20]}
+    report = walk_forward(data, params, train_size=200, test_size=100, processes=1)
+    best = expand_grid(params)[0]
+    full = compute_indicators(
+        CandleArray.from_frame(data),
+        best["ema_length"],
+        best["volume_multiplier"],
+        0,
+        23,
+        indicators=FVG_INDICATORS,
+    )
+    train_atr = float(np.nanmean(full["atr"][:200]))
+    long_signal, short_signal = fvg_signals(
+        full, best["atr_multiplier"], best["lookback"], mean_atr=train_atr
+    )
+    test = full[200:]
+    expected = simulate(
+        test.timestamps,
+        test.open,
+        test.high,
+        test.low,
+        test.close,
+        long_signal[200:],
+        short_signal[200:],
+        stop_loss_pct=best["stop_loss_pct"],
+        take_profit_pct=best["take_profit_pct"],
+    )
+    window = report["windows"][0]
+    assert window["test_trades"] == expected.trade_records()
+    np.testing.assert_allclose(report["equity"], expected.equity)
+
+
+def test_walk_forward_requires_enough_data():
+    with pytest.raises(ValueError):
+        walk_forward(synthetic_ohlcv(n=50), {}, train_size=40, test_size=20)
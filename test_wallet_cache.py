@@ -0,0 +1,96 @@
+import os
+import sys
+
+# Sätt sys.path för att möjliggöra import av Tradingbot-moduler
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from wallet_cache import WalletCache  # noqa: E402
+
+
+def test_snapshot_and_update_from_websocket():
+    cache = WalletCache(wallet_type="exchange")
+    cache.handle_message(
+        [
+            0,
+            "ws",
+            [
+                ["exchange", "USD", 1000.0, 0, 900.0, None, None],
+                ["exchange", "BTC", 0.5, 0, None, None, None],
+                ["margin", "USD", 50.0, 0, 50.0, None, None],
+            ],
+        ]
+    )
+    balance = cache.as_balance()
+    assert balance["total"] == {"USD": 1000.0, "BTC": 0.5}
+    assert balance["USD"]["used"] == 100.0
+    # Bitfinex skickar null för tillgängligt saldo -> okänt
+    assert balance["BTC"]["free"] is None
+    assert balance["cache"]["source"] == "websocket"
+
+    assert cache.handle_message([0, "wu", ["exchange", "BTC", 0.75, 0, 0.7]])
+    assert cache.as_balance()["BTC"] == {"free": 0.7, "used": 0.75 - 0.7, "total": 0.75}
+
+
+def test_ignores_other_channels_and_messages():
+    cache = WalletCache()
+    assert not cache.handle_message([0, "oc", [1, 2, 3]])
+    assert not cache.handle_message([5, "ws", []])
+    assert not cache.handle_message({"event": "auth"})
+    assert cache.age() is None
+
+
+def test_freshness_and_invalidate():
+    cache = WalletCache()
+    assert not cache.is_fresh(30)
+    cache.seed_from_balance(
+        {"free": {"USD": 5.0}, "used": {"USD": 1.0}, "total": {"USD": 6.0}}
+    )
+    assert cache.is_fresh(30)
+    assert cache.as_balance()["cache"]["source"] == "rest"
+    # touch förlänger bara websocket-data
+    cache.invalidate()
+    cache.touch()
+    assert not cache.is_fresh(30)
+
+
+def test_currency_code_mapping():
+    cache = WalletCache(currency_code=lambda code: {"UST": "USDT"}.get(code, code))
+    cache.apply_snapshot([["exchange", "UST", 10.0, 0, 10.0]])
+    assert cache.as_balance()["total"] == {"USDT": 10.0}
+
+
+def test_websocket_balances_are_shared_with_other_processes(tmp_path):
+    path = str(tmp_path / "wallets.json")
+    bot = WalletCache(share_path=path)
+    api = WalletCache(share_path=path)
+    assert not api.load_shared()
+    bot.apply_snapshot([["exchange", "USD", 100.0, 0, 80.0]])
+    assert api.load_shared()
+    assert api.is_fresh(30)
+    assert api.as_balance()["USD"] == {"free": 80.0, "used": 20.0, "total": 100.0}
+    # Inget nytt sedan senaste läsningen
+    assert not api.load_shared()
+    bot.apply_update(["exchange", "USD", 90.0, 0, 90.0])
+    assert api.load_shared()
+    assert api.as_balance()["total"] == {"USD": 90.0}
+    # Tappad anslutning i boten: den delade datan är inte längre färsk
+    bot.invalidate()
+    assert not WalletCache(share_path=path).load_shared()
+    # ...och kopian i API:t invalideras vid nästa läsning
+    assert not api.load_shared()
+    assert not api.is_fresh(30)
+    # Egna REST-saldon påverkas inte av den delade filen
+    api.seed_from_balance({"total": {"USD": 90.0}})
+    os.utime(path, ns=(0, 0))
+    assert not api.load_shared()
+    assert api.is_fresh(30)
+
+
+def test_invalidate_by_source():
+    cache = WalletCache()
+    cache.apply_snapshot([["exchange", "USD", 1.0, 0, 1.0]])
+    cache.invalidate(source="rest")
+    assert cache.is_fresh(30)
+    cache.seed_from_balance({"total": {"USD": 1.0}})
+    cache.invalidate(source="rest")
+    assert not cache.is_fresh(30)
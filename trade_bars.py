@@ -0,0 +1,412 @@
+"""
+Staplar byggda lokalt från trades-kanalen (finare än börsens 1m-candles).
+
+Varje byggare tilldelar varje trade en stapelnyckel och stänger den öppna
+stapeln när nyckeln ändras:
+
+- tidsstaplar (``"1s"``, ``"5s"``, ``"15s"``): nyckel ``mts // intervall``
+- volymstaplar (``"vol:2.5"``): nyckel ``kumulativ volym före traden // gräns``
+- tickstaplar (``"tick:100"``): nyckel ``antal trades före traden // antal``
+
+En trade delas aldrig mellan staplar, så en volymstapel kan bli något större än
+gränsen. Stängda staplar skrivs till förallokerade kolumnarrayer (plats för
+``2 * capacity``; de äldsta flyttas bort när arrayerna är fulla), så
+``candles()`` är en vy utan kopiering i samma format som övriga staplar
+(``CandleArray``). En batch trades (t.ex. kanalens snapshot) aggregeras
+vektoriserat med ``add_many``; enstaka trades går via ``add`` utan numpy.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from candles import OHLCV_FIELDS, CandleArray
+
+_TIME_UNITS = {"s": 1_000, "m": 60_000}
+
+DEFAULT_SPECS = ("1s", "5s", "15s")
+
+
+class TradeBarBuilder(ABC):
+    """
+    Abstrakt bas för stapelbyggarna; underklasser anger stapelnyckeln per trade.
+
+    Args:
+        spec: Stapeldefinitionen (t.ex. "5s"), används som namn
+        capacity: Antal stängda staplar som behålls
+        dtype: Flyttalstyp för kolumnerna
+    """
+
+    def __init__(self, spec: str, capacity: int = 500, dtype=np.float64):
+        self.spec = spec
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self._timestamps = np.empty(2 * capacity, np.int64)
+        self._columns = {
+            field: np.empty(2 * capacity, self.dtype) for field in OHLCV_FIELDS
+        }
+        self._start = 0
+        self._end = 0
+        # Den öppna stapeln: nyckel, tidsstämpel och OHLCV som Python-tal
+        self._key: Optional[int] = None
+        self._bar = [0, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+    def __len__(self) -> int:
+        """Antal stängda staplar."""
+        return self._end - self._start
+
+    # --- Stapelnycklar (underklasser) ---
+
+    @abstractmethod
+    def _next_key(self, timestamp: int, volume: float) -> int:
+        """Stapelnyckeln för en trade; en ny nyckel stänger den öppna stapeln."""
+
+    @abstractmethod
+    def _next_keys(self, timestamps: np.ndarray, volumes: np.ndarray) -> np.ndarray:
+        """Som _next_key för en hel batch (samma nycklar som trade för trade)."""
+
+    def _bar_timestamp(self, key: int, timestamp: int) -> int:
+        # Stapelns tidsstämpel: första tradens (tids-staplar: hinkens början)
+        return timestamp
+
+    # --- Trades ---
+
+    def add(self, timestamp: int, price: float, amount: float) -> int:
+        """
+        Lägger till en trade (amount < 0 för sälj).
+
+        Returns:
+            Antal staplar som stängdes (0 eller 1)
+        """
+        volume = abs(amount)
+        key = self._next_key(timestamp, volume)
+        bar = self._bar
+        closed = 0
+        if key == self._key:
+            if price > bar[2]:
+                bar[2] = price
+            elif price < bar[3]:
+                bar[3] = price
+            bar[4] = price
+            bar[5] += volume
+        else:
+            closed = self._close()
+            self._key = key
+            start = self._bar_timestamp(key, timestamp)
+            self._bar = [start, price, price, price, price, volume]
+        if self._full():
+            closed += self._close()
+        return closed
+
+    def add_many(self, timestamps, prices, amounts) -> int:
+        """
+        Lägger till trades sorterade på tid (vektoriserat).
+
+        Returns:
+            Antal staplar som stängdes
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if not len(timestamps):
+            return 0
+        prices = np.asarray(prices, dtype=np.float64)
+        volumes = np.abs(np.asarray(amounts, dtype=np.float64))
+        keys = self._next_keys(timestamps, volumes)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)] - 1
+        highs = np.maximum.reduceat(prices, starts)
+        lows = np.minimum.reduceat(prices, starts)
+        sums = np.add.reduceat(volumes, starts)
+        closes = prices[ends]
+        first = 0
+        bar = self._bar
+        if self._key is not None and int(keys[0]) == self._key:
+            # Första gruppen fortsätter den öppna stapeln
+            bar[2] = max(bar[2], float(highs[0]))
+            bar[3] = min(bar[3], float(lows[0]))
+            bar[4] = float(closes[0])
+            bar[5] += float(sums[0])
+            first = 1
+        if first == len(starts):
+            return self._close() if self._full() else 0
+        closed = self._close()
+        last = len(starts) - 1
+        bar_starts = [
+            self._bar_timestamp(int(keys[i]), int(timestamps[i])) for i in starts
+        ]
+        self._append(
+            np.asarray(bar_starts[first:last], np.int64),
+            prices[starts[first:last]],
+            highs[first:last],
+            lows[first:last],
+            closes[first:last],
+            sums[first:last],
+        )
+        self._key = int(keys[-1])
+        self._bar = [
+            bar_starts[last],
+            float(prices[starts[last]]),
+            float(highs[last]),
+            float(lows[last]),
+            float(closes[last]),
+            float(sums[last]),
+        ]
+        closed += last - first
+        if self._full():
+            closed += self._close()
+        return closed
+
+    def _full(self) -> bool:
+        # Volym- och tickstaplar stängs så fort de är fulla
+        return False
+
+    def flush(self, now: int) -> int:
+        """Stänger den öppna stapeln om den är färdig vid now (tidsstaplar)."""
+        return 0
+
+    def _close(self) -> int:
+        if self._key is None:
+            return 0
+        timestamp, *ohlcv = self._bar
+        self._append(np.array([timestamp], np.int64), *(np.array([v]) for v in ohlcv))
+        self._key = None
+        return 1
+
+    def _append(self, timestamps, *ohlcv):
+        n = len(timestamps)
+        if not n:
+            return
+        size = len(self._timestamps)
+        if n >= self.capacity:
+            # Bara de senaste capacity staplarna behålls
+            first = n - self.capacity
+            timestamps = timestamps[first:]
+            ohlcv = [values[first:] for values in ohlcv]
+            self._start = self._end = 0
+            n = self.capacity
+        elif self._end + n > size:
+            # Flytta de senaste staplarna till början (amorterat O(1) per stapel)
+            keep = min(len(self), self.capacity - n)
+            moved = slice(self._end - keep, self._end)
+            self._timestamps[:keep] = self._timestamps[moved]
+            for values in self._columns.values():
+                values[:keep] = values[moved]
+            self._start, self._end = 0, keep
+        window = slice(self._end, self._end + n)
+        self._timestamps[window] = timestamps
+        for field, values in zip(OHLCV_FIELDS, ohlcv):
+            self._columns[field][window] = values
+        self._end = window.stop
+        if len(self) > self.capacity:
+            self._start = self._end - self.capacity
+
+    # --- Läsning ---
+
+    def candles(self, partial: bool = False) -> CandleArray:
+        """
+        De stängda staplarna (vyer, ingen kopiering); med partial=True läggs
+        den öppna stapeln till sist (kopia).
+        """
+        window = slice(self._start, self._end)
+        closed = CandleArray(
+            self._timestamps[window],
+            *(self._columns[field][window] for field in OHLCV_FIELDS),
+            dtype=self.dtype,
+        )
+        if not partial or self._key is None:
+            return closed
+        timestamp, *ohlcv = self._bar
+        return CandleArray(
+            np.r_[closed.timestamps, timestamp],
+            *(np.r_[getattr(closed, f), v] for f, v in zip(OHLCV_FIELDS, ohlcv)),
+            dtype=self.dtype,
+        )
+
+    def clear(self):
+        self._start = self._end = 0
+        self._key = None
+
+
+class TimeBarBuilder(TradeBarBuilder):
+    """Tidsstaplar som börjar på jämna multiplar av intervallet (UTC)."""
+
+    def __init__(self, spec: str, interval_ms: int, **kwargs):
+        super().__init__(spec, **kwargs)
+        self.interval_ms = interval_ms
+        # Lägsta nyckel efter flush(): intervallet efter den stängda stapeln
+        self._next_open: Optional[int] = None
+
+    def _floor(self) -> Optional[int]:
+        return self._key if self._key is not None else self._next_open
+
+    def _next_key(self, timestamp, volume):
+        key = timestamp // self.interval_ms
+        # En sen trade räknas till den öppna stapeln, eller efter flush() till
+        # nästa intervall (den stängda stapeln får ingen dubblett)
+        floor = self._floor()
+        if floor is not None and key < floor:
+            return floor
+        return key
+
+    def _next_keys(self, timestamps, volumes):
+        keys = timestamps // self.interval_ms
+        floor = self._floor()
+        if floor is not None:
+            keys = np.maximum(keys, floor)
+        return np.maximum.accumulate(keys)
+
+    def _bar_timestamp(self, key, timestamp):
+        return key * self.interval_ms
+
+    def flush(self, now: int) -> int:
+        if self._key is None or now < (self._key + 1) * self.interval_ms:
+            return 0
+        self._next_open = self._key + 1
+        return self._close()
+
+    def clear(self):
+        super().clear()
+        self._next_open = None
+
+
+class VolumeBarBuilder(TradeBarBuilder):
+    """Staplar med (minst) threshold i handlad volym."""
+
+    def __init__(self, spec: str, threshold: float, **kwargs):
+        super().__init__(spec, **kwargs)
+        self.threshold = threshold
+        self._volume = 0.0
+
+    def _next_key(self, timestamp, volume):
+        key = int(self._volume // self.threshold)
+        self._volume += volume
+        return key
+
+    def _next_keys(self, timestamps, volumes):
+        # Samma summeringsordning som _next_key, så gränserna blir identiska
+        totals = np.cumsum(np.r_[self._volume, volumes])
+        self._volume = float(totals[-1])
+        return (totals[:-1] // self.threshold).astype(np.int64)
+
+    def _full(self):
+        return self._key is not None and self._volume // self.threshold > self._key
+
+    def clear(self):
+        super().clear()
+        self._volume = 0.0
+
+
+class TickBarBuilder(TradeBarBuilder):
+    """Staplar med count trades vardera."""
+
+    def __init__(self, spec: str, count: int, **kwargs):
+        super().__init__(spec, **kwargs)
+        self.count = count
+        self._trades = 0
+
+    def _next_key(self, timestamp, volume):
+        key = self._trades // self.count
+        self._trades += 1
+        return key
+
+    def _next_keys(self, timestamps, volumes):
+        keys = (self._trades + np.arange(len(timestamps))) // self.count
+        self._trades += len(timestamps)
+        return keys
+
+    def _full(self):
+        return self._key is not None and self._trades % self.count == 0
+
+    def clear(self):
+        super().clear()
+        self._trades = 0
+
+
+def make_builder(spec: str, capacity: int = 500, dtype=np.float64) -> TradeBarBuilder:
+    """
+    Byggare för en stapeldefinition: "5s"/"1m", "vol:<volym>" eller "tick:<antal>".
+
+    Raises:
+        ValueError: Om definitionen inte känns igen
+    """
+    kind, _, value = spec.partition(":")
+    try:
+        if kind == "vol" and float(value) > 0:
+            return VolumeBarBuilder(spec, float(value), capacity=capacity, dtype=dtype)
+        if kind == "tick" and int(value) > 0:
+            return TickBarBuilder(spec, int(value), capacity=capacity, dtype=dtype)
+        amount, unit = spec[:-1], spec[-1:]
+        if not value and unit in _TIME_UNITS and amount.isdigit() and int(amount):
+            interval = int(amount) * _TIME_UNITS[unit]
+            return TimeBarBuilder(spec, interval, capacity=capacity, dtype=dtype)
+    except ValueError:
+        pass
+    raise ValueError(f"Okänd stapeldefinition: {spec}")
+
+
+class TradeBars:
+    """
+    Alla byggare för en symbol och mottagare av stängda staplar.
+
+    Trades med id som redan setts (snapshot efter återanslutning, "tu" efter
+    "te") hoppas över. Mottagare registrerade med ``subscribe`` anropas med
+    (spec, byggare) för varje byggare som stängt minst en stapel.
+
+    Args:
+        specs: Stapeldefinitioner (se make_builder)
+        capacity: Antal stängda staplar per byggare
+    """
+
+    def __init__(self, specs: Iterable[str] = DEFAULT_SPECS, capacity: int = 500):
+        self.builders: Dict[str, TradeBarBuilder] = {
+            spec: make_builder(spec, capacity) for spec in specs
+        }
+        self.last_id: Optional[int] = None
+        self.last_timestamp: Optional[int] = None
+        self._subscribers: List[Callable[[str, TradeBarBuilder], None]] = []
+
+    def subscribe(self, callback: Callable[[str, TradeBarBuilder], None]):
+        self._subscribers.append(callback)
+
+    def _publish(self, closed: Dict[str, int]):
+        for spec, count in closed.items():
+            if count:
+                for callback in self._subscribers:
+                    callback(spec, self.builders[spec])
+
+    def add(self, trade_id: int, timestamp: int, price: float, amount: float):
+        """En trade från kanalen ([ID, MTS, AMOUNT, PRICE])."""
+        if self.last_id is not None and trade_id <= self.last_id:
+            return
+        self.last_id = trade_id
+        self.last_timestamp = timestamp
+        self._publish(
+            {
+                spec: builder.add(timestamp, price, amount)
+                for spec, builder in self.builders.items()
+            }
+        )
+
+    def add_snapshot(self, trades):
+        """Kanalens snapshot: [[ID, MTS, AMOUNT, PRICE], ...] (nyaste först)."""
+        rows = np.asarray(trades, dtype=np.float64).reshape(-1, 4)
+        rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        if self.last_id is not None:
+            rows = rows[rows[:, 0] > self.last_id]
+        if not len(rows):
+            return
+        self.last_id = int(rows[-1, 0])
+        self.last_timestamp = int(rows[-1, 1])
+        timestamps = rows[:, 1].astype(np.int64)
+        self._publish(
+            {
+                spec: builder.add_many(timestamps, rows[:, 3], rows[:, 2])
+                for spec, builder in self.builders.items()
+            }
+        )
+
+    def flush(self, now: int):
+        """Stänger tidsstaplar vars intervall passerats utan nya trades."""
+        self._publish(
+            {spec: builder.flush(now) for spec, builder in self.builders.items()}
+        )
@@ -0,0 +1,538 @@
+"""
+Klientsidiga stop-loss/take-profit-triggers.
+
+``TriggerEngine`` håller nivåerna per symbol i två heapar: nivåer som utlöses
+när priset stiger till dem (take-profit för lång, stop-loss för kort position)
+i en min-heap och nivåer som utlöses när priset faller (stop-loss för lång,
+take-profit för kort) i en max-heap. Varje tick jämför bara priset med toppen
+av de två heaparna, så en tick utan utlösning kostar O(1) oavsett antal aktiva
+nivåer; att lägga till en nivå är O(log n).
+
+Stop-loss och take-profit för samma position bildar ett par (OCO): när den
+ena utlöses vilar paret medan exit-ordern läggs. ``confirm`` pensionerar paret
+när ordern lyckats; ``rearm`` aktiverar det igen om ordern misslyckades, så att
+positionen inte lämnas oskyddad. Avaktiverade nivåer tas bort lat när de
+hamnar överst, och heaparna komprimeras om fler än hälften är inaktuella.
+
+Nivåer för en limit-order kan registreras vilande och aktiveras med ``arm``
+när ordern fylls. Exit-mängden följer den fyllda mängden (delfyllnader höjer
+den stegvis), och fyllnader som kommer innan paret registrerats (``te`` före
+REST-svaret) sparas så att ``add_bracket`` armerar direkt. ``cancel_order``
+släpper ett par vars order avbröts innan något fylldes.
+
+Heaparna nycklas på normaliserad symbol (``normalize``), så att ordrar som
+anges som 'BTC/USD' och ticks från websocketflödet ('tBTCUSD') möts.
+"""
+
+import heapq
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+STOP_LOSS = "stop_loss"
+TAKE_PROFIT = "take_profit"
+
+# Antal fyllda order-id och trade-id som kommas ihåg
+_MAX_FILLS = 1000
+
+
+class Trigger:
+    """En utlösningsnivå; exit-ordern är side/amount till marknadspris."""
+
+    __slots__ = (
+        "id",
+        "group",
+        "symbol",
+        "market",
+        "kind",
+        "price",
+        "side",
+        "amount",
+        "rising",
+        "active",
+        "armed",
+        "fired_at",
+        "failures",
+    )
+
+    def __init__(
+        self, id, group, symbol, kind, price, side, amount, rising, market=None
+    ):
+        self.id = id
+        self.group = group
+        # Ordersymbol för exit-ordern; market är nyckeln för heaparna
+        self.symbol = symbol
+        self.market = market or symbol
+        self.kind = kind
+        self.price = price
+        self.side = side
+        self.amount = amount
+        # True: utlöses när priset når nivån underifrån
+        self.rising = rising
+        self.active = True
+        self.armed = False
+        self.fired_at: Optional[float] = None
+        # Misslyckade exit-ordrar för paret hittills
+        self.failures = 0
+
+    def __repr__(self):
+        return (
+            f"Trigger({self.id}, {self.symbol}, {self.kind}, {self.price}, "
+            f"{self.side} {self.amount})"
+        )
+
+
+class _Book:
+    __slots__ = ("rising", "falling", "stale")
+
+    def __init__(self):
+        # (pris, id, trigger) respektive (-pris, id, trigger)
+        self.rising: list = []
+        self.falling: list = []
+        self.stale = 0
+
+
+class TriggerEngine:
+    """
+    Stop-loss/take-profit-nivåer per symbol med heap-index.
+
+    Args:
+        normalize: Översätter ordersymboler till websocketflödets symboler
+    """
+
+    def __init__(self, normalize=None):
+        self.normalize = normalize or (lambda symbol: symbol)
+        self._markets: Dict[str, str] = {}
+        # Antal par per normaliserad symbol (för tickerprenumerationer)
+        self._market_groups: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._books: Dict[str, _Book] = {}
+        self._groups: Dict[int, List[Trigger]] = {}
+        self._pending: Dict[object, List[Trigger]] = {}
+        # Par knutna till en order: order-id -> (grupp, ordermängd) och omvänt
+        self._order_groups: Dict[str, tuple] = {}
+        self._group_orders: Dict[int, str] = {}
+        # Fylld mängd per order-id och redan räknade trade-id (te följs av tu)
+        self._filled: "OrderedDict[str, float]" = OrderedDict()
+        self._fills: "OrderedDict[object, bool]" = OrderedDict()
+        # Par vars exit-order är på väg: grupp -> utlöst trigger
+        self._firing: Dict[int, Trigger] = {}
+        # Återställda par som väntar på reconcile(): grupp -> (order-id, mängd)
+        self._dormant: Dict[int, tuple] = {}
+        self._active = 0
+
+    def __len__(self) -> int:
+        """Antal aktiva (armerade) nivåer."""
+        return self._active
+
+    def _market(self, symbol: str) -> str:
+        market = self._markets.get(symbol)
+        if market is None:
+            market = self._markets[symbol] = self.normalize(symbol)
+        return market
+
+    def markets(self) -> set:
+        """Normaliserade symboler som har par (aktiva, vilande eller på väg)."""
+        with self._lock:
+            return set(self._market_groups)
+
+    def _add_group(self, group: int, triggers: List[Trigger]):
+        self._groups[group] = triggers
+        market = triggers[0].market
+        self._market_groups[market] = self._market_groups.get(market, 0) + 1
+
+    def _retire(self, group: int) -> Optional[List[Trigger]]:
+        self._dormant.pop(group, None)
+        order_id = self._group_orders.pop(group, None)
+        if order_id is not None:
+            self._order_groups.pop(order_id, None)
+            self._pending.pop(order_id, None)
+        triggers = self._groups.pop(group, None)
+        if triggers:
+            market = triggers[0].market
+            remaining = self._market_groups.get(market, 1) - 1
+            if remaining:
+                self._market_groups[market] = remaining
+            else:
+                self._market_groups.pop(market, None)
+        return triggers
+
+    # --- Registrering ---
+
+    def add_bracket(
+        self,
+        symbol: str,
+        entry_side: str,
+        amount: float,
+        stop_loss: Optional[float] = None,
+        take_profit: Optional[float] = None,
+        order_id=None,
+    ) -> Optional[int]:
+        """
+        Registrerar stop-loss och/eller take-profit för en ny position.
+
+        Args:
+            entry_side: "buy" (lång position) eller "sell" (kort)
+            order_id: Om satt väntar nivåerna på ``arm(order_id)`` (limit-order
+                som inte fyllts än); har ordern redan fyllts armeras de direkt
+                med den fyllda mängden. Utan order_id aktiveras de direkt
+
+        Returns:
+            Grupp-id för paret, eller None om inga nivåer angavs
+        """
+        if stop_loss is None and take_profit is None:
+            return None
+        long = entry_side == "buy"
+        exit_side = "sell" if long else "buy"
+        group = next(self._ids)
+        triggers = []
+        if stop_loss is not None:
+            triggers.append((STOP_LOSS, float(stop_loss), not long))
+        if take_profit is not None:
+            triggers.append((TAKE_PROFIT, float(take_profit), long))
+        market = self._market(symbol)
+        created = [
+            Trigger(
+                next(self._ids),
+                group,
+                symbol,
+                kind,
+                price,
+                exit_side,
+                amount,
+                up,
+                market,
+            )
+            for kind, price, up in triggers
+        ]
+        with self._lock:
+            self._add_group(group, created)
+            if order_id is None:
+                self._push(created)
+            else:
+                self._add_pending(str(order_id), group, amount, created)
+                self._apply_fill(str(order_id))
+        return group
+
+    def _add_pending(self, order_id: str, group: int, amount: float, triggers):
+        self._pending.setdefault(order_id, []).extend(triggers)
+        self._order_groups[order_id] = (group, amount)
+        self._group_orders[group] = order_id
+
+    def arm(self, order_id, amount: Optional[float] = None, trade_id=None) -> int:
+        """
+        Bokför en fyllnad av order_id och aktiverar nivåerna som väntar på den.
+
+        Order-id jämförs som strängar (ccxt ger str, websocketflödet int).
+
+        Args:
+            amount: Fylld mängd (tecknet ignoreras); exit-mängden blir summan
+                av fyllnaderna, högst ordermängden. None = hela ordern
+            trade_id: Räknas bara en gång (``te`` och ``tu`` för samma fyllnad)
+
+        Returns:
+            Antal nivåer som aktiverades
+        """
+        key = str(order_id)
+        with self._lock:
+            if trade_id is not None:
+                if trade_id in self._fills:
+                    return 0
+                self._fills[trade_id] = True
+                while len(self._fills) > _MAX_FILLS:
+                    self._fills.popitem(last=False)
+            filled = float("inf") if amount is None else abs(float(amount))
+            self._filled[key] = self._filled.get(key, 0.0) + filled
+            self._filled.move_to_end(key)
+            while len(self._filled) > _MAX_FILLS:
+                self._filled.popitem(last=False)
+            return self._apply_fill(key)
+
+    def _apply_fill(self, order_id: str) -> int:
+        # Anropas med self._lock hållet
+        filled = self._filled.get(order_id)
+        entry = self._order_groups.get(order_id)
+        if filled is None or entry is None:
+            return 0
+        group, amount = entry
+        for trigger in self._groups.get(group, ()):
+            trigger.amount = min(amount, filled)
+        triggers = [t for t in self._pending.pop(order_id, []) if t.active]
+        self._push(triggers)
+        return len(triggers)
+
+    def cancel_order(self, order_id) -> bool:
+        """
+        Släpper paret för en avbruten order om inget av den har fyllts.
+
+        Ett delfyllt par behålls, med exit-mängden satt till det som fylldes.
+        """
+        key = str(order_id)
+        with self._lock:
+            if key not in self._pending:
+                return False
+            group = self._order_groups[key][0]
+            self._firing.pop(group, None)
+            triggers = self._retire(group)
+            self._deactivate(triggers or [])
+        return True
+
+    def _push(self, triggers: List[Trigger]):
+        for trigger in triggers:
+            trigger.armed = True
+            book = self._books.get(trigger.market)
+            if book is None:
+                book = self._books[trigger.market] = _Book()
+            if trigger.rising:
+                heapq.heappush(book.rising, (trigger.price, trigger.id, trigger))
+            else:
+                heapq.heappush(book.falling, (-trigger.price, trigger.id, trigger))
+            self._active += 1
+
+    def cancel(self, group: int) -> bool:
+        """Avaktiverar ett par (t.ex. när positionen stängts på annat sätt)."""
+        with self._lock:
+            self._firing.pop(group, None)
+            triggers = self._retire(group)
+            if triggers is None:
+                return False
+            self._deactivate(triggers)
+        return True
+
+    def _deactivate(self, triggers: List[Trigger]):
+        for trigger in triggers:
+            if not trigger.active:
+                continue
+            trigger.active = False
+            book = self._books.get(trigger.market)
+            if book is not None and trigger.armed:
+                self._active -= 1
+                book.stale += 1
+                if book.stale > (len(book.rising) + len(book.falling)) // 2:
+                    self._compact(book)
+
+    def _compact(self, book: _Book):
+        book.rising = [entry for entry in book.rising if entry[2].active]
+        book.falling = [entry for entry in book.falling if entry[2].active]
+        heapq.heapify(book.rising)
+        heapq.heapify(book.falling)
+        book.stale = 0
+
+    # --- Ticks ---
+
+    def on_tick(self, symbol: str, price: float, now: Optional[float] = None):
+        """
+        Kontrollerar symbolens närmaste nivåer mot price.
+
+        Args:
+            symbol: Ordersymbol eller websocketflödets symbol
+
+        Returns:
+            Lista med utlösta triggers (tom i det vanliga fallet)
+        """
+        book = self._books.get(self._market(symbol))
+        if book is None:
+            return []
+        rising, falling = book.rising, book.falling
+        # Snabbväg utan lås: inget att göra om ingen topp är nådd
+        if not (rising and rising[0][0] <= price) and not (
+            falling and -falling[0][0] >= price
+        ):
+            return []
+        fired = []
+        with self._lock:
+            while book.rising and book.rising[0][0] <= price:
+                self._fire(heapq.heappop(book.rising)[2], book, fired, now)
+            while book.falling and -book.falling[0][0] >= price:
+                self._fire(heapq.heappop(book.falling)[2], book, fired, now)
+        return fired
+
+    def _fire(self, trigger: Trigger, book: _Book, fired: list, now):
+        if not trigger.active:
+            book.stale -= 1
+            return
+        trigger.active = False
+        trigger.fired_at = now
+        self._active -= 1
+        # Paret vilar (behålls i _groups) tills exit-ordern har ett utfall
+        self._deactivate(self._groups.get(trigger.group, ()))
+        self._firing[trigger.group] = trigger
+        fired.append(trigger)
+
+    def confirm(self, trigger: Trigger) -> bool:
+        """Pensionerar paret när exit-ordern för trigger har lagts."""
+        with self._lock:
+            if self._firing.get(trigger.group) is not trigger:
+                return False
+            del self._firing[trigger.group]
+            self._retire(trigger.group)
+        return True
+
+    def rearm(self, trigger: Trigger) -> bool:
+        """
+        Aktiverar paret igen när exit-ordern för trigger misslyckades.
+
+        Nivåerna läggs in som nya triggers (de gamla ligger kvar som inaktuella
+        heap-poster), så en nivå som fortfarande är passerad utlöses på nästa
+        tick och exit-ordern försöks igen.
+
+        Returns:
+            False om paret har avbrutits under tiden
+        """
+        with self._lock:
+            if self._firing.get(trigger.group) is not trigger:
+                return False
+            del self._firing[trigger.group]
+            triggers = self._groups.get(trigger.group)
+            if triggers is None:
+                return False
+            created = [
+                Trigger(
+                    next(self._ids),
+                    t.group,
+                    t.symbol,
+                    t.kind,
+                    t.price,
+                    t.side,
+                    t.amount,
+                    t.rising,
+                    t.market,
+                )
+                for t in triggers
+            ]
+            for new in created:
+                new.failures = trigger.failures + 1
+            self._groups[trigger.group] = created
+            self._push(created)
+        return True
+
+    def levels(self, symbol: str) -> dict:
+        """Närmaste aktiva nivå över och under priset (för loggning/status)."""
+        book = self._books.get(self._market(symbol))
+        if book is None:
+            return {"above": None, "below": None}
+        with self._lock:
+            above = next((e[0] for e in sorted(book.rising) if e[2].active), None)
+            below = next((-e[0] for e in sorted(book.falling) if e[2].active), None)
+        return {"above": above, "below": below}
+
+    # --- Checkpoint ---
+
+    def snapshot(self) -> dict:
+        """Aktiva par som JSON-kompatibel dict (för checkpoint)."""
+        pending = {}
+        with self._lock:
+            for order_id, triggers in self._pending.items():
+                for trigger in triggers:
+                    pending[trigger.id] = order_id
+            for group, (order_id, _) in self._dormant.items():
+                for trigger in self._groups[group]:
+                    pending[trigger.id] = order_id
+            groups = [
+                [
+                    [t.symbol, t.kind, t.price, t.side, t.amount, t.rising]
+                    + [pending.get(t.id)]
+                    for t in triggers
+                    # Ett par med exit-order på väg sparas helt
+                    if t.active or group in self._firing
+                ]
+                for group, triggers in self._groups.items()
+            ]
+        return {"groups": [group for group in groups if group]}
+
+    def restore(self, state: dict) -> int:
+        """
+        Återställer par från snapshot() med nya id:n, vilande tills reconcile().
+
+        Positionen kan ha stängts, eller limit-ordern avbrutits eller fyllts,
+        medan boten var nere, och en exit-order utan position öppnar en omvänd
+        position. Paren armeras därför inte förrän reconcile() har kontrollerat
+        dem mot börsens läge efter återanslutningen.
+
+        Returns:
+            Antal återställda par
+        """
+        restored = 0
+        with self._lock:
+            for rows in state.get("groups", []):
+                if not rows:
+                    continue
+                order_id = rows[0][6]
+                group = next(self._ids)
+                created = [
+                    Trigger(
+                        next(self._ids),
+                        group,
+                        symbol,
+                        kind,
+                        price,
+                        side,
+                        amount,
+                        rising,
+                        self._market(symbol),
+                    )
+                    for symbol, kind, price, side, amount, rising, _ in rows
+                ]
+                self._add_group(group, created)
+                key = None if order_id is None else str(order_id)
+                self._dormant[group] = (key, rows[0][4])
+                restored += 1
+        return restored
+
+    def reconcile(self, position=None, is_open=None) -> int:
+        """
+        Kontrollerar och armerar par från restore() mot börsens aktuella läge.
+
+        Anropas när ordersnapshoten och fyllnaderna sedan senaste körningen har
+        kommit. Par som väntar på en order armeras med den fyllda mängden om
+        ordern har fyllts (``arm``), väntar vidare om den är öppen och släpps
+        annars. Armerade par behålls bara om det finns en position åt rätt
+        håll, och mängden begränsas till det som återstår av den.
+
+        Args:
+            position: position(symbol) -> nettoposition (positiv för lång)
+            is_open: is_open(order_id) -> True om ordern fortfarande är öppen
+
+        Returns:
+            Antal par som släpptes
+        """
+        dropped = 0
+        remaining: Dict[str, float] = {}
+        with self._lock:
+            dormant, self._dormant = self._dormant, {}
+            for group, (order_id, amount) in dormant.items():
+                created = self._groups.get(group)
+                if not created:
+                    continue
+                symbol, market, side = (
+                    created[0].symbol,
+                    created[0].market,
+                    created[0].side,
+                )
+                if order_id is not None:
+                    filled = order_id in self._filled
+                    if not filled and is_open is not None and not is_open(order_id):
+                        dropped += 1
+                        self._deactivate(self._retire(group) or [])
+                        continue
+                    self._add_pending(order_id, group, amount, created)
+                    self._apply_fill(order_id)
+                    continue
+                if position is not None:
+                    if market not in remaining:
+                        remaining[market] = position(symbol)
+                    # sell stänger en lång position, buy en kort
+                    direction = 1.0 if side == "sell" else -1.0
+                    held = remaining[market] * direction
+                    if held <= 1e-12:
+                        dropped += 1
+                        self._deactivate(self._retire(group) or [])
+                        continue
+                    amount = min(amount, held)
+                    remaining[market] -= amount * direction
+                for trigger in created:
+                    trigger.amount = amount
+                self._push(created)
+        return dropped
@@ -0,0 +1,288 @@
+"""
+Walk-forward-utvärdering av FVG-strategin.
+
+Historiken delas i rullande tränings-/testfönster. För varje fönster optimeras
+parametrarna på träningsdelen och de bästa parametrarna utvärderas på det
+efterföljande testfönstret (out-of-sample). Fönstren körs parallellt i en
+processpool. Indikatorer beräknas en gång per fönster och unik
+indikatorparameter-kombination och återanvänds mellan parameteruppsättningarna.
+"""
+
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backtest_engine import simulate
+from candles import CandleArray, compute_indicators
+from fvg import FVG_INDICATORS, fvg_signals
+
+logger = logging.getLogger(__name__)
+
+# Parametrar som påverkar calculate_indicators; resten påverkar bara signal/simulering
+INDICATOR_PARAMS = ("ema_length", "volume_multiplier")
+DEFAULT_PARAMS = {
+    "ema_length": 20,
+    "volume_multiplier": 1.5,
+    "atr_multiplier": 2.0,
+    "lookback": 100,
+    "stop_loss_pct": 2.0,
+    "take_profit_pct": 4.0,
+}
+
+# Historiken delas med arbetsprocesserna via initializer i stället för per uppgift
+_shared_data = None
+
+
+def _init_worker(data):
+    global _shared_data
+    _shared_data = data
+
+
+def expand_grid(param_grid: Dict[str, Sequence]) -> List[dict]:
+    """Alla kombinationer av ett parameternät, kompletterade med standardvärden."""
+    unknown = set(param_grid) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Okända parametrar i param_grid: {sorted(unknown)}")
+    names = list(param_grid)
+    combos = []
+    for values in itertools.product(*(param_grid[name] for name in names)):
+        params = dict(DEFAULT_PARAMS)
+        params.update(zip(names, values))
+        combos.append(params)
+    return combos
+
+
+def make_windows(n_rows, train_size, test_size, step=None, anchored=False):
+    """
+    Rullande (eller förankrade) fönster som (train_start, train_end, test_end).
+
+    Testfönstret är [train_end, test_end).
+    """
+    if train_size <= 0 or test_size <= 0:
+        raise ValueError("train_size och test_size måste vara positiva")
+    step = step or test_size
+    windows = []
+    start = 0
+    while start + train_size + test_size <= n_rows:
+        train_start = 0 if anchored else start
+        train_end = start + train_size
+        windows.append((train_start, train_end, train_end + test_size))
+        start += step
+    return windows
+
+
+def _run(candles, params, engine_params, mean_atr=None, warmup=0):
+    # De första warmup staplarna ger bara FVG-historik och handlas inte
+    long_signal, short_signal = fvg_signals(
+        candles, params["atr_multiplier"], params["lookback"], mean_atr=mean_atr
+    )
+    if warmup:
+        traded = slice(warmup, None)
+        candles = candles[traded]
+        long_signal, short_signal = long_signal[traded], short_signal[traded]
+    return simulate(
+        candles.timestamps,
+        candles.open,
+        candles.high,
+        candles.low,
+        candles.close,
+        long_signal,
+        short_signal,
+        stop_loss_pct=params["stop_loss_pct"],
+        take_profit_pct=params["take_profit_pct"],
+        **engine_params,
+    )
+
+
+def _evaluate_window(task):
+    """Optimerar på träningsdelen och utvärderar bästa parametrar på testdelen."""
+    (
+        window_id,
+        (train_start, train_end, test_end),
+        grid,
+        objective,
+        engine_params,
+        hours,
+    ) = task
+    candles = _shared_data[train_start:test_end]
+    train_len = train_end - train_start
+
+    # Indikatorer per fönster och indikatorparametrar; kausala, så en beräkning
+    # över train+test ger samma träningsvärden och ger testdelen uppvärmning
+    cache = {}
+
+    def indicators_for(params):
+        key = tuple(params[name] for name in INDICATOR_PARAMS)
+        if key not in cache:
+            # Skivan är en vy; compute_indicators lägger till egna arrayer
+            cache[key] = compute_indicators(
+                candles[:],
+                params["ema_length"],
+                params["volume_multiplier"],
+                hours[0],
+                hours[1],
+                indicators=FVG_INDICATORS,
+            )
+        return cache[key]
+
+    best_params, best_score, best_train = None, -np.inf, None
+    for params in grid:
+        data = indicators_for(params)
+        result = _run(data[:train_len], params, engine_params)
+        score = result.stats[objective]
+        if best_params is None or score > best_score:
+            best_params, best_score, best_train = params, score, result.stats
+
+    if best_params is None:
+        return {"window": window_id, "error": "Tomt parameternät"}
+
+    data = indicators_for(best_params)
+    train_atr = float(np.nanmean(data["atr"][:train_len]))
+    # Gap som bildats under de sista lookback + 2 träningsstaplarna kan ge
+    # signal i början av testdelen; staplarna följer med som uppvärmning
+    warmup = min(train_len, best_params["lookback"] + 2)
+    test = _run(
+        data[slice(train_len - warmup, None)],
+        best_params,
+        engine_params,
+        mean_atr=train_atr,
+        warmup=warmup,
+    )
+    return {
+        "window": window_id,
+        "train": (train_start, train_end),
+        "test": (train_end, test_end),
+        "best_params": best_params,
+        "train_stats": best_train,
+        "test_stats": test.stats,
+        "test_trades": test.trade_records(),
+        "test_equity": test.equity,
+    }
+
+
+def walk_forward(
+    data,
+    param_grid: Dict[str, Sequence],
+    train_size: int,
+    test_size: int,
+    step: Optional[int] = None,
+    anchored: bool = False,
+    objective: str = "net_pnl",
+    processes: Optional[int] = None,
+    trading_start_hour: int = 0,
+    trading_end_hour: int = 23,
+    engine_params: Optional[dict] = None,
+    dtype=np.float64,
+) -> dict:
+    """
+    Kör walk-forward-analys och returnerar en samlad out-of-sample-rapport.
+
+    Args:
+        data: OHLCV-DataFrame (med 'datetime') eller CandleArray i tidsordning
+        param_grid: Parameternamn -> lista med värden (se DEFAULT_PARAMS)
+        train_size: Antal staplar i varje träningsfönster
+        test_size: Antal staplar i varje testfönster
+        step: Förskjutning mellan fönster (standard test_size)
+        anchored: Om True växer träningsfönstret från början av historiken
+        objective: Nyckel i BacktestResult.stats som maximeras på träningsdata
+        processes: Antal processer; 1 kör i samma process
+        engine_params: Extra argument till BacktestEngine (avgifter, dagsgränser)
+        dtype: Precision för staplar och indikatorer (np.float32 halverar minnet)
+
+    Returns:
+        Dict: Rapport med per-fönster-resultat och sammanlagd OOS-statistik
+    """
+    grid = expand_grid(param_grid)
+    candles = (
+        data if isinstance(data, CandleArray) else CandleArray.from_frame(data, dtype)
+    )
+    windows = make_windows(len(data), train_size, test_size, step, anchored)
+    if not windows:
+        raise ValueError(
+            f"För lite data ({len(data)} rader) för train_size={train_size} "
+            f"och test_size={test_size}"
+        )
+    engine_params = dict(engine_params or {})
+    engine_params.setdefault("keep_curves", True)
+    hours = (trading_start_hour, trading_end_hour)
+    tasks = [
+        (i, window, grid, objective, engine_params, hours)
+        for i, window in enumerate(windows)
+    ]
+    logger.info(
+        f"[WALK-FORWARD] {len(windows)} fönster x {len(grid)} parameteruppsättningar"
+    )
+
+    if processes == 1:
+        _init_worker(candles)
+        results = [_evaluate_window(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker, initargs=(candles,)
+        ) as pool:
+            results = list(pool.map(_evaluate_window, tasks))
+
+    return build_report(results, engine_params.get("initial_equity", 10_000.0))
+
+
+def build_report(results, initial_equity=10_000.0) -> dict:
+    """Slår ihop fönsterresultat till en OOS-rapport med sammanfogad equity-kurva."""
+    windows = [r for r in results if "error" not in r]
+    errors = [r for r in results if "error" in r]
+
+    # Sammanfoga testkurvorna: varje fönster startar där det förra slutade
+    equity_parts = []
+    offset = 0.0
+    for r in windows:
+        curve = r.pop("test_equity")
+        if len(curve):
+            equity_parts.append(curve - initial_equity + offset)
+            offset += curve[-1] - initial_equity
+    oos_pnl_curve = np.concatenate(equity_parts) if equity_parts else np.empty(0)
+    oos_equity = initial_equity + oos_pnl_curve
+    if len(oos_equity):
+        peak = np.maximum.accumulate(np.r_[initial_equity, oos_equity])[1:]
+        max_drawdown = float(((oos_equity - peak) / peak).min())
+    else:
+        max_drawdown = 0.0
+
+    trades = [t for r in windows for t in r["test_trades"]]
+    closed = [t for t in trades if t["exit_reason"] != "open"]
+    wins = sum(1 for t in closed if t["pnl"] > 0)
+    is_pnl = sum(r["train_stats"]["net_pnl"] for r in windows)
+    oos_pnl = sum(r["test_stats"]["net_pnl"] for r in windows)
+    # Hur ofta varje parameteruppsättning valdes (stabilitet över fönster)
+    chosen = {}
+    for r in windows:
+        key = tuple(sorted(r["best_params"].items()))
+        chosen[key] = chosen.get(key, 0) + 1
+
+    return {
+        "windows": windows,
+        "errors": errors,
+        "oos": {
+            "windows": len(windows),
+            "net_pnl": oos_pnl,
+            "fees": sum(r["test_stats"]["fees"] for r in windows),
+            "trades": len(closed),
+            "win_rate": wins / len(closed) if closed else 0.0,
+            "max_drawdown": max_drawdown,
+            "final_equity": (
+                float(oos_equity[-1]) if len(oos_equity) else initial_equity
+            ),
+            "profitable_windows": sum(
+                1 for r in windows if r["test_stats"]["net_pnl"] > 0
+            ),
+            # Walk-forward-effektivitet: OOS-resultat relativt in-sample
+            "efficiency": oos_pnl / is_pnl if is_pnl else 0.0,
+        },
+        "equity": oos_equity,
+        "trades": trades,
+        "param_stability": [
+            {"params": dict(key), "windows": count}
+            for key, count in sorted(chosen.items(), key=lambda kv: -kv[1])
+        ],
+    }
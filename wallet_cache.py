@@ -0,0 +1,264 @@
+"""
+Minnescache för plånbokssaldon.
+
+Cachen fylls från det autentiserade Bitfinex-websocketflödet (``ws``-snapshot och
+``wu``-uppdateringar) och kan även seedas från ett vanligt ccxt ``fetch_balance``-svar.
+Saldot kan då besvaras utan ett signerat REST-anrop per förfrågan.
+
+Bara botprocessen lyssnar på websocketflödet. Med ``share_path`` skriver den
+websocket-saldona till en delad fil, som andra processer (API:t) läser med
+``load_shared`` i stället för att falla tillbaka på REST. En kopia från filen
+kontrolleras mot filen vid varje läsning, så att en invalidering i boten
+(tappad anslutning) slår igenom direkt.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bitfinex wallet-format:
+# [WALLET_TYPE, CURRENCY, BALANCE, UNSETTLED_INTEREST, AVAILABLE_BALANCE, LAST_CHANGE, TRADE_DETAILS]
+WALLET_TYPE = 0
+WALLET_CURRENCY = 1
+WALLET_BALANCE = 2
+WALLET_AVAILABLE = 4
+
+
+def default_path() -> str:
+    """Delad saldofil för alla processer hos samma användare."""
+    user = hashlib.sha256(os.path.expanduser("~").encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"tradingbot-wallets-{user}.json")
+
+
+class WalletCache:
+    """
+    Trådsäker cache över saldon per valuta för en plånbokstyp.
+
+    Args:
+        wallet_type: Bitfinex-plånbok som speglas ('exchange', 'margin' eller 'funding')
+        currency_code: Funktion som översätter börsens valutakod till ccxt-kod
+        share_path: Fil där websocket-saldona delas med andra processer
+    """
+
+    def __init__(
+        self,
+        wallet_type: str = "exchange",
+        currency_code: Optional[Callable[[str], str]] = None,
+        share_path: Optional[str] = None,
+    ):
+        self.wallet_type = wallet_type
+        self.share_path = share_path
+        self._currency_code = currency_code or (lambda code: code)
+        self._lock = threading.Lock()
+        self._wallets: Dict[str, Dict[str, Optional[float]]] = {}
+        self._updated_at: Optional[float] = None
+        self._source: Optional[str] = None
+        # Senast lästa version av den delade filen (inode, mtime, storlek), och
+        # om cachens innehåll kommer därifrån
+        self._shared_version: Optional[tuple] = None
+        self._from_shared = False
+
+    def _store_wallet(self, wallet):
+        if not isinstance(wallet, (list, tuple)) or len(wallet) <= WALLET_BALANCE:
+            return
+        if wallet[WALLET_TYPE] != self.wallet_type:
+            return
+        code = self._currency_code(wallet[WALLET_CURRENCY])
+        total = float(wallet[WALLET_BALANCE] or 0.0)
+        available = wallet[WALLET_AVAILABLE] if len(wallet) > WALLET_AVAILABLE else None
+        if available is None:
+            # Bitfinex skickar ofta null för tillgängligt saldo; behåll senast kända värde
+            previous = self._wallets.get(code)
+            free = previous["free"] if previous else None
+        else:
+            free = float(available)
+        used = total - free if free is not None else None
+        self._wallets[code] = {"free": free, "used": used, "total": total}
+
+    def apply_snapshot(self, wallets):
+        """Ersätter hela cachen med en ``ws``-snapshot."""
+        with self._lock:
+            self._wallets = {}
+            for wallet in wallets or []:
+                self._store_wallet(wallet)
+            self._updated_at = time.time()
+            self._source = "websocket"
+            self._from_shared = False
+        self._publish()
+
+    def apply_update(self, wallet):
+        """Uppdaterar en enskild plånbok från ett ``wu``-meddelande."""
+        with self._lock:
+            self._store_wallet(wallet)
+            self._updated_at = time.time()
+            self._source = "websocket"
+            self._from_shared = False
+        self._publish()
+
+    def handle_message(self, data) -> bool:
+        """
+        Hanterar ett meddelande från kanal 0 om det gäller plånböcker.
+
+        Returns:
+            bool: True om meddelandet var en ``ws``/``wu``-händelse
+        """
+        if not isinstance(data, list) or len(data) < 3 or data[0] != 0:
+            return False
+        if data[1] == "ws":
+            self.apply_snapshot(data[2])
+            return True
+        if data[1] == "wu":
+            self.apply_update(data[2])
+            return True
+        return False
+
+    def seed_from_balance(self, balance):
+        """Fyller cachen från ett ccxt ``fetch_balance``-svar."""
+        if not isinstance(balance, dict):
+            return
+        totals = balance.get("total") or {}
+        frees = balance.get("free") or {}
+        useds = balance.get("used") or {}
+        with self._lock:
+            self._wallets = {
+                code: {
+                    "free": frees.get(code),
+                    "used": useds.get(code),
+                    "total": total,
+                }
+                for code, total in totals.items()
+            }
+            self._updated_at = time.time()
+            self._source = "rest"
+            self._from_shared = False
+
+    def touch(self):
+        """Markerar websocket-data som färsk, t.ex. vid heartbeat på en levande anslutning."""
+        with self._lock:
+            if self._source != "websocket":
+                return
+            self._updated_at = time.time()
+        self._publish()
+
+    def invalidate(self, source: Optional[str] = None):
+        """
+        Markerar cachen som inaktuell, t.ex. när websocket-anslutningen tappas.
+
+        Args:
+            source: Om satt invalideras cachen bara om datan kommer därifrån
+                (t.ex. "rest" efter en order, när inga ``wu`` kommer)
+        """
+        with self._lock:
+            if source is not None and self._source != source:
+                return
+            self._updated_at = None
+            websocket = self._source == "websocket"
+        if websocket:
+            self._publish()
+
+    # --- Delning mellan processer ---
+
+    def _publish(self):
+        if not self.share_path:
+            return
+        with self._lock:
+            state = {
+                "wallet_type": self.wallet_type,
+                "wallets": self._wallets,
+                "updated_at": self._updated_at,
+            }
+            payload = json.dumps(state)
+        # Skriv till temporär fil och byt atomärt, så läsare aldrig ser en halv fil
+        tmp = f"{self.share_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(payload)
+            os.replace(tmp, self.share_path)
+        except OSError as e:
+            logger.warning(f"Kunde inte dela plånbokscachen: {e}")
+
+    def load_shared(self) -> bool:
+        """
+        Läser saldon som en annan process har delat, om filen har ändrats.
+
+        Filen läses bara om när den har bytts ut sedan förra läsningen (billig
+        stat per anrop). Nyare saldon ersätter cachen; är den delade datan
+        invaliderad (``updated_at`` null) invalideras även en kopia som lästs
+        från filen, men inte saldon från REST eller egen websocket.
+
+        Returns:
+            bool: True om cachen uppdaterades
+        """
+        if not self.share_path:
+            return False
+        try:
+            stat = os.stat(self.share_path)
+            version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if version == self._shared_version:
+                return False
+            with open(self.share_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if state.get("wallet_type") != self.wallet_type:
+            return False
+        updated_at = state.get("updated_at")
+        with self._lock:
+            self._shared_version = version
+            if updated_at is None:
+                if self._from_shared:
+                    self._updated_at = None
+                return False
+            if self._updated_at is not None and self._updated_at >= updated_at:
+                return False
+            self._wallets = state.get("wallets") or {}
+            self._updated_at = updated_at
+            self._source = "websocket"
+            self._from_shared = True
+        return True
+
+    def age(self) -> Optional[float]:
+        """Sekunder sedan senaste uppdatering, eller None om cachen är tom/inaktuell."""
+        updated_at = self._updated_at
+        if updated_at is None:
+            return None
+        return time.time() - updated_at
+
+    def is_fresh(self, max_age: float) -> bool:
+        age = self.age()
+        return age is not None and age <= max_age
+
+    def as_balance(self) -> dict:
+        """Returnerar cachen i samma form som ccxt ``fetch_balance``, plus färskhetsinfo."""
+        with self._lock:
+            wallets = {code: dict(values) for code, values in self._wallets.items()}
+            updated_at = self._updated_at
+            source = self._source
+        balance = {
+            "free": {code: w["free"] for code, w in wallets.items()},
+            "used": {code: w["used"] for code, w in wallets.items()},
+            "total": {code: w["total"] for code, w in wallets.items()},
+        }
+        balance.update(wallets)
+        if updated_at is not None:
+            balance["timestamp"] = int(updated_at * 1000)
+            balance["datetime"] = datetime.fromtimestamp(
+                updated_at, tz=timezone.utc
+            ).isoformat()
+        else:
+            balance["timestamp"] = None
+            balance["datetime"] = None
+        balance["cache"] = {
+            "source": source,
+            "updated_at": updated_at,
+            "age": time.time() - updated_at if updated_at is not None else None,
+        }
+        return balance